@@ -0,0 +1,199 @@
+# embedding_projection.py - 词向量/节点向量的可扩展二维投影
+# ======================================
+# exp1 的 t-SNE 只能画前200个词：sklearn TSNE(max_iter=2000) 直接作用在128维向量上太慢。这里：
+# 1. 按词频分层抽样（高频、中频、低频词都有代表），并保证重点词一定入选
+# 2. 先用 PCA 降到 50 维，再用 FFT 加速的 openTSNE（未安装时依次退回 UMAP / Barnes-Hut t-SNE）
+# 3. 二维坐标按 “模型文件哈希 + 投影参数” 缓存，重新画图不必重算
+import argparse
+import hashlib
+import glob
+import json
+import os
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+from gensim.utils import SaveLoad
+from sklearn.decomposition import PCA
+from sklearn.manifold import TSNE
+
+try:
+    import openTSNE
+except ImportError:
+    openTSNE = None
+
+try:
+    import umap
+except ImportError:
+    umap = None
+
+CACHE_DIR = "projection_cache"
+PCA_DIM = 50
+IMPORTANT_WORDS = ['good', 'bad', 'great', 'excellent', 'terrible', 'love', 'hate',
+                   'music', 'book', 'game', 'story', 'amazing', 'awful', 'perfect', 'horrible']
+
+# 设置中文字体
+plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']
+plt.rcParams['axes.unicode_minus'] = False
+
+
+def load_keyed_vectors(model_path):
+    """同时支持完整的 Word2Vec 模型与单独保存的 KeyedVectors（如 linkedin_fast_model.model）"""
+    obj = SaveLoad.load(model_path)
+    return obj.wv if hasattr(obj, 'wv') else obj
+
+
+def model_hash(model_path):
+    """模型文件及其 .npy 附属文件的内容哈希"""
+    digest = hashlib.sha1()
+    for path in sorted([model_path] + glob.glob(model_path + ".*.npy")):
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def stratified_sample(wv, sample_size=50000, n_strata=10, must_include=(), seed=42):
+    """
+    按词频分层抽样，返回词ID数组
+    index_to_key 已按词频降序排列，按对数排名切分层次，每层抽取相同数量
+    """
+    vocab_size = len(wv.index_to_key)
+    if vocab_size <= sample_size:
+        return np.arange(vocab_size)
+
+    rng = np.random.RandomState(seed)
+    edges = np.unique(np.logspace(0, np.log10(vocab_size), n_strata + 1).astype(int))
+    edges[0], edges[-1] = 0, vocab_size
+    strata = [np.arange(lo, hi) for lo, hi in zip(edges[:-1], edges[1:]) if hi > lo]
+
+    # 必选词去重后最多占满 sample_size，并从各层中剔除，避免 np.unique 合并后样本不足
+    forced = list(dict.fromkeys(wv.key_to_index[w] for w in must_include if w in wv.key_to_index))
+    forced = np.array(forced[:sample_size], dtype=np.int64)
+    strata = [np.setdiff1d(stratum, forced, assume_unique=True) for stratum in strata]
+    budget = max(sample_size - len(forced), 0)
+    chosen = [forced]
+    # 小层全部入选，剩余名额均分给更大的层
+    for i, stratum in enumerate(sorted(strata, key=len)):
+        quota = budget // (len(strata) - i)
+        take = stratum if len(stratum) <= quota else rng.choice(stratum, quota, replace=False)
+        chosen.append(take)
+        budget -= len(take)
+    return np.unique(np.concatenate(chosen))
+
+
+def project(vectors, method='auto', perplexity=30, seed=42, n_jobs=-1):
+    """PCA 预降维后做二维布局，返回 (coords, 实际使用的方法)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.shape[1] > PCA_DIM and len(vectors) > PCA_DIM:
+        vectors = PCA(n_components=PCA_DIM, svd_solver='randomized', random_state=seed).fit_transform(vectors)
+    perplexity = min(perplexity, max(len(vectors) - 1, 1) / 3)
+
+    if method == 'auto':
+        method = 'opentsne' if openTSNE is not None else 'umap' if umap is not None else 'sklearn'
+    if method == 'opentsne':
+        embedding = openTSNE.TSNE(perplexity=perplexity, negative_gradient_method='fft',
+                                  initialization='pca', n_jobs=n_jobs, random_state=seed)
+        coords = np.asarray(embedding.fit(vectors))
+    elif method == 'umap':
+        coords = umap.UMAP(n_neighbors=15, min_dist=0.1, random_state=seed).fit_transform(vectors)
+    else:
+        coords = TSNE(n_components=2, perplexity=perplexity, method='barnes_hut', init='pca',
+                      random_state=seed, n_jobs=n_jobs).fit_transform(vectors)
+    return coords.astype(np.float32), method
+
+
+def get_projection(model_path, sample_size=50000, method='auto', perplexity=30,
+                   must_include=IMPORTANT_WORDS, cache_dir=CACHE_DIR, seed=42):
+    """返回 (words, counts, coords)，命中缓存时直接读取"""
+    key = f"{model_hash(model_path)}_{sample_size}_{method}_{perplexity}_{seed}"
+    cache_path = os.path.join(cache_dir, f"{key}.npz")
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path, allow_pickle=False)
+        print(f"✅ 复用已缓存的二维坐标: {cache_path}")
+        return cached['words'].tolist(), cached['counts'], cached['coords']
+
+    wv = load_keyed_vectors(model_path)
+    ids = stratified_sample(wv, sample_size, must_include=must_include, seed=seed)
+    words = [wv.index_to_key[i] for i in ids]
+    counts = np.array([wv.get_vecattr(w, 'count') for w in words], dtype=np.int64)
+
+    print(f"正在投影 {len(ids)} 个向量（词表共 {len(wv.index_to_key)} 个）...")
+    start = time.time()
+    coords, used = project(wv.vectors[ids], method, perplexity, seed)
+    print(f"投影完成（{used}），耗时 {time.time() - start:.1f} 秒")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(cache_path, words=np.array(words), counts=counts, coords=coords)
+    return words, counts, coords
+
+
+def plot_word_projection(words, counts, coords, output_path='amazon_word2vec_tsne.png',
+                         highlight=IMPORTANT_WORDS, label_top=60):
+    """词向量散点图：颜色表示对数词频，重点词黄色高亮，另外标注最高频的若干词"""
+    plt.figure(figsize=(15, 12))
+    size = 2 if len(words) > 5000 else 20
+    sc = plt.scatter(coords[:, 0], coords[:, 1], c=np.log10(counts + 1), cmap='viridis', s=size, alpha=0.6)
+    plt.colorbar(sc, label='log10(词频)')
+
+    highlight = set(highlight)
+    top = set(np.argsort(-counts)[:label_top].tolist())
+    for i, word in enumerate(words):
+        if word in highlight:
+            plt.annotate(word, coords[i], fontsize=12, alpha=0.8, weight='bold',
+                         bbox=dict(boxstyle="round,pad=0.3", facecolor="yellow", alpha=0.7))
+        elif i in top:
+            plt.annotate(word, coords[i], fontsize=8, alpha=0.6)
+
+    plt.title(f'Word2Vec Projection - Amazon Reviews ({len(words)} words)', fontsize=16)
+    plt.xlabel('Component 1')
+    plt.ylabel('Component 2')
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(output_path, dpi=300, bbox_inches='tight')
+    plt.close()
+    print(f"可视化已保存为 '{output_path}'")
+
+
+def plot_node_projection(nodes, coords, titles_path, output_path='linkedin_fast_visualization.png', top_titles=8):
+    """节点向量散点图：按职位着色（titles.json 由 linkedin_walks.build_csr_graph 生成）"""
+    with open(titles_path, 'r', encoding='utf-8') as f:
+        titles = json.load(f)
+    codes = np.asarray(titles['codes'])[np.asarray(nodes, dtype=np.int64)]
+    frequent = np.argsort(-np.bincount(codes))[:top_titles]
+
+    plt.figure(figsize=(14, 10))
+    plt.scatter(coords[:, 0], coords[:, 1], c='lightgray', s=2, alpha=0.4)
+    colors = plt.cm.tab10(np.linspace(0, 1, len(frequent)))
+    for color, code in zip(colors, frequent):
+        mask = codes == code
+        plt.scatter(coords[mask, 0], coords[mask, 1], color=color, s=6, alpha=0.8,
+                    label=titles['uniques'][code])
+    plt.title(f'LinkedIn职业网络节点嵌入（{len(nodes)} 个节点）', fontsize=16)
+    plt.legend(loc='upper left', bbox_to_anchor=(1, 1), fontsize=9, markerscale=3)
+    plt.grid(True, alpha=0.2)
+    plt.tight_layout()
+    plt.savefig(output_path, dpi=200, bbox_inches='tight')
+    plt.close()
+    print(f"可视化已保存为 '{output_path}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="词向量/节点向量二维投影")
+    parser.add_argument("--model", default="word2vec_amazon_sg.model")
+    parser.add_argument("--output", default="amazon_word2vec_tsne.png")
+    parser.add_argument("--sample-size", type=int, default=50000)
+    parser.add_argument("--method", default="auto", choices=['auto', 'opentsne', 'umap', 'sklearn'])
+    parser.add_argument("--perplexity", type=float, default=30)
+    parser.add_argument("--titles", default=None, help="节点模型对应的 titles.json，提供时按职位着色")
+    args = parser.parse_args()
+
+    words, counts, coords = get_projection(args.model, args.sample_size, args.method, args.perplexity)
+    if args.titles:
+        plot_node_projection(words, coords, args.titles, args.output)
+    else:
+        plot_word_projection(words, counts, coords, args.output)
+
+
+if __name__ == "__main__":
+    main()
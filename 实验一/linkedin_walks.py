@@ -0,0 +1,263 @@
+# linkedin_walks.py - LinkedIn职业网络的CSR图构建与向量化node2vec随机游走
+# ======================================
+# exp1 用 iterrows() 逐行构建 networkx 图，再由纯Python的 node2vec 包为每条边预计算转移字典，
+# 只能处理4000~10000条职位。这里：
+# 1. 用 pandas 分组和 NumPy 随机数直接生成边，构建 CSR 数组（indptr / indices / weights）
+# 2. 一阶转移按边权采样：整张图只存一条与 indices 对齐的边权前缀和，预处理只是一次 cumsum
+# 3. p/q 二阶游走按批向量化：先在前缀和上 searchsorted 按边权提议下一跳，再按 node2vec 偏置做拒绝采样
+# 4. 多进程生成游走（图数组以 mmap 方式共享），逐块写入语料文件，用 corpus_file 模式训练Word2Vec
+import argparse
+import json
+import os
+import time
+from itertools import islice
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+from gensim.models import Word2Vec
+
+GRAPH_DIR = "linkedin_graph"
+WALKS_FILE = "linkedin_walks.txt"
+MODEL_FILE = "linkedin_fast_model.model"
+INTRA_WEIGHT = 0.8  # 同职业连接权重（与exp1一致）
+CROSS_WEIGHT = 0.3  # 跨职业连接权重
+WALK_BLOCK = 20000  # 每个子进程任务的起点数量
+
+
+def _intra_title_edges(codes, rng, min_k=2, max_k=5):
+    """每个节点随机连接 min_k~max_k 个同职业节点"""
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    group_start = np.searchsorted(sorted_codes, sorted_codes, side='left')
+    group_size = np.searchsorted(sorted_codes, sorted_codes, side='right') - group_start
+    rank = np.arange(len(order)) - group_start
+
+    valid = group_size > 1
+    src_pos = np.nonzero(valid)[0]
+    k = np.minimum(rng.integers(min_k, max_k + 1, size=len(src_pos)), group_size[src_pos] - 1)
+    src_pos = np.repeat(src_pos, k)
+    size = group_size[src_pos]
+    # 在组内跳过自身后均匀抽样；重复的伙伴在构建CSR时去重
+    offset = 1 + rng.integers(0, size - 1)
+    dst_pos = group_start[src_pos] + (rank[src_pos] + offset) % size
+    return order[src_pos], order[dst_pos]
+
+
+def _cross_title_edges(codes, rng, min_k=1, max_k=3, max_tries=5):
+    """每个节点随机连接 min_k~max_k 个不同职业的节点（抽到同职业时重抽）"""
+    num = len(codes)
+    src = np.repeat(np.arange(num), rng.integers(min_k, max_k + 1, size=num))
+    dst = rng.integers(0, num, size=len(src))
+    for _ in range(max_tries):
+        clash = codes[dst] == codes[src]
+        if not clash.any():
+            break
+        dst[clash] = rng.integers(0, num, size=int(clash.sum()))
+    keep = codes[dst] != codes[src]
+    return src[keep], dst[keep]
+
+
+def _cumulative_weights(weights):
+    """与 indices 对齐的全局边权前缀和（首位补0）；节点 u 的邻居占据 [cum[indptr[u]], cum[indptr[u+1]]) 区间"""
+    cum = np.zeros(len(weights) + 1, dtype=np.float64)
+    np.cumsum(weights, out=cum[1:])
+    return cum
+
+
+def build_csr_graph(csv_path, out_dir=GRAPH_DIR, nrows=None, seed=42):
+    """
+    从 postings.csv 构建无向加权图并保存：
+    indptr.npy / indices.npy / weights.npy（CSR，行内按邻居ID排序）、
+    cum_weights.npy（边权前缀和，按边权采样用）、
+    edge_keys.npy（全局有序的边键 src * N + dst）、titles.json（节点 -> 职位名）
+    """
+    start = time.time()
+    title_col = 'title' if 'title' in pd.read_csv(csv_path, nrows=0).columns else None
+    if title_col:
+        titles = pd.read_csv(csv_path, usecols=[title_col], nrows=nrows)[title_col]
+    else:
+        titles = pd.read_csv(csv_path, nrows=nrows).iloc[:, 1]
+    titles = titles.fillna('Unknown').astype(str)
+    codes, uniques = pd.factorize(titles)
+    num = len(codes)
+    rng = np.random.default_rng(seed)
+
+    intra_src, intra_dst = _intra_title_edges(codes, rng)
+    cross_src, cross_dst = _cross_title_edges(codes, rng)
+    src = np.concatenate([intra_src, intra_dst, cross_src, cross_dst]).astype(np.int64)
+    dst = np.concatenate([intra_dst, intra_src, cross_dst, cross_src]).astype(np.int64)
+    weight = np.concatenate([
+        np.full(2 * len(intra_src), INTRA_WEIGHT, dtype=np.float32),
+        np.full(2 * len(cross_src), CROSS_WEIGHT, dtype=np.float32),
+    ])
+
+    # 同一条边保留第一次出现的权重（同职业边优先，与exp1 has_edge 判断一致）
+    keys, first = np.unique(src * num + dst, return_index=True)
+    src, dst, weight = keys // num, keys % num, weight[first]
+    indptr = np.zeros(num + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num), out=indptr[1:])
+    indices = dst.astype(np.int32)
+    cum_weights = _cumulative_weights(weight)
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, arr in [('indptr', indptr), ('indices', indices), ('weights', weight),
+                      ('cum_weights', cum_weights), ('edge_keys', keys)]:
+        np.save(os.path.join(out_dir, f"{name}.npy"), arr)
+    with open(os.path.join(out_dir, "titles.json"), 'w', encoding='utf-8') as f:
+        json.dump({'uniques': uniques.tolist(), 'codes': codes.tolist()}, f, ensure_ascii=False)
+
+    print(f"图构建完成: 节点数={num}, 边数={len(indices) // 2}, 职业数={len(uniques)}，"
+          f"耗时 {time.time() - start:.1f} 秒")
+    return out_dir
+
+
+class CSRWalker:
+    """在CSR图上批量生成 node2vec 游走"""
+
+    def __init__(self, graph_dir=GRAPH_DIR, p=1.0, q=1.0):
+        self.graph_dir = graph_dir
+        self.indptr = self._load('indptr')
+        self.indices = self._load('indices')
+        self.cum_weights = self._load('cum_weights')
+        # 边键全局有序，可二分判断边是否存在（二阶偏置需要）
+        self.edge_keys = self._load('edge_keys')
+        self.num_nodes = len(self.indptr) - 1
+        self.degree = np.diff(self.indptr)
+        self.p, self.q = p, q
+
+    def _load(self, name):
+        # mmap 方式加载，多个子进程共享同一份页缓存
+        return np.load(os.path.join(self.graph_dir, f"{name}.npy"), mmap_mode='r')
+
+    def _sample_neighbors(self, nodes, rng):
+        """按边权从每个节点的邻居中采样一个：在该节点的前缀和区间内均匀取点，再二分定位（O(log E)）"""
+        lo, hi = self.indptr[nodes], self.indptr[nodes + 1]
+        base = self.cum_weights[lo]
+        target = base + rng.random(len(nodes)) * (self.cum_weights[hi] - base)
+        slot = np.searchsorted(self.cum_weights, target, side='right') - 1
+        # 浮点边界上可能落到区间外一格，夹回本节点的邻居范围
+        slot = np.clip(slot, lo, hi - 1)
+        return np.asarray(self.indices[slot], dtype=np.int64)
+
+    def _has_edge(self, src, dst):
+        keys = src * self.num_nodes + dst
+        pos = np.minimum(np.searchsorted(self.edge_keys, keys), len(self.edge_keys) - 1)
+        return self.edge_keys[pos] == keys
+
+    def _biased_step(self, prev, cur, rng, max_rounds=50):
+        """二阶转移：提议 x ~ w(cur, x)，以 α(prev, x) / max(α) 的概率接受"""
+        nxt = self._sample_neighbors(cur, rng)
+        if self.p == 1 and self.q == 1:
+            return nxt
+        alpha_max = max(1.0 / self.p, 1.0, 1.0 / self.q)
+        pending = np.arange(len(cur))
+        for _ in range(max_rounds):
+            x = nxt[pending]
+            alpha = np.where(x == prev[pending], 1.0 / self.p,
+                             np.where(self._has_edge(prev[pending], x), 1.0, 1.0 / self.q))
+            rejected = rng.random(len(pending)) * alpha_max >= alpha
+            pending = pending[rejected]
+            if len(pending) == 0:
+                break
+            nxt[pending] = self._sample_neighbors(cur[pending], rng)
+        return nxt
+
+    def walk(self, starts, walk_length, rng):
+        """从一批起点出发生成游走，返回 int64 [B, walk_length]，提前终止的位置为 -1"""
+        walks = np.full((len(starts), walk_length), -1, dtype=np.int64)
+        walks[:, 0] = starts
+        alive = np.nonzero(self.degree[starts] > 0)[0]
+        if walk_length < 2 or len(alive) == 0:
+            return walks
+        walks[alive, 1] = self._sample_neighbors(walks[alive, 0], rng)
+        for step in range(2, walk_length):
+            walks[alive, step] = self._biased_step(walks[alive, step - 2], walks[alive, step - 1], rng)
+        return walks
+
+
+_worker_state = {}
+
+
+def _init_walk_worker(graph_dir, p, q):
+    _worker_state['walker'] = CSRWalker(graph_dir, p, q)
+
+
+def _walk_block(task):
+    starts, walk_length, seed = task
+    walks = _worker_state['walker'].walk(starts, walk_length, np.random.default_rng(seed))
+    lines = []
+    for row in walks:
+        row = row[row >= 0]
+        if len(row) > 1:
+            lines.append(' '.join(map(str, row.tolist())))
+    return lines
+
+
+def generate_walks(graph_dir=GRAPH_DIR, walks_path=WALKS_FILE, num_walks=50, walk_length=20,
+                   p=1.0, q=1.0, workers=None, seed=42):
+    """多进程生成游走并逐块写入语料文件（一行一条游走），返回写入的游走数"""
+    workers = workers or os.cpu_count()
+    num_nodes = len(np.load(os.path.join(graph_dir, "indptr.npy"), mmap_mode='r')) - 1
+    rng = np.random.default_rng(seed)
+
+    def tasks():
+        for _ in range(num_walks):
+            order = rng.permutation(num_nodes)
+            for start in range(0, num_nodes, WALK_BLOCK):
+                yield order[start:start + WALK_BLOCK], walk_length, int(rng.integers(2 ** 31))
+
+    start = time.time()
+    total = 0
+    task_iter = tasks()
+    with open(walks_path, 'w', encoding='utf-8') as out, \
+            Pool(workers, initializer=_init_walk_worker, initargs=(graph_dir, p, q)) as pool:
+        while True:
+            # 每次只派发 workers 个任务，内存占用与图规模和游走总数无关
+            group = list(islice(task_iter, workers))
+            if not group:
+                break
+            for lines in pool.map(_walk_block, group):
+                if lines:
+                    out.write('\n'.join(lines))
+                    out.write('\n')
+                total += len(lines)
+    elapsed = time.time() - start
+    print(f"生成了 {total} 条随机游走序列，耗时 {elapsed:.1f} 秒（{total / max(elapsed, 1e-9):,.0f} 条/秒）")
+    return total
+
+
+def train_embeddings(walks_path=WALKS_FILE, model_path=MODEL_FILE, workers=None, **w2v_params):
+    """用游走语料训练节点向量，参数默认与exp1的 node2vec.fit 一致"""
+    params = dict(vector_size=32, window=7, min_count=1, sg=1, epochs=6)
+    params.update(w2v_params)
+    start = time.time()
+    model = Word2Vec(corpus_file=walks_path, workers=workers or os.cpu_count(), **params)
+    print(f"node2vec训练完成，耗时 {time.time() - start:.1f} 秒，节点向量数: {len(model.wv.key_to_index)}")
+    model.wv.save(model_path)
+    print(f"节点向量已保存为 '{model_path}'")
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LinkedIn职业网络 CSR node2vec")
+    parser.add_argument("--data", default="postings.csv")
+    parser.add_argument("--nrows", type=int, default=None)
+    parser.add_argument("--num-walks", type=int, default=50)
+    parser.add_argument("--walk-length", type=int, default=20)
+    parser.add_argument("--p", type=float, default=1.0)
+    parser.add_argument("--q", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    print("=== LinkedIn职业网络 node2vec（CSR向量化版）===")
+    start = time.time()
+    build_csr_graph(args.data, GRAPH_DIR, nrows=args.nrows)
+    generate_walks(GRAPH_DIR, WALKS_FILE, args.num_walks, args.walk_length,
+                   args.p, args.q, workers=args.workers)
+    train_embeddings(WALKS_FILE, MODEL_FILE, workers=args.workers)
+    print(f"总耗时: {time.time() - start:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
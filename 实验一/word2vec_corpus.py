@@ -0,0 +1,170 @@
+# word2vec_corpus.py - Amazon评论流式语料预处理与 corpus_file 模式的Word2Vec训练
+# ======================================
+# 替代exp1中“pandas一次性读入100万行 → 逐行预处理 → 整个sentences列表常驻内存”的做法：
+# 1. 按块读取 train.csv，在进程池中并行分词，写成“一行一句、空格分隔”的语料文件
+# 2. 可选：流式训练短语模型（Phrases），把常见搭配合并为 new_york 形式
+# 3. 用 gensim 的 corpus_file 模式训练，所有worker绕开Python迭代器的GIL瓶颈
+import argparse
+import os
+import re
+import resource
+import time
+from itertools import islice
+from multiprocessing import Pool
+
+import pandas as pd
+
+CHUNK_SIZE = 50000
+CORPUS_FILE = "amazon_corpus.txt"
+PHRASE_CORPUS_FILE = "amazon_corpus_phrases.txt"
+MODEL_FILE = "word2vec_amazon_sg.model"
+
+# 与exp1 simple_preprocess 中的停用词表一致，只在模块加载时构建一次
+STOP_WORDS = frozenset({
+    'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', "you're",
+    "you've", "you'll", "you'd", 'your', 'yours', 'yourself', 'yourselves',
+    'he', 'him', 'his', 'himself', 'she', "she's", 'her', 'hers', 'herself',
+    'it', "it's", 'its', 'itself', 'they', 'them', 'their', 'theirs', 'themselves',
+    'what', 'which', 'who', 'whom', 'this', 'that', "that'll", 'these', 'those',
+    'am', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had',
+    'having', 'do', 'does', 'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if',
+    'or', 'because', 'as', 'until', 'while', 'of', 'at', 'by', 'for', 'with',
+    'about', 'against', 'between', 'into', 'through', 'during', 'before', 'after',
+    'above', 'below', 'to', 'from', 'up', 'down', 'in', 'out', 'on', 'off', 'over',
+    'under', 'again', 'further', 'then', 'once', 'here', 'there', 'when', 'where',
+    'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other',
+    'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than',
+    'too', 'very', 's', 't', 'can', 'will', 'just', 'don', "don't", 'should',
+    "should've", 'now', 'd', 'll', 'm', 'o', 're', 've', 'y', 'ain', 'aren',
+    "aren't", 'couldn', "couldn't", 'didn', "didn't", 'doesn', "doesn't", 'hadn',
+    "hadn't", 'hasn', "hasn't", 'haven', "haven't", 'isn', "isn't", 'ma', 'mightn',
+    "mightn't", 'mustn', "mustn't", 'needn', "needn't", 'shan', "shan't", 'shouldn',
+    "shouldn't", 'wasn', "wasn't", 'weren', "weren't", 'won', "won't", 'wouldn', "wouldn't"
+})
+_NON_ALPHA = re.compile(r'[^a-zA-Z\s]')
+
+
+def simple_preprocess(text):
+    """与exp1同名函数规则一致：小写、去非字母字符、去停用词和短词"""
+    if not isinstance(text, str):
+        return []
+    words = _NON_ALPHA.sub('', text.lower()).split()
+    return [word for word in words if word not in STOP_WORDS and len(word) > 2]
+
+
+def _tokenize_chunk(texts):
+    """子进程：把一块评论转成语料行（过滤过短评论与少于4个词的句子）"""
+    lines = []
+    for review in texts:
+        if not isinstance(review, str) or len(review.strip()) <= 10:
+            continue
+        sentence = simple_preprocess(review)
+        if len(sentence) > 3:
+            lines.append(' '.join(sentence))
+    return lines
+
+
+def detect_review_column(csv_path):
+    """与exp1的列识别规则一致：优先含 review/text/comment/content 的列，否则取第二列"""
+    columns = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    for col in columns:
+        if any(keyword in col.lower() for keyword in ['review', 'text', 'comment', 'content']):
+            return col
+    return columns[1] if len(columns) > 1 else columns[0]
+
+
+def build_corpus_file(csv_path, corpus_path=CORPUS_FILE, nrows=None, workers=None):
+    """流式读取CSV并并行分词，写出一行一句的语料文件；返回写入的句子数"""
+    workers = workers or os.cpu_count()
+    review_column = detect_review_column(csv_path)
+    print(f"使用评论列: {review_column}")
+
+    reader = pd.read_csv(csv_path, usecols=[review_column], chunksize=CHUNK_SIZE, nrows=nrows)
+    chunks = (chunk[review_column].tolist() for chunk in reader)
+    sentences = 0
+    start = time.time()
+    with open(corpus_path, 'w', encoding='utf-8') as out, Pool(workers) as pool:
+        while True:
+            # 每次只读 workers 个块，避免把整个文件排进任务队列
+            group = list(islice(chunks, workers))
+            if not group:
+                break
+            for lines in pool.map(_tokenize_chunk, group):
+                if lines:
+                    out.write('\n'.join(lines))
+                    out.write('\n')
+                    sentences += len(lines)
+            print(f"  已写入 {sentences} 个句子（{time.time() - start:.1f} 秒）")
+
+    print(f"✅ 语料已保存到: {corpus_path}")
+    return sentences
+
+
+def apply_phrases(corpus_path=CORPUS_FILE, output_path=PHRASE_CORPUS_FILE, min_count=20, threshold=10.0):
+    """流式训练短语模型，并把高频搭配合并为下划线连接的单个token"""
+    # gensim 只在训练阶段导入：词云管线复用本模块的读取工具时不必加载它
+    from gensim.models.phrases import Phrases, ENGLISH_CONNECTOR_WORDS
+    from gensim.models.word2vec import LineSentence
+
+    print("正在训练短语模型...")
+    phrases = Phrases(LineSentence(corpus_path), min_count=min_count, threshold=threshold,
+                      connector_words=ENGLISH_CONNECTOR_WORDS)
+    frozen = phrases.freeze()
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for sentence in LineSentence(corpus_path):
+            out.write(' '.join(frozen[sentence]))
+            out.write('\n')
+    print(f"✅ 短语语料已保存到: {output_path}（识别出 {len(frozen.phrasegrams)} 个短语）")
+    return output_path
+
+
+def train_word2vec(corpus_path, model_path=MODEL_FILE, workers=None, **w2v_params):
+    """corpus_file 模式训练 Skip-gram 模型，参数默认与exp1一致"""
+    from gensim.models import Word2Vec
+
+    params = dict(vector_size=128, window=5, min_count=5, sg=1, epochs=10)
+    params.update(w2v_params)
+    workers = workers or os.cpu_count()
+
+    print(f"\n训练Word2Vec（corpus_file模式，{workers} 个worker）...")
+    start = time.time()
+    model = Word2Vec(corpus_file=corpus_path, workers=workers, **params)
+    training_time = time.time() - start
+
+    words_per_second = model.corpus_total_words * model.epochs / training_time
+    print(f"模型训练完成，耗时: {training_time:.2f}秒")
+    print(f"词汇表大小: {len(model.wv.key_to_index)}")
+    print(f"语料总词数: {model.corpus_total_words}，训练速度: {words_per_second:,.0f} 词/秒")
+
+    model.save(model_path)
+    print(f"模型已保存为 '{model_path}'")
+    return model, words_per_second
+
+
+def peak_memory_mb():
+    """当前进程及已结束子进程的峰值常驻内存（MB，Linux下ru_maxrss单位为KB）"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Amazon评论流式语料构建与Word2Vec训练")
+    parser.add_argument("--data", default="train.csv")
+    parser.add_argument("--nrows", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--phrases", action="store_true", help="启用短语检测")
+    parser.add_argument("--skip-corpus", action="store_true", help="复用已有语料文件")
+    args = parser.parse_args()
+
+    print("=== Amazon数据集词向量表示（流式版）===")
+    if not args.skip_corpus:
+        build_corpus_file(args.data, CORPUS_FILE, nrows=args.nrows, workers=args.workers)
+    corpus_path = apply_phrases(CORPUS_FILE) if args.phrases else CORPUS_FILE
+
+    train_word2vec(corpus_path, MODEL_FILE, workers=args.workers)
+    print(f"峰值内存: {peak_memory_mb():.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
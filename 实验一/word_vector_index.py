@@ -0,0 +1,210 @@
+# word_vector_index.py - 词向量导出、批量相似词查询与近似最近邻索引
+# ======================================
+# exp1 对每个词调用一次 model.wv.most_similar，每次都是对整个词表的暴力扫描，
+# 而且需要先把整个 Word2Vec 模型 pickle 读进内存。这里：
+# 1. 把词向量导出为 L2 归一化的 float32 .npy + 词表 json，可以 mmap 秒级加载
+# 2. most_similar_many 一次矩阵乘法 + argpartition 完成一批查询
+# 3. 词表较大时可选 HNSW 索引（需要 hnswlib）
+# 4. 与 gensim 暴力查询对比召回率和延迟
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from gensim.models import Word2Vec
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+MODEL_FILE = "word2vec_amazon_sg.model"
+INDEX_DIR = "word2vec_amazon_index"
+QUERY_BLOCK = 256  # 每次矩阵乘法的查询数，控制 [block, vocab] 得分矩阵的大小
+
+
+def export_vectors(model_path=MODEL_FILE, out_dir=INDEX_DIR):
+    """
+    导出为可内存映射的格式：
+    - vectors.npy   float32 [V, D]，已做L2归一化（点积即余弦相似度）
+    - vocab.json    按行号排列的词表
+    - model.kv      gensim KeyedVectors（大数组单独存为 .npy，可用 mmap='r' 加载）
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    model = Word2Vec.load(model_path)
+    wv = model.wv
+
+    vectors = wv.get_normed_vectors().astype(np.float32)
+    np.save(os.path.join(out_dir, "vectors.npy"), vectors)
+    with open(os.path.join(out_dir, "vocab.json"), 'w', encoding='utf-8') as f:
+        json.dump(list(wv.index_to_key), f, ensure_ascii=False)
+    wv.save(os.path.join(out_dir, "model.kv"), sep_limit=0)
+
+    print(f"✅ 词向量已导出到: {out_dir}（{vectors.shape[0]} 个词，{vectors.shape[1]} 维）")
+    return out_dir
+
+
+class WordVectorIndex:
+    """基于内存映射的词向量索引，支持批量暴力查询与可选的HNSW近似查询"""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        self.index_dir = index_dir
+        self.vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode='r')
+        with open(os.path.join(index_dir, "vocab.json"), 'r', encoding='utf-8') as f:
+            self.words = json.load(f)
+        self.key_to_index = {word: i for i, word in enumerate(self.words)}
+        self.hnsw = None
+        hnsw_path = os.path.join(index_dir, "hnsw.bin")
+        if hnswlib is not None and os.path.exists(hnsw_path):
+            self.load_hnsw(hnsw_path)
+
+    def __contains__(self, word):
+        return word in self.key_to_index
+
+    def __len__(self):
+        return len(self.words)
+
+    def _query_indices(self, words):
+        """返回 (在词表中的查询位置, 对应的词ID)"""
+        positions, indices = [], []
+        for pos, word in enumerate(words):
+            idx = self.key_to_index.get(word)
+            if idx is not None:
+                positions.append(pos)
+                indices.append(idx)
+        return positions, np.asarray(indices, dtype=np.int64)
+
+    def most_similar_many(self, words, topn=10, use_hnsw=False):
+        """
+        批量查询相似词，返回与输入等长的列表，每项格式与 gensim most_similar 相同：
+        [(word, score), ...]；不在词表中的词返回空列表
+        """
+        results = [[] for _ in words]
+        positions, indices = self._query_indices(words)
+        if len(indices) == 0:
+            return results
+        if use_hnsw and self.hnsw is not None:
+            neighbors = self._search_hnsw(indices, topn)
+        else:
+            neighbors = self._search_exact(indices, topn)
+        for pos, row in zip(positions, neighbors):
+            results[pos] = [(self.words[i], float(score)) for i, score in row]
+        return results
+
+    def _search_exact(self, indices, topn):
+        """分块矩阵乘法 + argpartition，只对每行的前 topn+1 个候选排序"""
+        k = min(topn + 1, len(self.words))
+        neighbors = []
+        for start in range(0, len(indices), QUERY_BLOCK):
+            block = indices[start:start + QUERY_BLOCK]
+            scores = np.asarray(self.vectors[block]) @ self.vectors.T
+            scores[np.arange(len(block)), block] = -np.inf  # 排除查询词本身
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)[:, :topn]
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            neighbors.extend(zip(t, s) for t, s in zip(top, top_scores))
+        return [list(row) for row in neighbors]
+
+    def build_hnsw(self, ef_construction=200, M=16, ef=100, threads=-1):
+        """构建并保存HNSW索引（内积空间，向量已归一化即为余弦）"""
+        if hnswlib is None:
+            raise ImportError("构建HNSW索引需要安装 hnswlib: pip install hnswlib")
+        num, dim = self.vectors.shape
+        index = hnswlib.Index(space='ip', dim=dim)
+        index.init_index(max_elements=num, ef_construction=ef_construction, M=M)
+        index.add_items(np.asarray(self.vectors), np.arange(num), num_threads=threads)
+        index.set_ef(ef)
+        index.save_index(os.path.join(self.index_dir, "hnsw.bin"))
+        self.hnsw = index
+        print(f"✅ HNSW索引构建完成（M={M}, ef_construction={ef_construction}）")
+        return index
+
+    def load_hnsw(self, path, ef=100):
+        index = hnswlib.Index(space='ip', dim=self.vectors.shape[1])
+        index.load_index(path, max_elements=len(self.words))
+        index.set_ef(ef)
+        self.hnsw = index
+
+    def _search_hnsw(self, indices, topn):
+        labels, distances = self.hnsw.knn_query(np.asarray(self.vectors[indices]), k=topn + 1)
+        neighbors = []
+        for query, row_labels, row_dist in zip(indices, labels, distances):
+            # hnswlib 的 ip 距离为 1 - 内积
+            row = [(int(i), 1.0 - d) for i, d in zip(row_labels, row_dist) if i != query]
+            neighbors.append(row[:topn])
+        return neighbors
+
+
+def benchmark(model_path=MODEL_FILE, index_dir=INDEX_DIR, num_queries=1000, topn=10, seed=42):
+    """对比 gensim 逐词查询、批量暴力查询与HNSW的延迟和召回率"""
+    index = WordVectorIndex(index_dir)
+    rng = np.random.RandomState(seed)
+    queries = [index.words[i] for i in rng.choice(len(index), min(num_queries, len(index)), replace=False)]
+    report = {'num_queries': len(queries), 'topn': topn}
+
+    start = time.time()
+    wv = Word2Vec.load(model_path).wv
+    report['gensim_load_seconds'] = time.time() - start
+    start = time.time()
+    baseline = [wv.most_similar(word, topn=topn) for word in queries]
+    report['gensim_ms_per_query'] = (time.time() - start) * 1000 / len(queries)
+
+    start = time.time()
+    index = WordVectorIndex(index_dir)
+    report['mmap_load_seconds'] = time.time() - start
+    start = time.time()
+    exact = index.most_similar_many(queries, topn=topn)
+    report['batch_ms_per_query'] = (time.time() - start) * 1000 / len(queries)
+    report['batch_recall'] = _recall(baseline, exact)
+
+    if index.hnsw is not None:
+        start = time.time()
+        approx = index.most_similar_many(queries, topn=topn, use_hnsw=True)
+        report['hnsw_ms_per_query'] = (time.time() - start) * 1000 / len(queries)
+        report['hnsw_recall'] = _recall(baseline, approx)
+
+    print("\n相似词查询基准测试:")
+    for key, value in report.items():
+        print(f"  {key}: {value:.4f}" if isinstance(value, float) else f"  {key}: {value}")
+    return report
+
+
+def _recall(expected, actual):
+    hits = sum(len({w for w, _ in e} & {w for w, _ in a}) for e, a in zip(expected, actual))
+    total = sum(len(e) for e in expected)
+    return hits / max(total, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出词向量并构建批量相似词查询索引")
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--hnsw", action="store_true", help="额外构建HNSW索引")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--topn", type=int, default=10)
+    args = parser.parse_args()
+
+    export_vectors(args.model, args.index_dir)
+    if args.hnsw:
+        WordVectorIndex(args.index_dir).build_hnsw()
+
+    index = WordVectorIndex(args.index_dir)
+    test_words = ['good', 'bad', 'music', 'game', 'book', 'story', 'love', 'great', 'excellent', 'terrible']
+    for word, similar_words in zip(test_words, index.most_similar_many(test_words, topn=5)):
+        if not similar_words:
+            print(f"'{word}' 不在词汇表中")
+            continue
+        print(f"与 '{word}' 最相似的词:")
+        for similar_word, score in similar_words:
+            print(f"  {similar_word}: {score:.4f}")
+
+    report = benchmark(args.model, args.index_dir, args.queries, args.topn)
+    with open(os.path.join(args.index_dir, "benchmark.json"), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# wordcloud_frequencies.py - 词云管线的并行分词与流式词频统计
+# ======================================
+# exp1 在 DataFrame 上串行执行 preprocess_text + jieba 分词，再把所有词拼成一个巨大的列表和 Counter。这里：
+# 1. 按块读取评论，在进程池中分词（jieba 词典每个子进程只加载一次），返回每块的局部词频
+# 2. exact 模式逐块合并 Counter；approx 模式用 Misra-Gries 摘要保留候选高频词、
+#    Count-Min Sketch 估计其频次，内存与输入规模无关
+# 3. 最终词频写入 JSON，WordCloud.generate_from_frequencies 可直接复用，不必重算
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter
+from itertools import islice
+from multiprocessing import Pool
+
+import jieba
+import numpy as np
+import pandas as pd
+
+from word2vec_corpus import detect_review_column
+
+CHUNK_SIZE = 20000
+FREQ_FILE = "word_frequencies.json"
+
+# 与exp1 chinese_text_segmentation 的停用词一致
+STOP_WORDS = frozenset({
+    '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个', '上', '也', '很', '到',
+    '说', '要', '去', '你', '会', '着', '没有', '看', '好', '自己', '这', '但'
+})
+_KEEP_CHARS = re.compile(r'[^\u4e00-\u9fa5a-zA-Z\s]')
+
+
+def preprocess_text(text):
+    """移除特殊字符和数字，保留中文和英文"""
+    if not isinstance(text, str):
+        return ""
+    return _KEEP_CHARS.sub('', text).strip()
+
+
+def chinese_text_segmentation(text):
+    """jieba分词并过滤停用词、短词和纯数字"""
+    if not text:
+        return []
+    return [word for word in (w.strip() for w in jieba.cut(text))
+            if len(word) >= 2 and word not in STOP_WORDS and not word.isdigit()]
+
+
+def _init_segment_worker():
+    # 词典加载较慢，每个子进程只初始化一次
+    jieba.setLogLevel(jieba.logging.WARNING)
+    jieba.initialize()
+
+
+def _count_chunk(texts):
+    counter = Counter()
+    for text in texts:
+        counter.update(chinese_text_segmentation(preprocess_text(text)))
+    return counter
+
+
+class CountMinSketch:
+    """Count-Min Sketch：固定大小的二维计数表，估计值只会偏大"""
+
+    def __init__(self, width=2 ** 20, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        # pandas 哈希要求16字符的 hash_key，每行用不同的键得到相互独立的哈希
+        self.hash_keys = [f"{row:016d}" for row in range(depth)]
+
+    def _columns(self, words):
+        values = np.asarray(words, dtype=object)
+        return [pd.util.hash_array(values, hash_key=key) % self.width for key in self.hash_keys]
+
+    def update(self, counter):
+        if not counter:
+            return
+        words = list(counter.keys())
+        counts = np.fromiter(counter.values(), dtype=np.int64, count=len(words))
+        for row, cols in enumerate(self._columns(words)):
+            np.add.at(self.table[row], cols.astype(np.int64), counts)
+
+    def estimate(self, words):
+        if not words:
+            return np.zeros(0, dtype=np.int64)
+        cols = self._columns(words)
+        return np.min([self.table[row, c.astype(np.int64)] for row, c in enumerate(cols)], axis=0)
+
+
+class HeavyHitters:
+    """
+    近似高频词统计
+    - Misra-Gries 摘要（可合并）：最多保留 capacity 个候选词，漏掉的词频次不超过 N / (capacity + 1)
+    - Count-Min Sketch：为候选词给出频次估计
+    """
+
+    def __init__(self, capacity=20000, sketch_width=2 ** 20, sketch_depth=4):
+        self.capacity = capacity
+        self.summary = Counter()
+        self.sketch = CountMinSketch(sketch_width, sketch_depth)
+        self.total = 0
+
+    def update(self, counter):
+        self.sketch.update(counter)
+        self.total += sum(counter.values())
+        self.summary.update(counter)
+        if len(self.summary) > self.capacity:
+            # 所有计数减去第 capacity+1 大的计数，丢弃非正项
+            cutoff = sorted(self.summary.values(), reverse=True)[self.capacity]
+            self.summary = Counter({w: c - cutoff for w, c in self.summary.items() if c > cutoff})
+
+    def most_common(self, n=None):
+        words = list(self.summary.keys())
+        estimates = self.sketch.estimate(words)
+        ranked = sorted(zip(words, estimates.tolist()), key=lambda x: -x[1])
+        return ranked[:n] if n else ranked
+
+
+def count_frequencies(csv_path, mode='exact', nrows=None, workers=None, capacity=20000):
+    """流式分词并统计词频，返回按频次降序的 [(word, count), ...] 与总词数"""
+    workers = workers or os.cpu_count()
+    review_column = detect_review_column(csv_path)
+    print(f"使用评论列: {review_column}")
+    reader = pd.read_csv(csv_path, usecols=[review_column], chunksize=CHUNK_SIZE, nrows=nrows)
+    chunks = (chunk[review_column].tolist() for chunk in reader)
+
+    counter = Counter() if mode == 'exact' else HeavyHitters(capacity)
+    total_words = 0
+    rows = 0
+    start = time.time()
+    with Pool(workers, initializer=_init_segment_worker) as pool:
+        while True:
+            group = list(islice(chunks, workers))
+            if not group:
+                break
+            for partial in pool.map(_count_chunk, group):
+                total_words += sum(partial.values())
+                counter.update(partial)
+            rows += sum(len(texts) for texts in group)
+            print(f"  已处理 {rows} 条评论（{time.time() - start:.1f} 秒）")
+
+    freqs = counter.most_common()
+    print(f"总词汇数: {total_words}")
+    print(f"唯一词汇数（{'精确' if mode == 'exact' else '近似候选'}）: {len(freqs)}")
+    print(f"前20个最常出现的词: {freqs[:20]}")
+    return freqs, total_words
+
+
+def save_frequencies(freqs, path=FREQ_FILE, top_n=None):
+    """保存为 {word: count} 的JSON（按频次降序），可直接传给 generate_from_frequencies"""
+    freqs = freqs[:top_n] if top_n else freqs
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(freqs), f, ensure_ascii=False, indent=1)
+    print(f"✅ 词频表已保存到: {path}（{len(freqs)} 个词）")
+
+
+def load_frequencies(path=FREQ_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def generate_wordcloud(freq_path=FREQ_FILE, output_path='wordcloud_basic.png', font_path='simhei.ttf'):
+    """直接从词频文件生成词云（参数与exp1基础词云一致）"""
+    from wordcloud import WordCloud
+    import matplotlib.pyplot as plt
+
+    wordcloud = WordCloud(
+        font_path=font_path,
+        width=800,
+        height=600,
+        background_color='white',
+        max_words=200,
+        colormap='viridis',
+        relative_scaling=0.5
+    ).generate_from_frequencies(load_frequencies(freq_path))
+
+    plt.figure(figsize=(15, 10))
+    plt.imshow(wordcloud, interpolation='bilinear')
+    plt.axis('off')
+    plt.tight_layout()
+    plt.savefig(output_path, dpi=300, bbox_inches='tight', facecolor='white')
+    plt.close()
+    print(f"词云图已保存为 '{output_path}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并行分词与流式词频统计")
+    parser.add_argument("--data", default="train.csv")
+    parser.add_argument("--nrows", type=int, default=None)
+    parser.add_argument("--mode", choices=['exact', 'approx'], default='exact')
+    parser.add_argument("--capacity", type=int, default=20000, help="approx 模式保留的候选词数")
+    parser.add_argument("--top-n", type=int, default=None, help="只保存前N个词")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--wordcloud", action="store_true", help="统计完成后生成词云")
+    args = parser.parse_args()
+
+    freqs, _ = count_frequencies(args.data, args.mode, args.nrows, args.workers, args.capacity)
+    save_frequencies(freqs, FREQ_FILE, args.top_n)
+    if args.wordcloud:
+        generate_wordcloud(FREQ_FILE)
+
+
+if __name__ == "__main__":
+    main()
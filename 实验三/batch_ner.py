@@ -0,0 +1,299 @@
+# batch_ner.py - 按长度排序的批量 BioBERT NER（滑动窗口 + 断点续跑）
+# ======================================
+# exp3 的 extract_all_entities 逐行调用 ner_pipeline(title) / ner_pipeline(abstract)，
+# 一次只送一条文本，超过512 token的摘要被静默截断。这里：
+# 1. 长文本切成带重叠（stride）的窗口，窗口内预测按字符偏移映射回原文，
+#    重叠区域取离窗口边缘更远的那次预测，再按 B-/I- 标签合并成实体
+# 2. 所有窗口按长度排序后组批，每批只填充到批内最长
+# 3. 多个CPU进程各自加载一次模型，按分片并行；每完成一个分片就追加写入检查点，中断后可续跑
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+import torch
+from transformers import AutoTokenizer, AutoModelForTokenClassification
+
+MODEL_NAME = "alvaroalon2/biobert_diseases_ner"
+FALLBACK_MODEL_NAME = "dslim/bert-base-NER"
+MAX_LENGTH = 512
+STRIDE = 128
+BATCH_SIZE = 16
+SHARD_SIZE = 200  # 每个分片的文档数，也是检查点粒度
+CHECKPOINT_FILE = "ner_checkpoint.jsonl"
+CATEGORIES = ['gene', 'drug', 'symptom', 'effect']
+
+# 与exp3 extract_entities 的关键词分类一致
+GENE_KEYWORDS = ['gene', 'mutation', 'mutations', 'egfr', 'brca1', 'brca2', 'her2']
+DRUG_KEYWORDS = ['gefitinib', 'olaparib', 'metformin', 'trastuzumab', 'treatment', 'therapy', 'drug']
+SYMPTOM_KEYWORDS = ['symptom', 'cough', 'dyspnea', 'pain', 'abdominal', 'bloating', 'polyuria', 'polydipsia', 'lump']
+EFFECT_KEYWORDS = ['response', 'effective', 'efficacy', 'improved', 'reduced', 'lower', 'control', 'benefit']
+
+
+def load_ner_model(model_name=MODEL_NAME):
+    """加载医学NER模型，失败时退回通用NER模型（与exp3一致）"""
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForTokenClassification.from_pretrained(model_name)
+    except Exception as e:
+        print(f"加载模型 {model_name} 时出错: {e}，使用备用模型 {FALLBACK_MODEL_NAME}")
+        model_name = FALLBACK_MODEL_NAME
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForTokenClassification.from_pretrained(model_name)
+    model.eval()
+    return tokenizer, model
+
+
+class BatchNER:
+    """对一批文本做窗口化、排序组批的token分类，返回与 pipeline(aggregation_strategy="simple") 类似的实体"""
+
+    def __init__(self, tokenizer, model, max_length=MAX_LENGTH, stride=STRIDE, batch_size=BATCH_SIZE):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_length = max_length
+        self.stride = stride
+        self.batch_size = batch_size
+        self.id2label = model.config.id2label
+
+    def _windows(self, texts):
+        """切分滑动窗口；fast tokenizer 的 offset_mapping 直接是原文中的字符偏移"""
+        encoded = self.tokenizer(
+            texts,
+            truncation=True,
+            max_length=self.max_length,
+            stride=self.stride,
+            return_overflowing_tokens=True,
+            return_offsets_mapping=True,
+            return_special_tokens_mask=True,
+        )
+        return [
+            {
+                'sample': sample,
+                'input_ids': encoded['input_ids'][i],
+                'offsets': encoded['offset_mapping'][i],
+                'special': encoded['special_tokens_mask'][i],
+            }
+            for i, sample in enumerate(encoded['overflow_to_sample_mapping'])
+        ]
+
+    @torch.no_grad()
+    def _predict_windows(self, windows):
+        """按长度排序组批推理，为每个窗口填入 labels / scores"""
+        order = sorted(range(len(windows)), key=lambda i: len(windows[i]['input_ids']))
+        for start in range(0, len(order), self.batch_size):
+            batch = [windows[i] for i in order[start:start + self.batch_size]]
+            padded = self.tokenizer.pad({'input_ids': [w['input_ids'] for w in batch]}, return_tensors='pt')
+            logits = self.model(**padded).logits
+            probs = torch.softmax(logits, dim=-1)
+            scores, labels = probs.max(dim=-1)
+            for w, label_row, score_row in zip(batch, labels.tolist(), scores.tolist()):
+                n = len(w['input_ids'])
+                w['labels'] = label_row[:n]
+                w['scores'] = score_row[:n]
+
+    def _merge_windows(self, windows, num_texts):
+        """
+        把窗口内的token预测映射回原文：同一字符区间在多个窗口中出现时，
+        保留离窗口边缘最远（上下文最充分）的那次预测
+        """
+        tokens = [{} for _ in range(num_texts)]
+        for w in windows:
+            n = len(w['input_ids'])
+            for i, ((start, end), special) in enumerate(zip(w['offsets'], w['special'])):
+                if special or start == end:
+                    continue
+                context = min(i, n - 1 - i)
+                best = tokens[w['sample']].get((start, end))
+                if best is None or context > best[0]:
+                    tokens[w['sample']][(start, end)] = (context, w['labels'][i], w['scores'][i])
+        return [sorted((span, label, score) for span, (_, label, score) in t.items()) for t in tokens]
+
+    def _aggregate(self, text, token_preds):
+        """B-/I- 标签合并为实体；同类型的子词（与前一个token首尾相接）并入当前实体"""
+        entities = []
+        current = None
+        for (start, end), label_id, score in token_preds:
+            label = self.id2label[label_id]
+            if label == 'O':
+                current = None
+                continue
+            prefix, _, entity_type = label.partition('-') if '-' in label else ('B', '', label)
+            continues = current is not None and current['entity_group'] == entity_type and \
+                (prefix == 'I' or start == current['end'])
+            if continues:
+                current['end'] = end
+                current['scores'].append(score)
+            else:
+                current = {'entity_group': entity_type, 'start': start, 'end': end, 'scores': [score]}
+                entities.append(current)
+        return [
+            {
+                'entity_group': e['entity_group'],
+                'word': text[e['start']:e['end']],
+                'start': e['start'],
+                'end': e['end'],
+                'score': float(np.mean(e['scores'])),
+            }
+            for e in entities
+        ]
+
+    def __call__(self, texts):
+        texts = [t if isinstance(t, str) else '' for t in texts]
+        windows = self._windows(texts)
+        if windows:
+            self._predict_windows(windows)
+        merged = self._merge_windows(windows, len(texts))
+        return [self._aggregate(text, preds) for text, preds in zip(texts, merged)]
+
+
+def categorize_entities(entities):
+    """按exp3的关键词规则把NER实体分到 gene / drug / symptom / effect"""
+    categories = {category: set() for category in CATEGORIES}
+    for entity in entities:
+        entity_text = entity['word'].lower()
+        entity_type = entity['entity_group'].lower()
+        if any(k in entity_text for k in GENE_KEYWORDS) or 'gene' in entity_type:
+            categories['gene'].add(entity_text)
+        elif any(k in entity_text for k in DRUG_KEYWORDS) or 'drug' in entity_type:
+            categories['drug'].add(entity_text)
+        elif any(k in entity_text for k in SYMPTOM_KEYWORDS) or 'symptom' in entity_type:
+            categories['symptom'].add(entity_text)
+        elif any(k in entity_text for k in EFFECT_KEYWORDS) or 'effect' in entity_type:
+            categories['effect'].add(entity_text)
+        elif 'disease' in entity_type:
+            categories['symptom'].add(entity_text)
+        elif 'chemical' in entity_type:
+            categories['drug'].add(entity_text)
+    # 清理实体：移除标点开头和过短的实体（与 extract_all_entities 一致）
+    return {c: sorted(e for e in v if len(e.strip()) > 2 and not e.strip().startswith('.'))
+            for c, v in categories.items()}
+
+
+_worker_state = {}
+
+
+def _init_ner_worker(model_name, threads, batch_size):
+    torch.set_num_threads(threads)
+    tokenizer, model = load_ner_model(model_name)
+    _worker_state['ner'] = BatchNER(tokenizer, model, batch_size=batch_size)
+
+
+def _process_shard(records):
+    """records: [(doc_id, title, abstract), ...]；标题与摘要一起排序组批"""
+    ner = _worker_state['ner']
+    titles = [r[1] for r in records]
+    abstracts = [r[2] for r in records]
+    predictions = ner(titles + abstracts)
+    results = []
+    for i, (doc_id, title, _) in enumerate(records):
+        raw = predictions[i] + predictions[len(records) + i]
+        results.append({
+            'id': doc_id,
+            'title': title,
+            'entities': categorize_entities(raw),
+            'raw_entities': raw,
+        })
+    return results
+
+
+def read_checkpoint(path=CHECKPOINT_FILE):
+    """读取已完成的结果；最后一行可能因中断而不完整，直接跳过"""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            done[item['id']] = item
+    return done
+
+
+def extract_all_entities(df, id_col='pmid', title_col='title', abstract_col='abstract',
+                         model_name=MODEL_NAME, workers=1, checkpoint_path=CHECKPOINT_FILE,
+                         shard_size=SHARD_SIZE, batch_size=BATCH_SIZE):
+    """
+    批量版 extract_all_entities：返回 [{'pmid', 'title', 'entities'}, ...]（与exp3顺序一致）
+    已写入检查点的文档不会重复处理
+    """
+    done = read_checkpoint(checkpoint_path)
+    records = [(str(row[0]), '' if pd.isna(row[1]) else str(row[1]), '' if pd.isna(row[2]) else str(row[2]))
+               for row in df[[id_col, title_col, abstract_col]].itertuples(index=False)]
+    todo = [r for r in records if r[0] not in done]
+    print(f"共 {len(records)} 篇文档，检查点中已完成 {len(records) - len(todo)} 篇，待处理 {len(todo)} 篇")
+
+    shards = [todo[i:i + shard_size] for i in range(0, len(todo), shard_size)]
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    start = time.time()
+    processed = 0
+    with open(checkpoint_path, 'a', encoding='utf-8') as ckpt:
+        def write(results):
+            nonlocal processed
+            for item in results:
+                ckpt.write(json.dumps(item, ensure_ascii=False) + '\n')
+                done[item['id']] = item
+            ckpt.flush()
+            processed += len(results)
+            rate = processed / max(time.time() - start, 1e-9)
+            print(f"  已处理 {processed}/{len(todo)} 篇（{rate:.1f} 篇/秒）")
+
+        if workers <= 1:
+            _init_ner_worker(model_name, threads, batch_size)
+            for shard in shards:
+                write(_process_shard(shard))
+        else:
+            with Pool(workers, initializer=_init_ner_worker, initargs=(model_name, threads, batch_size)) as pool:
+                for results in pool.imap_unordered(_process_shard, shards):
+                    write(results)
+
+    return [{'pmid': done[r[0]]['id'], 'title': done[r[0]]['title'], 'entities': done[r[0]]['entities']}
+            for r in records]
+
+
+def save_results(all_entities, path):
+    """导出与 entity_extraction_results_*.csv 类似的汇总表"""
+    rows = []
+    for item in all_entities:
+        row = {'id': item['pmid'], 'text_preview': item['title'][:100] + '...'}
+        for category in CATEGORIES:
+            row[f"{category}_count"] = len(item['entities'][category])
+        for category in CATEGORIES:
+            row[f"{category}s"] = ', '.join(item['entities'][category])
+        rows.append(row)
+    pd.DataFrame(rows).to_csv(path, index=False, encoding='utf-8')
+    print(f"✅ 实体抽取结果已保存到: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量BioBERT实体抽取（可断点续跑）")
+    parser.add_argument("--input", default="sample_medical_data.csv")
+    parser.add_argument("--output", default="entity_extraction_results_ner.csv")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--nrows", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.input.endswith('.jsonl'):
+        # pdf_extraction.py 的逐页输出
+        from pdf_extraction import load_documents_frame
+        df = load_documents_frame(args.input).head(args.nrows)
+    else:
+        df = pd.read_csv(args.input, nrows=args.nrows)
+    start = time.time()
+    all_entities = extract_all_entities(df, model_name=args.model, workers=args.workers,
+                                        checkpoint_path=args.checkpoint, shard_size=args.shard_size,
+                                        batch_size=args.batch_size)
+    print(f"实体抽取完成，耗时 {time.time() - start:.1f} 秒")
+    save_results(all_entities, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# cooccurrence.py - 基于稀疏矩阵的实体共现计算
+# ======================================
+# exp33 的 build_focused_knowledge_graph 用 iterrows() 和双重循环把实体对计入元组字典，
+# 节点ID用 hash(name) % 10000 生成，既可能冲突，也会因哈希随机化而每次运行不同。这里：
+# 1. 流式构建 “文档 × 实体” 的 CSR 0/1 矩阵 X
+# 2. 共现矩阵 C = XᵀX（只取上三角），按共现次数和 PMI/NPMI 剪枝
+# 3. 实体ID按 (频次降序, 实体键升序) 排名确定，同样的输入总得到同样的ID
+import argparse
+import json
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+ENTITY_CATEGORIES = ['disease', 'symptom', 'treatment', 'demographic']
+OUTPUT_FILE = "cooccurrence_knowledge_graph.json"  # 默认不覆盖已提交的 focused_knowledge_graph.json
+
+
+def build_doc_entity_matrix(entity_records, min_length=3):
+    """
+    entity_records: 可迭代的 {category: [entity, ...]}（extract_clinical_entities_fast 的输出）
+    返回 (X, entity_keys)：X 为 CSR [文档数, 实体数] 0/1 矩阵，entity_keys[i] 为 "category:name"
+    实体ID按频次降序、同频按实体键排序，与输入顺序以外的因素无关
+    """
+    key_to_tmp = {}
+    indices = []
+    indptr = [0]
+    for entities in entity_records:
+        doc = set()
+        for category, entity_list in entities.items():
+            for entity in entity_list:
+                if entity and len(entity) >= min_length:
+                    doc.add(key_to_tmp.setdefault(f"{category}:{entity}", len(key_to_tmp)))
+        indices.extend(doc)
+        indptr.append(len(indices))
+
+    num_docs, num_entities = len(indptr) - 1, len(key_to_tmp)
+    indices = np.asarray(indices, dtype=np.int64)
+    indptr = np.asarray(indptr, dtype=np.int64)
+    freq = np.bincount(indices, minlength=num_entities)
+
+    # 把临时ID重编号为确定性ID
+    tmp_keys = np.array(list(key_to_tmp.keys()), dtype=object)
+    order = np.lexsort((tmp_keys.astype(str), -freq))
+    remap = np.empty(num_entities, dtype=np.int64)
+    remap[order] = np.arange(num_entities)
+
+    data = np.ones(len(indices), dtype=np.int32)
+    X = sparse.csr_matrix((data, remap[indices], indptr), shape=(num_docs, num_entities))
+    X.sort_indices()
+    return X, tmp_keys[order].tolist()
+
+
+def compute_cooccurrence(X, min_entity_freq=2, min_cooccurrence=3, min_npmi=None):
+    """
+    返回 (entity_ids, entity_freq, pairs)：
+    - entity_ids / entity_freq: 出现次数 ≥ min_entity_freq 的实体及其文档频次
+    - pairs: DataFrame[i, j, count, pmi, npmi]，i < j，已按 count 降序
+    """
+    num_docs = X.shape[0]
+    entity_freq = np.asarray(X.sum(axis=0)).ravel()
+    keep = np.nonzero(entity_freq >= min_entity_freq)[0]
+    Xk = X[:, keep].astype(np.int64)
+
+    C = sparse.triu(Xk.T @ Xk, k=1).tocoo()
+    mask = C.data >= min_cooccurrence
+    i, j, count = keep[C.row[mask]], keep[C.col[mask]], C.data[mask].astype(np.int64)
+
+    # PMI = log(p(i,j) / (p(i) p(j)))，NPMI = PMI / -log p(i,j) ∈ [-1, 1]
+    p_ij = count / num_docs
+    pmi = np.log(p_ij) - np.log(entity_freq[i] / num_docs) - np.log(entity_freq[j] / num_docs)
+    npmi = np.where(p_ij < 1, pmi / np.maximum(-np.log(p_ij), 1e-12), 1.0)
+
+    pairs = pd.DataFrame({'i': i, 'j': j, 'count': count, 'pmi': pmi, 'npmi': npmi})
+    if min_npmi is not None:
+        pairs = pairs[pairs['npmi'] >= min_npmi]
+    pairs = pairs.sort_values(['count', 'i', 'j'], ascending=[False, True, True]).reset_index(drop=True)
+    return keep, entity_freq[keep], pairs
+
+
+def node_id(entity_key, entity_id):
+    category = entity_key.split(":", 1)[0]
+    return f"{category}_{entity_id:04d}"
+
+
+def build_focused_knowledge_graph(entity_records, min_cooccurrence=3, min_entity_freq=2, min_npmi=None):
+    """
+    与exp33同名函数输出格式一致：(nodes, edges, significant_entities, significant_cooccurrences)
+    边属性额外包含 pmi / npmi
+    """
+    print("分析实体共现关系...")
+    start = time.time()
+    X, entity_keys = build_doc_entity_matrix(entity_records)
+    num_docs = X.shape[0]
+    print(f"  文档×实体矩阵: {X.shape[0]} × {X.shape[1]}，非零元 {X.nnz}")
+
+    entity_ids, freqs, pairs = compute_cooccurrence(X, min_entity_freq, min_cooccurrence, min_npmi)
+    print(f"  保留 {len(entity_ids)} 个重要实体（出现≥{min_entity_freq}次）")
+    print(f"  保留 {len(pairs)} 对重要关系（共现≥{min_cooccurrence}次"
+          f"{f'，NPMI≥{min_npmi}' if min_npmi is not None else ''}）")
+
+    nodes = []
+    significant_entities = {}
+    for eid, freq in zip(entity_ids.tolist(), freqs.tolist()):
+        key = entity_keys[eid]
+        category, name = key.split(":", 1)
+        significant_entities[key] = freq
+        nodes.append({
+            'id': node_id(key, eid),
+            'label': category.capitalize(),
+            'properties': {
+                'name': name,
+                'type': category,
+                'frequency': freq,
+                'importance': freq / num_docs
+            }
+        })
+
+    edges = []
+    significant_cooccurrences = {}
+    for i, j, weight, pmi, npmi in pairs.itertuples(index=False):
+        significant_cooccurrences[(entity_keys[i], entity_keys[j])] = int(weight)
+        edges.append({
+            'source': node_id(entity_keys[i], i),
+            'target': node_id(entity_keys[j], j),
+            'type': 'ASSOCIATED_WITH',
+            'properties': {
+                'weight': int(weight),
+                'strength': 'strong' if weight >= 5 else ('medium' if weight >= 3 else 'weak'),
+                'pmi': round(float(pmi), 4),
+                'npmi': round(float(npmi), 4)
+            }
+        })
+
+    print(f"  共现计算完成，耗时 {time.time() - start:.2f} 秒")
+    return nodes, edges, significant_entities, significant_cooccurrences
+
+
+# exp33 extract_clinical_entities_fast 中的人口统计学规则：年龄取第一个匹配，性别取第一个匹配
+AGE_PATTERNS = [r'(\d+)\s*year old', r'(\d+)\s*yo', r'(\d+)\s*years old', r'(\d+)\s*yr old']
+GENDER_PATTERNS = [r'\b(woman|female|f)\b', r'\b(man|male|m)\b', r'\b(gentleman|gentlemen)\b', r'\b(lady|ladies)\b']
+FEMALE_WORDS = {'woman', 'female', 'f', 'lady', 'ladies'}
+
+
+def extract_demographics(text):
+    """按exp33的规则从文本中提取 age_<n> / gender_<female|male>"""
+    if not isinstance(text, str):
+        return []
+    # exp33 先做预处理（小写、yo → year old）再匹配
+    text = re.sub(r'\byo\b', 'year old', text.lower())
+    entities = []
+    for pattern in AGE_PATTERNS:
+        match = re.search(pattern, text)
+        if match:
+            entities.append(f"age_{match.group(1)}")
+            break
+    for pattern in GENDER_PATTERNS:
+        match = re.search(pattern, text)
+        if match:
+            entities.append("gender_female" if match.group(1) in FEMALE_WORDS else "gender_male")
+            break
+    return entities
+
+
+def load_entity_records(csv_path):
+    """
+    读取 entity_extraction_results_*.csv（逗号分隔的 diseases/symptoms/treatments 列）
+    结果文件没有 demographic 列时，按exp33的规则从 text_preview（年龄、性别都在病历开头）重新提取
+    """
+    df = pd.read_csv(csv_path)
+    records = [{} for _ in range(len(df))]
+    for category in ENTITY_CATEGORIES:
+        column = f"{category}s"
+        if column in df.columns:
+            values = df[column].fillna('').str.split(r',\s*')
+        elif category == 'demographic':
+            text_column = 'text' if 'text' in df.columns else 'text_preview'
+            values = df[text_column].map(extract_demographics)
+        else:
+            print(f"⚠️ {csv_path} 缺少 {column} 列")
+            continue
+        for record, entities in zip(records, values):
+            record[category] = [e for e in entities if e]
+    return records
+
+
+def save_graph(nodes, edges, significant_entities, significant_cooccurrences, num_docs,
+               min_cooccurrence, path=OUTPUT_FILE):
+    """保存为与 focused_knowledge_graph.json 相同的结构"""
+    sorted_entities = sorted(significant_entities.items(), key=lambda x: (-x[1], x[0]))
+    sorted_cooccur = sorted(significant_cooccurrences.items(), key=lambda x: (-x[1], x[0]))
+    graph_data = {
+        'metadata': {
+            'num_patients': num_docs,
+            'num_entities': len(nodes),
+            'num_relationships': len(edges),
+            'min_cooccurrence': min_cooccurrence,
+            'date_created': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+        },
+        'nodes': nodes,
+        'edges': edges,
+        'statistics': {
+            'top_entities': sorted_entities[:50],
+            'top_relationships': sorted_cooccur[:50]
+        }
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(graph_data, f, ensure_ascii=False, indent=2)
+    print(f"💾 知识图谱数据已保存为 '{path}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="稀疏矩阵实体共现网络")
+    parser.add_argument("--input", default="entity_extraction_results_10000_samples.csv")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--min-cooccurrence", type=int, default=3)
+    parser.add_argument("--min-npmi", type=float, default=None)
+    args = parser.parse_args()
+
+    records = load_entity_records(args.input)
+    nodes, edges, entity_freq, cooccurrences = build_focused_knowledge_graph(
+        records, args.min_cooccurrence, min_npmi=args.min_npmi)
+    print(f"\n✅ 知识图谱构建完成！节点数: {len(nodes)}，边数: {len(edges)}")
+    save_graph(nodes, edges, entity_freq, cooccurrences, len(records), args.min_cooccurrence, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+# neo4j_bulk_loader.py - 知识图谱批量写入Neo4j
+# ======================================
+# exp3 的 Neo4jConnection.create_node / create_relationship 每个节点、每条边各开一次会话执行一条Cypher，
+# 关系匹配 MATCH (a {id: ...}) 不带标签，无法使用索引。这里：
+# 1. 节点按标签、关系按 (起点标签, 类型, 终点标签) 分组，以参数化 UNWIND 批量写入
+# 2. 为每个标签建立 id 唯一约束，MERGE / MATCH 走索引
+# 3. 写入目标抽象为 GraphSink：Neo4jSink 复用一个驱动连接池并对瞬时错误重试，
+#    InMemorySink 在本地无需Neo4j即可验证
+# 4. 可选导出 neo4j-admin import 所需的CSV，用于离线全量导入
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from collections import defaultdict
+
+NEO4J_URI = "bolt://localhost:7687"
+NEO4J_USER = "neo4j"
+NEO4J_PASSWORD = "your_password"
+BATCH_SIZE = 1000
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _check_identifier(name):
+    """标签和关系类型无法参数化，只允许合法标识符拼入Cypher"""
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"非法的标签或关系类型: {name!r}")
+    return name
+
+
+class GraphSink:
+    """图写入目标接口"""
+
+    def ensure_constraints(self, labels):
+        pass
+
+    def write_nodes(self, label, rows):
+        """rows: [{'id': ..., 'properties': {...}}, ...]"""
+        raise NotImplementedError
+
+    def write_relationships(self, source_label, rel_type, target_label, rows):
+        """rows: [{'source': ..., 'target': ..., 'properties': {...}}, ...]"""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class InMemorySink(GraphSink):
+    """内存实现：语义与 Neo4jSink 的 MERGE + SET += 一致，用于本地测试和演练"""
+
+    def __init__(self):
+        self.nodes = {}
+        self.relationships = {}
+        self.batches = 0
+
+    def write_nodes(self, label, rows):
+        _check_identifier(label)
+        self.batches += 1
+        for row in rows:
+            node = self.nodes.setdefault((label, row['id']), {})
+            node.update(row['properties'])
+
+    def write_relationships(self, source_label, rel_type, target_label, rows):
+        for name in (source_label, rel_type, target_label):
+            _check_identifier(name)
+        self.batches += 1
+        for row in rows:
+            # 与 MATCH 语义一致：端点不存在时不创建关系
+            if (source_label, row['source']) not in self.nodes or (target_label, row['target']) not in self.nodes:
+                continue
+            rel = self.relationships.setdefault((row['source'], rel_type, row['target']), {})
+            rel.update(row['properties'])
+
+    def clear(self):
+        self.nodes.clear()
+        self.relationships.clear()
+
+
+class Neo4jSink(GraphSink):
+    """Neo4j实现：整个加载过程复用一个驱动（自带连接池），每批一个写事务"""
+
+    def __init__(self, uri=NEO4J_URI, user=NEO4J_USER, password=NEO4J_PASSWORD,
+                 database=None, max_retries=3, retry_delay=1.0):
+        from neo4j import GraphDatabase
+        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        self.database = database
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def _retry(self, work):
+        """在新会话上执行 work(session)，瞬时错误按指数退避重试"""
+        from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.driver.session(database=self.database) as session:
+                    return work(session)
+            except (ServiceUnavailable, SessionExpired, TransientError) as e:
+                if attempt == self.max_retries:
+                    raise
+                wait = self.retry_delay * 2 ** attempt
+                print(f"  写入失败（{e.__class__.__name__}），{wait:.1f} 秒后重试...")
+                time.sleep(wait)
+
+    def _run(self, query, **params):
+        return self._retry(lambda session: session.execute_write(lambda tx: tx.run(query, **params).consume()))
+
+    def ensure_constraints(self, labels):
+        for label in labels:
+            _check_identifier(label)
+            self._run(f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.id IS UNIQUE")
+
+    def write_nodes(self, label, rows):
+        query = f"""
+        UNWIND $rows AS row
+        MERGE (n:{_check_identifier(label)} {{id: row.id}})
+        SET n += row.properties
+        """
+        self._run(query, rows=rows)
+
+    def write_relationships(self, source_label, rel_type, target_label, rows):
+        query = f"""
+        UNWIND $rows AS row
+        MATCH (a:{_check_identifier(source_label)} {{id: row.source}})
+        MATCH (b:{_check_identifier(target_label)} {{id: row.target}})
+        MERGE (a)-[r:{_check_identifier(rel_type)}]->(b)
+        SET r += row.properties
+        """
+        self._run(query, rows=rows)
+
+    def clear(self):
+        # 分批删除，避免大图一次性 DETACH DELETE 撑爆事务内存。
+        # CALL { ... } IN TRANSACTIONS 只能在自动提交事务中执行，不能像批量写入那样放进 execute_write，
+        # 因此用 session.run 直接提交（仍走同样的重试）
+        self._retry(lambda session: session.run(
+            "MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS").consume())
+
+    def close(self):
+        self.driver.close()
+
+
+def _batches(rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+class BulkGraphWriter:
+    """把 nodes / relationships（exp3 导出的结构）分组后批量写入 sink"""
+
+    def __init__(self, sink, batch_size=BATCH_SIZE):
+        self.sink = sink
+        self.batch_size = batch_size
+
+    def load(self, nodes, relationships, clear_existing=False):
+        start = time.time()
+        if clear_existing:
+            print("清空现有数据库...")
+            self.sink.clear()
+
+        node_groups = defaultdict(list)
+        node_label = {}
+        for node in nodes:
+            node_groups[node['label']].append({'id': node['id'], 'properties': node['properties']})
+            node_label[node['id']] = node['label']
+
+        rel_groups = defaultdict(list)
+        skipped = 0
+        for rel in relationships:
+            source_label = node_label.get(rel['source'])
+            target_label = node_label.get(rel['target'])
+            if source_label is None or target_label is None:
+                skipped += 1
+                continue
+            rel_groups[(source_label, rel['type'], target_label)].append({
+                'source': rel['source'],
+                'target': rel['target'],
+                'properties': rel.get('properties') or {}
+            })
+
+        self.sink.ensure_constraints(sorted(node_groups))
+        batches = 0
+        for label, rows in node_groups.items():
+            for batch in _batches(rows, self.batch_size):
+                self.sink.write_nodes(label, batch)
+                batches += 1
+            print(f"  {label}: {len(rows)} 个节点")
+        for (source_label, rel_type, target_label), rows in rel_groups.items():
+            for batch in _batches(rows, self.batch_size):
+                self.sink.write_relationships(source_label, rel_type, target_label, batch)
+                batches += 1
+            print(f"  ({source_label})-[{rel_type}]->({target_label}): {len(rows)} 个关系")
+        if skipped:
+            print(f"  ⚠️ 跳过 {skipped} 个端点不存在的关系")
+
+        stats = {
+            'nodes': len(nodes),
+            'relationships': len(relationships) - skipped,
+            'batches': batches,
+            'seconds': time.time() - start
+        }
+        print(f"知识图谱写入完成！{stats['nodes']} 个节点，{stats['relationships']} 个关系，"
+              f"{batches} 个批次，耗时 {stats['seconds']:.2f} 秒")
+        return stats
+
+
+def load_graph_file(path):
+    """读取 knowledge_graph.json（relationships）或 focused_knowledge_graph.json（edges）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data['nodes'], data.get('relationships', data.get('edges', []))
+
+
+def _csv_type(values):
+    if all(isinstance(v, bool) for v in values):
+        return 'boolean'
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return 'long'
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return 'double'
+    return 'string'
+
+
+def _property_columns(items):
+    keys = sorted({k for item in items for k in item})
+    return [(k, _csv_type([item[k] for item in items if k in item])) for k in keys]
+
+
+def export_admin_import_csv(nodes, relationships, out_dir="neo4j_import"):
+    """
+    导出 neo4j-admin database import 使用的CSV（每个标签/关系类型一个文件），
+    返回对应的导入命令
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    args = []
+
+    node_groups = defaultdict(list)
+    for node in nodes:
+        node_groups[node['label']].append(node)
+    for label, group in node_groups.items():
+        columns = _property_columns([n['properties'] for n in group])
+        path = os.path.join(out_dir, f"nodes_{label}.csv")
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['id:ID', ':LABEL'] + [f"{k}:{t}" for k, t in columns])
+            for node in group:
+                writer.writerow([node['id'], label] + [node['properties'].get(k, '') for k, _ in columns])
+        args.append(f"--nodes={path}")
+
+    rel_groups = defaultdict(list)
+    for rel in relationships:
+        rel_groups[rel['type']].append(rel)
+    for rel_type, group in rel_groups.items():
+        columns = _property_columns([r.get('properties') or {} for r in group])
+        path = os.path.join(out_dir, f"relationships_{rel_type}.csv")
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([':START_ID', ':END_ID', ':TYPE'] + [f"{k}:{t}" for k, t in columns])
+            for rel in group:
+                props = rel.get('properties') or {}
+                writer.writerow([rel['source'], rel['target'], rel_type] + [props.get(k, '') for k, _ in columns])
+        args.append(f"--relationships={path}")
+
+    command = "neo4j-admin database import full neo4j --overwrite-destination " + " ".join(args)
+    print(f"✅ neo4j-admin 导入文件已写入: {out_dir}")
+    print(f"   导入命令: {command}")
+    return command
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量写入知识图谱到Neo4j")
+    parser.add_argument("--input", default="focused_knowledge_graph.json")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--uri", default=NEO4J_URI)
+    parser.add_argument("--user", default=NEO4J_USER)
+    parser.add_argument("--password", default=NEO4J_PASSWORD)
+    parser.add_argument("--clear", action="store_true", help="写入前清空数据库")
+    parser.add_argument("--dry-run", action="store_true", help="写入内存图而不连接Neo4j")
+    parser.add_argument("--admin-csv", default=None, help="导出 neo4j-admin import CSV 的目录")
+    args = parser.parse_args()
+
+    nodes, relationships = load_graph_file(args.input)
+    print(f"读取 {args.input}: {len(nodes)} 个节点，{len(relationships)} 个关系")
+    if args.admin_csv:
+        export_admin_import_csv(nodes, relationships, args.admin_csv)
+        return
+
+    sink = InMemorySink() if args.dry_run else Neo4jSink(args.uri, args.user, args.password)
+    try:
+        BulkGraphWriter(sink, args.batch_size).load(nodes, relationships, clear_existing=args.clear)
+    finally:
+        sink.close()
+
+
+if __name__ == "__main__":
+    main()
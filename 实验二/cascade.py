@@ -0,0 +1,290 @@
+# cascade.py - 按置信度逐级升级的情感分类级联
+# ======================================
+# 仓库里有三档情感模型：流式TF-IDF线性基线/TextCNN（快）、exp2.2的BERT、微调后的Qwen（准但慢），
+# 但每条预测路径只用其中一个。这里：
+# 1. 所有输入先由最便宜的一档打分，概率差 |p正-p负| 低于该档阈值的样本成批交给下一档，最后一档全部接收
+# 2. 在 dev.csv 上让每一档各跑一遍，记录概率和单条耗时，网格搜索各档阈值：
+#    在达到目标准确率的组合中选平均成本最低的；阈值为 None 表示跳过该档
+# 3. 推理时统计每档的流量（进入/判定条数）、耗时和每条评论的平均成本，阈值保存为JSON供复用
+import argparse
+import json
+import os
+import time
+from itertools import product
+
+import numpy as np
+
+from data_utils import LABEL_NAMES, load_reviews
+
+THRESHOLDS_PATH = "saved_models/cascade_thresholds.json"
+BERT_MODEL_PATH = "saved_models/bert_sentiment_model"
+BERT_TOKENIZER_PATH = "saved_models/bert_tokenizer"
+BERT_MAX_LENGTH = 170  # 与exp2.2训练时一致
+DEFAULT_TIERS = ['baseline', 'textcnn', 'bert', 'qwen']
+GRID_POINTS = 20
+TARGET_TOLERANCE = 0.005  # 未指定目标准确率时，允许比最后一档低这么多
+
+
+# ========== 各档模型 ==========
+def _load_baseline():
+    from streaming_baselines import StreamingBaseline
+    return StreamingBaseline()
+
+
+def _load_textcnn():
+    from distill import STUDENT_PATH
+    from textcnn_model import CHECKPOINT_PATH, TextCNNClassifier
+    # 优先使用蒸馏出的学生模型：它与其余各档一样读取 标题+正文
+    path = STUDENT_PATH if os.path.exists(STUDENT_PATH) else CHECKPOINT_PATH
+    return TextCNNClassifier.load(path)
+
+
+def _load_bert():
+    from sentiment_service import SentimentPredictor
+    return SentimentPredictor(BERT_MODEL_PATH, max_length=BERT_MAX_LENGTH, tokenizer_path=BERT_TOKENIZER_PATH)
+
+
+def _load_qwen():
+    from sentiment_service import SentimentPredictor
+    return SentimentPredictor()
+
+
+TIER_LOADERS = {
+    'baseline': _load_baseline,
+    'textcnn': _load_textcnn,
+    'bert': _load_bert,
+    'qwen': _load_qwen,
+}
+
+
+def load_tiers(names=DEFAULT_TIERS):
+    """按顺序加载各档模型，缺少权重的档跳过；返回 [(名称, 模型), ...]"""
+    tiers = []
+    for name in names:
+        try:
+            tiers.append((name, TIER_LOADERS[name]()))
+            print(f"✅ 已加载 {name}")
+        except OSError as e:
+            print(f"⚠️ 跳过 {name}: {e}")
+    if not tiers:
+        raise RuntimeError("没有可用的情感模型")
+    return tiers
+
+
+def margins(probs):
+    """概率差 |p正 - p负|，二分类下等价于置信度 2p-1"""
+    probs = np.asarray(probs, dtype=np.float32)
+    return np.abs(probs[:, 1] - probs[:, 0])
+
+
+# ========== 级联推理 ==========
+class CascadeClassifier:
+    """
+    tiers: [(名称, 模型)]，按成本从低到高；模型需提供 predict_proba(texts) -> [N, 2]
+    thresholds: {名称: 阈值}；概率差 >= 阈值即在该档判定，None 表示跳过该档，最后一档不需要阈值
+    """
+
+    def __init__(self, tiers, thresholds):
+        self.tiers = [(name, model) for name, model in tiers[:-1] if thresholds.get(name) is not None]
+        self.tiers.append(tiers[-1])
+        self.thresholds = thresholds
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {name: {'seen': 0, 'decided': 0, 'seconds': 0.0} for name, _ in self.tiers}
+
+    def predict_proba(self, texts):
+        """返回 (概率 [N, 2], 判定档名列表)；每档只处理上一档留下的低置信样本"""
+        texts = [str(t) for t in texts]
+        probs = np.zeros((len(texts), 2), dtype=np.float32)
+        decided_by = [None] * len(texts)
+        pending = np.arange(len(texts))
+
+        for i, (name, model) in enumerate(self.tiers):
+            if len(pending) == 0:
+                break
+            start = time.time()
+            tier_probs = np.asarray(model.predict_proba([texts[j] for j in pending]), dtype=np.float32)
+            stats = self.stats[name]
+            stats['seconds'] += time.time() - start
+            stats['seen'] += len(pending)
+
+            if i == len(self.tiers) - 1:
+                accept = np.ones(len(pending), dtype=bool)
+            else:
+                accept = margins(tier_probs) >= self.thresholds[name]
+            probs[pending[accept]] = tier_probs[accept]
+            for j in pending[accept]:
+                decided_by[j] = name
+            stats['decided'] += int(accept.sum())
+            pending = pending[~accept]
+        return probs, decided_by
+
+    def predict(self, texts):
+        """返回 [(情感文本, 置信度, 标签), ...]，与 SentimentPredictor.predict 一致"""
+        probs, _ = self.predict_proba(texts)
+        labels = probs.argmax(axis=1)
+        return [(LABEL_NAMES[label], float(p[label]), int(label)) for p, label in zip(probs, labels)]
+
+    def report(self):
+        total = max(self.stats[self.tiers[0][0]]['seen'], 1)
+        rows = {}
+        for name, stats in self.stats.items():
+            rows[name] = {
+                **stats,
+                'traffic': stats['seen'] / total,
+                'decided_share': stats['decided'] / total,
+                'ms_per_review': 1000 * stats['seconds'] / max(stats['seen'], 1),
+            }
+        seconds = sum(s['seconds'] for s in self.stats.values())
+        return {'reviews': total, 'seconds': seconds, 'ms_per_review': 1000 * seconds / total, 'tiers': rows}
+
+
+# ========== 阈值校准 ==========
+def score_tiers(tiers, texts, labels):
+    """每档在整个dev集上各跑一遍，返回 {名称: {'probs', 'correct', 'cost', 'accuracy'}}"""
+    labels = np.asarray(labels)
+    scored = {}
+    for name, model in tiers:
+        start = time.time()
+        probs = np.asarray(model.predict_proba(texts), dtype=np.float32)
+        elapsed = time.time() - start
+        correct = probs.argmax(axis=1) == labels
+        scored[name] = {'probs': probs, 'correct': correct, 'cost': elapsed / len(texts),
+                        'accuracy': float(correct.mean())}
+        print(f"  {name:<10} 准确率 {scored[name]['accuracy']:.4f}，{1000 * scored[name]['cost']:.2f} ms/条")
+    return scored
+
+
+def simulate(scored, names, thresholds):
+    """在已打分的dev集上模拟级联，返回 (准确率, 每条平均成本秒数)"""
+    n = len(scored[names[0]]['correct'])
+    remaining = np.ones(n, dtype=bool)
+    correct = 0
+    cost = 0.0
+    active = [name for name in names[:-1] if thresholds.get(name) is not None] + [names[-1]]
+    for i, name in enumerate(active):
+        tier = scored[name]
+        cost += remaining.sum() * tier['cost']
+        if i == len(active) - 1:
+            decide = remaining
+        else:
+            decide = remaining & (margins(tier['probs']) >= thresholds[name])
+        correct += int((tier['correct'] & decide).sum())
+        remaining = remaining & ~decide
+    return correct / n, cost / n
+
+
+def calibrate(scored, names, target_accuracy=None, grid_points=GRID_POINTS):
+    """
+    对前面各档在概率差分位点（及 None=跳过）上网格搜索阈值，
+    在准确率 >= 目标的组合中取平均成本最低者；都达不到时取准确率最高者
+    """
+    if target_accuracy is None:
+        target_accuracy = scored[names[-1]]['accuracy'] - TARGET_TOLERANCE
+    candidates = []
+    for name in names[:-1]:
+        values = np.unique(np.quantile(margins(scored[name]['probs']), np.linspace(0, 1, grid_points + 1)))
+        candidates.append([None] + [float(v) for v in values])
+
+    best, best_key = None, None
+    for combo in product(*candidates):
+        thresholds = dict(zip(names[:-1], combo))
+        accuracy, cost = simulate(scored, names, thresholds)
+        # 达标的组合按成本排序，未达标的按准确率排序，达标优先
+        key = (0, cost, -accuracy) if accuracy >= target_accuracy else (1, -accuracy, cost)
+        if best_key is None or key < best_key:
+            best, best_key = (thresholds, accuracy, cost), key
+
+    thresholds, accuracy, cost = best
+    if accuracy < target_accuracy:
+        print(f"⚠️ 没有组合达到目标准确率 {target_accuracy:.4f}，改用准确率最高的组合")
+    return {'thresholds': thresholds, 'target_accuracy': target_accuracy,
+            'dev_accuracy': accuracy, 'dev_ms_per_review': float(1000 * cost)}
+
+
+def save_thresholds(calibration, scored, path=THRESHOLDS_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    calibration = {**calibration, 'tiers': {
+        name: {'dev_accuracy': s['accuracy'], 'dev_ms_per_review': 1000 * s['cost']} for name, s in scored.items()
+    }}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(calibration, f, indent=4, ensure_ascii=False)
+    print(f"💾 阈值保存到: {path}")
+    return calibration
+
+
+def load_cascade(path=THRESHOLDS_PATH, tier_names=None):
+    """按保存的阈值加载级联；阈值为 None 的档不加载模型"""
+    with open(path, 'r', encoding='utf-8') as f:
+        calibration = json.load(f)
+    thresholds = calibration['thresholds']
+    names = tier_names or list(calibration['tiers'])
+    needed = [name for name in names[:-1] if thresholds.get(name) is not None] + [names[-1]]
+    return CascadeClassifier(load_tiers(needed), thresholds)
+
+
+# ========== 评估 ==========
+def print_report(report, calibration):
+    print("\n" + "=" * 64)
+    print("级联推理统计")
+    print("=" * 64)
+    print(f"{'档位':<10}{'阈值':>8}{'流量':>9}{'判定':>9}{'ms/条':>10}{'dev准确率':>11}")
+    for name, row in report['tiers'].items():
+        threshold = calibration['thresholds'].get(name)
+        threshold = f"{threshold:.3f}" if threshold is not None else '-'
+        dev_acc = calibration['tiers'].get(name, {}).get('dev_accuracy', float('nan'))
+        print(f"{name:<10}{threshold:>8}{row['traffic']:>9.1%}{row['decided_share']:>9.1%}"
+              f"{row['ms_per_review']:>10.2f}{dev_acc:>11.4f}")
+    tiers = calibration['tiers']
+    cheapest, top = next(iter(tiers.values())), list(tiers.values())[-1]
+    print(f"级联准确率: {report['accuracy']:.4f}（最后一档 dev 准确率 {top['dev_accuracy']:.4f}）")
+    print(f"平均成本: {report['ms_per_review']:.2f} ms/条（最便宜一档 {cheapest['dev_ms_per_review']:.2f}，"
+          f"最后一档 {top['dev_ms_per_review']:.2f}）")
+
+
+def evaluate(cascade, csv_path="test.csv", max_samples=None):
+    texts, labels = load_reviews(csv_path, nrows=max_samples)
+    cascade.reset_stats()
+    probs, _ = cascade.predict_proba(texts)
+    report = cascade.report()
+    report['accuracy'] = float((probs.argmax(axis=1) == np.asarray(labels)).mean())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按置信度逐级升级的情感分类级联")
+    parser.add_argument("--dev", default="dev.csv")
+    parser.add_argument("--test", default="test.csv")
+    parser.add_argument("--tiers", nargs='+', default=DEFAULT_TIERS, choices=list(TIER_LOADERS))
+    parser.add_argument("--target-accuracy", type=float, default=None,
+                        help=f"dev集目标准确率（默认：最后一档准确率 - {TARGET_TOLERANCE}）")
+    parser.add_argument("--grid-points", type=int, default=GRID_POINTS)
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH)
+    parser.add_argument("--skip-calibration", action="store_true", help="直接使用已保存的阈值")
+    parser.add_argument("--max-samples", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.skip_calibration:
+        cascade = load_cascade(args.thresholds)
+        with open(args.thresholds, 'r', encoding='utf-8') as f:
+            calibration = json.load(f)
+    else:
+        tiers = load_tiers(args.tiers)
+        names = [name for name, _ in tiers]
+        texts, labels = load_reviews(args.dev, nrows=args.max_samples)
+        print(f"在 {args.dev} 上为 {' → '.join(names)} 打分...")
+        scored = score_tiers(tiers, texts, labels)
+        calibration = calibrate(scored, names, args.target_accuracy, args.grid_points)
+        calibration = save_thresholds(calibration, scored, args.thresholds)
+        cascade = CascadeClassifier(tiers, calibration['thresholds'])
+
+    report = evaluate(cascade, args.test, args.max_samples)
+    print_report(report, calibration)
+    with open('cascade_results.json', 'w', encoding='utf-8') as f:
+        json.dump({'report': report, 'calibration': calibration}, f, indent=4, ensure_ascii=False)
+    print("✓ 实验结果保存到: cascade_results.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# data_utils.py - Amazon评论数据读取工具
+# ======================================
+# train/dev/test.csv 无表头，三列依次为 polarity(1=负面, 2=正面), title, text
+import pandas as pd
+
+COLUMN_NAMES = ['polarity', 'title', 'text']
+LABEL_NAMES = ['负面', '正面']
+
+
+def _prepare_frame(df):
+    """合并标题与正文，并把 polarity 1/2 映射为标签 0/1（与exp2.3一致）"""
+    df = df[df['polarity'].isin([1, 2])].copy()
+    df['title'] = df['title'].fillna('')
+    df['text'] = df['text'].fillna('')
+    df['combined_text'] = df['title'].astype(str) + " " + df['text'].astype(str)
+    df['label'] = (df['polarity'] == 2).astype(int)
+    return df
+
+
+def load_reviews(file_path, nrows=None, text_column='combined_text'):
+    """读取整个CSV，返回 (texts, labels)"""
+    df = pd.read_csv(file_path, header=None, names=COLUMN_NAMES, nrows=nrows)
+    df = _prepare_frame(df)
+    print(f"✅ 成功加载 {len(df)} 条评论从 {file_path}")
+    return df[text_column].tolist(), df['label'].tolist()
+
+
+def iter_review_chunks(file_path, chunksize=50000, nrows=None, text_column='combined_text'):
+    """
+    按块流式读取CSV，逐块产出 (texts, labels)，内存占用与文件大小无关
+    text_column: 'combined_text'（标题+正文，exp2.2/2.3）或 'text'（仅正文，exp2.1）
+    """
+    reader = pd.read_csv(file_path, header=None, names=COLUMN_NAMES,
+                         chunksize=chunksize, nrows=nrows)
+    for chunk in reader:
+        chunk = _prepare_frame(chunk)
+        yield chunk[text_column].tolist(), chunk['label'].tolist()
+
+
+def count_reviews(file_path, chunksize=500000, nrows=None):
+    """只读取 polarity 列统计有效样本数，用于预分配数组"""
+    reader = pd.read_csv(file_path, header=None, names=COLUMN_NAMES, usecols=['polarity'],
+                         chunksize=chunksize, nrows=nrows)
+    return int(sum(chunk['polarity'].isin([1, 2]).sum() for chunk in reader))
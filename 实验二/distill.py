@@ -0,0 +1,223 @@
+# distill.py - 把微调后的Qwen情感分类器蒸馏到TextCNN
+# ======================================
+# final_qwen_sentiment_model（0.5B）准确但在CPU上太慢；exp2.1的TextCNN快但较弱。这里：
+# 1. 教师模型以批量方式在（无标注的）train.csv 上只跑一遍，软标签流式写入内存映射的 float16 [N, 2] 数组，
+#    进度记录在 meta 文件中，中断后可续跑
+# 2. 学生 TextCNN 读取与教师相同的 标题+正文 输入（numericalize_csv 的 combined_text），
+#    以温度软化后的教师分布为目标做KL蒸馏，可选混入真实标签的交叉熵
+# 3. 导出的学生检查点由 textcnn_model.TextCNNClassifier 加载，predict / predict_proba 与 SentimentPredictor 一致
+# 4. 在测试集上报告教师/学生准确率差距、二者一致率和各自的吞吐量（条/秒）
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from data_utils import count_reviews, iter_review_chunks, load_reviews
+from sentiment_service import MODEL_PATH as TEACHER_PATH, SentimentPredictor
+from textcnn_model import DEFAULT_CONFIG, VOCAB_PATH, TextCNN, TextCNNClassifier
+from textcnn_vocab import CompactVocabulary, MAX_LEN, numericalize_csv
+
+OUTPUT_DIR = "distillation"
+STUDENT_PATH = "saved_model/distilled_textcnn.pth"
+CHUNK_SIZE = 2000
+TEMPERATURE = 2.0
+BATCH_SIZE = 256
+EPOCHS = 3
+
+
+def generate_soft_labels(csv_path, teacher_path=TEACHER_PATH, output_dir=OUTPUT_DIR, nrows=None,
+                         batch_size=32, chunk_size=CHUNK_SIZE):
+    """教师模型逐块推理，概率写入 {name}_teacher_probs.npy；已完成的行在续跑时跳过"""
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    probs_path = os.path.join(output_dir, f"{name}_teacher_probs.npy")
+    meta_path = os.path.join(output_dir, f"{name}_teacher_probs.json")
+    total = count_reviews(csv_path, nrows=nrows)
+
+    meta = {'csv': os.path.abspath(csv_path), 'teacher': teacher_path, 'total': total, 'rows_done': 0}
+    if os.path.exists(meta_path) and os.path.exists(probs_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        if all(previous.get(k) == meta[k] for k in ('csv', 'teacher', 'total')):
+            meta = previous
+    if meta['rows_done'] >= total:
+        print(f"✅ 软标签已存在: {probs_path}（{total} 条）")
+        return probs_path
+
+    mode = 'r+' if meta['rows_done'] else 'w+'
+    probs = np.lib.format.open_memmap(probs_path, mode=mode, dtype=np.float16, shape=(total, 2))
+    predictor = SentimentPredictor(teacher_path, batch_size=batch_size)
+    print(f"教师模型生成软标签: {csv_path}（{total} 条，从第 {meta['rows_done']} 条继续）")
+
+    row = 0
+    start = time.time()
+    scored = 0
+    for texts, _ in iter_review_chunks(csv_path, chunksize=chunk_size, nrows=nrows):
+        n = len(texts)
+        skip = min(max(meta['rows_done'] - row, 0), n)
+        if skip < n:
+            probs[row + skip:row + n] = np.asarray(predictor.predict_proba(texts[skip:]), dtype=np.float16)
+            scored += n - skip
+            probs.flush()
+            meta['rows_done'] = row + n
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            elapsed = time.time() - start
+            print(f"  {row + n}/{total}（{scored / elapsed:.1f} 条/秒）")
+        row += n
+
+    print(f"✅ 软标签已保存: {probs_path}")
+    return probs_path
+
+
+def _soften(probs, temperature):
+    """p^(1/T) 归一化，等价于对教师 logits 除以温度"""
+    logp = torch.log(probs.clamp_min(1e-6)) / temperature
+    return torch.softmax(logp, dim=1)
+
+
+def train_student(ids_path, probs_path, labels_path=None, vocab_size=None, epochs=EPOCHS, batch_size=BATCH_SIZE,
+                  temperature=TEMPERATURE, alpha=0.0, lr=1e-3, seed=42, device=None):
+    """
+    在软标签上训练学生 TextCNN
+    loss = (1 - alpha) * T² * KL(teacher_T || student_T) + alpha * CE(student, 真实标签)
+    """
+    device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    ids = np.load(ids_path, mmap_mode='r')
+    teacher = np.load(probs_path, mmap_mode='r')
+    labels = np.load(labels_path, mmap_mode='r') if (labels_path and alpha > 0) else None
+    if len(ids) != len(teacher):
+        raise ValueError(f"数值化样本数 {len(ids)} 与软标签数 {len(teacher)} 不一致")
+
+    torch.manual_seed(seed)
+    config = {'vocab_size': vocab_size, **DEFAULT_CONFIG}
+    model = TextCNN(**config).to(device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr, weight_decay=1e-4)
+    rng = np.random.default_rng(seed)
+
+    for epoch in range(epochs):
+        model.train()
+        order = rng.permutation(len(ids))
+        total_loss, seen, start = 0.0, 0, time.time()
+        for b, begin in enumerate(range(0, len(order), batch_size)):
+            # 批内索引排序后再从内存映射读取，顺序访问更快
+            idx = np.sort(order[begin:begin + batch_size])
+            x = torch.from_numpy(ids[idx].astype(np.int64)).to(device)
+            target = _soften(torch.from_numpy(teacher[idx].astype(np.float32)).to(device), temperature)
+
+            logits = model(x)
+            loss = F.kl_div(F.log_softmax(logits / temperature, dim=1), target,
+                            reduction='batchmean') * temperature ** 2
+            if labels is not None:
+                y = torch.from_numpy(labels[idx].astype(np.int64)).to(device)
+                loss = (1 - alpha) * loss + alpha * F.cross_entropy(logits, y)
+
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+
+            total_loss += loss.item() * len(idx)
+            seen += len(idx)
+            if b % 200 == 0:
+                print(f"  Epoch {epoch + 1} Batch {b:5d} - Loss: {loss.item():.4f}")
+        print(f"Epoch [{epoch + 1}/{epochs}] 平均损失: {total_loss / seen:.4f}，"
+              f"{seen / (time.time() - start):.0f} 条/秒")
+
+    return model.cpu().eval(), config
+
+
+def export_student(model, config, path=STUDENT_PATH, vocab_path=VOCAB_PATH, max_len=MAX_LEN, info=None):
+    """只保存张量与基本类型，可用 torch.load(weights_only=True) 安全加载"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    torch.save({
+        'model_state_dict': model.state_dict(),
+        'model_config': config,
+        'vocab_path': vocab_path,
+        'max_len': max_len,
+        'text_column': 'combined_text',
+        'distillation': info or {},
+    }, path)
+    print(f"✅ 学生模型已导出: {path}")
+
+
+def _timed_predict(predictor, texts):
+    start = time.time()
+    outputs = predictor.predict(texts)
+    elapsed = time.time() - start
+    return np.array([label for _, _, label in outputs]), len(texts) / elapsed
+
+
+def evaluate_gap(student, teacher, csv_path="test.csv", max_samples=None):
+    """报告教师/学生准确率、差距、一致率和吞吐量"""
+    texts, labels = load_reviews(csv_path, nrows=max_samples)
+    labels = np.asarray(labels)
+    student_pred, student_rps = _timed_predict(student, texts)
+    teacher_pred, teacher_rps = _timed_predict(teacher, texts)
+
+    report = {
+        'samples': len(texts),
+        'teacher_accuracy': float((teacher_pred == labels).mean()),
+        'student_accuracy': float((student_pred == labels).mean()),
+        'agreement': float((teacher_pred == student_pred).mean()),
+        'teacher_reviews_per_second': teacher_rps,
+        'student_reviews_per_second': student_rps,
+    }
+    report['accuracy_gap'] = report['teacher_accuracy'] - report['student_accuracy']
+    report['speedup'] = student_rps / teacher_rps
+
+    print("\n" + "=" * 50)
+    print("蒸馏结果")
+    print("=" * 50)
+    print(f"{'模型':<10}{'准确率':>10}{'吞吐(条/秒)':>14}")
+    print(f"{'教师Qwen':<10}{report['teacher_accuracy']:>10.4f}{teacher_rps:>14.1f}")
+    print(f"{'学生CNN':<10}{report['student_accuracy']:>10.4f}{student_rps:>14.1f}")
+    print(f"准确率差距: {report['accuracy_gap']:+.4f}，师生一致率: {report['agreement']:.4f}，"
+          f"加速比: {report['speedup']:.1f}x")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Qwen情感分类器 → TextCNN 知识蒸馏")
+    parser.add_argument("--train", default="train.csv")
+    parser.add_argument("--test", default="test.csv")
+    parser.add_argument("--teacher", default=TEACHER_PATH)
+    parser.add_argument("--vocab", default=VOCAB_PATH)
+    parser.add_argument("--output", default=STUDENT_PATH)
+    parser.add_argument("--nrows", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--temperature", type=float, default=TEMPERATURE)
+    parser.add_argument("--alpha", type=float, default=0.0, help="真实标签交叉熵的权重（0 表示只用软标签）")
+    parser.add_argument("--teacher-batch-size", type=int, default=32)
+    parser.add_argument("--eval-samples", type=int, default=None)
+    args = parser.parse_args()
+
+    probs_path = generate_soft_labels(args.train, args.teacher, nrows=args.nrows,
+                                      batch_size=args.teacher_batch_size)
+    vocab = CompactVocabulary.load(args.vocab)
+    ids_path, labels_path = numericalize_csv(args.train, vocab, output_dir=os.path.join(OUTPUT_DIR, "numericalized"),
+                                             nrows=args.nrows, text_column='combined_text')
+
+    start = time.time()
+    model, config = train_student(ids_path, probs_path, labels_path, vocab_size=len(vocab), epochs=args.epochs,
+                                  temperature=args.temperature, alpha=args.alpha)
+    info = {'teacher': args.teacher, 'temperature': args.temperature, 'alpha': args.alpha,
+            'epochs': args.epochs, 'train_rows': int(len(np.load(probs_path, mmap_mode='r'))),
+            'train_seconds': time.time() - start}
+    export_student(model, config, args.output, args.vocab, info=info)
+
+    student = TextCNNClassifier.load(args.output)
+    teacher = SentimentPredictor(args.teacher)
+    report = evaluate_gap(student, teacher, args.test, args.eval_samples)
+    report['distillation'] = info
+    with open(os.path.join(OUTPUT_DIR, "distillation_report.json"), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    print(f"✓ 报告保存到: {os.path.join(OUTPUT_DIR, 'distillation_report.json')}")
+
+
+if __name__ == "__main__":
+    main()
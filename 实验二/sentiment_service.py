@@ -0,0 +1,225 @@
+# sentiment_service.py - 微调Qwen情感分类器的批量推理服务
+# ======================================
+# 模型只加载一次；输入按长度排序后组成微批次并动态填充；
+# 并发的单条请求通过有界队列聚合成批次统一推理。
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from itertools import islice
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+from data_utils import LABEL_NAMES, load_reviews
+
+MODEL_PATH = "final_qwen_sentiment_model"
+MAX_LENGTH = 128
+BATCH_SIZE = 32
+SORT_WINDOW = 1024  # 流式输入时，每次取这么多条在窗口内按长度排序
+
+
+class SentimentPredictor:
+    """常驻内存的情感分类器，支持列表或生成器输入的批量预测"""
+
+    def __init__(self, model_path=MODEL_PATH, max_length=MAX_LENGTH, batch_size=BATCH_SIZE, device=None,
+                 tokenizer_path=None):
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+        print(f"正在加载情感分类模型: {model_path} ...")
+        # exp2.2 的BERT把分词器单独保存在 saved_models/bert_tokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_path or model_path)
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        self.model = AutoModelForSequenceClassification.from_pretrained(
+            model_path,
+            torch_dtype=torch.float16 if self.device.type == "cuda" else torch.float32
+        )
+        if self.model.config.pad_token_id is None:
+            self.model.config.pad_token_id = self.tokenizer.pad_token_id
+        self.model.to(self.device)
+        self.model.eval()
+        print(f"✅ 模型加载成功，设备: {self.device}")
+
+    def _predict_encoded(self, encodings):
+        """对一组已分词（未填充）的样本做一次前向，返回 (标签列表, 置信度列表, 概率张量)"""
+        batch = self.tokenizer.pad(encodings, padding='longest', return_tensors='pt')
+        with torch.inference_mode():
+            logits = self.model(
+                input_ids=batch['input_ids'].to(self.device),
+                attention_mask=batch['attention_mask'].to(self.device)
+            ).logits
+            probs = torch.softmax(logits.float(), dim=1).cpu()
+        confidences, labels = probs.max(dim=1)
+        return labels.tolist(), confidences.tolist(), probs
+
+    def predict_proba(self, texts):
+        """返回每条文本的 [负面概率, 正面概率]，顺序与输入一致"""
+        texts = [str(t) for t in texts]
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        items = [{'input_ids': ids, 'attention_mask': mask}
+                 for ids, mask in zip(encoded['input_ids'], encoded['attention_mask'])]
+
+        # 按长度排序，使同一批次内的填充最少
+        order = sorted(range(len(items)), key=lambda i: len(items[i]['input_ids']))
+        results = [None] * len(items)
+        for start in range(0, len(order), self.batch_size):
+            batch_idx = order[start:start + self.batch_size]
+            _, _, probs = self._predict_encoded([items[i] for i in batch_idx])
+            for i, row in zip(batch_idx, probs.tolist()):
+                results[i] = row
+        return results
+
+    def predict(self, texts):
+        """
+        批量预测，texts 可以是列表或生成器
+        返回 [(情感文本, 置信度, 标签), ...]，顺序与输入一致
+        """
+        results = []
+        text_iter = iter(texts)
+        while True:
+            window = list(islice(text_iter, SORT_WINDOW))
+            if not window:
+                break
+            for neg, pos in self.predict_proba(window):
+                label = int(pos > neg)
+                results.append((LABEL_NAMES[label], max(neg, pos), label))
+        return results
+
+
+class BatchingPredictor:
+    """
+    并发请求聚合器
+    - 每次 submit 把一条文本放入有界队列，返回 Future
+    - 后台线程在 max_wait_ms 内尽量凑满 batch_size 条后统一推理
+    """
+
+    def __init__(self, predictor, max_queue_size=1024, max_wait_ms=10):
+        self.predictor = predictor
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, text, timeout=None):
+        """提交一条文本；队列满时阻塞，超过 timeout 抛出 queue.Full"""
+        if self._stopped.is_set():
+            raise RuntimeError("predictor closed")
+        future = Future()
+        self._queue.put((text, future), timeout=timeout)
+        return future
+
+    def predict_one(self, text, timeout=None):
+        return self.submit(text, timeout=timeout).result(timeout=timeout)
+
+    @staticmethod
+    def _resolve(future, result=None, error=None):
+        """只给仍未完成的 future 设置结果；单个 future 出错不影响其余请求和工作线程"""
+        if future.done():
+            return
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except Exception as e:
+            print(f"⚠️ 设置预测结果失败: {e}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                pending = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+
+            deadline = time.time() + self.max_wait
+            while len(pending) < self.predictor.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # 调用方已取消的请求不再参与推理；其余 future 标记为运行中，之后无法再被取消
+            pending = [(text, future) for text, future in pending if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            try:
+                outputs = self.predictor.predict([text for text, _ in pending])
+            except Exception as e:
+                for _, future in pending:
+                    self._resolve(future, error=e)
+                continue
+            for (_, future), output in zip(pending, outputs):
+                self._resolve(future, result=output)
+
+    def close(self):
+        """停止工作线程；队列中尚未处理的请求以 RuntimeError 结束，不会一直挂起"""
+        self._stopped.set()
+        self._worker.join()
+        while True:
+            try:
+                _, future = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if future.set_running_or_notify_cancel():
+                self._resolve(future, error=RuntimeError("predictor closed"))
+
+
+_default_predictor = None
+
+
+def get_predictor(model_path=MODEL_PATH):
+    """进程内共享的预测器，首次调用时加载模型"""
+    global _default_predictor
+    if _default_predictor is None:
+        _default_predictor = SentimentPredictor(model_path)
+    return _default_predictor
+
+
+def predict_sentiment(text, model_path=MODEL_PATH):
+    """与exp2.3同名函数接口一致：返回 (情感文本, 置信度, 标签)，但不再重复加载模型"""
+    try:
+        return get_predictor(model_path).predict([text])[0]
+    except Exception as e:
+        print(f"预测失败: {e}")
+        return "未知", 0.0, -1
+
+
+def benchmark(csv_path="test.csv", model_path=MODEL_PATH, max_samples=None, batch_size=BATCH_SIZE):
+    """在测试集上测量吞吐量与准确率"""
+    texts, labels = load_reviews(csv_path, nrows=max_samples)
+    predictor = SentimentPredictor(model_path, batch_size=batch_size)
+
+    start = time.time()
+    outputs = predictor.predict(texts)
+    elapsed = time.time() - start
+
+    correct = sum(1 for (_, _, pred), label in zip(outputs, labels) if pred == label)
+    print("\n" + "=" * 50)
+    print("批量推理基准测试")
+    print("=" * 50)
+    print(f"- 样本数: {len(texts)}")
+    print(f"- 批次大小: {batch_size}")
+    print(f"- 总耗时: {elapsed:.2f} 秒")
+    print(f"- 吞吐量: {len(texts) / elapsed:.1f} 条/秒")
+    print(f"- 准确率: {correct / len(texts):.4f}")
+    return {'samples': len(texts), 'seconds': elapsed,
+            'throughput': len(texts) / elapsed, 'accuracy': correct / len(texts)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Qwen情感分类批量推理基准测试")
+    parser.add_argument("--data", default="test.csv")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--max-samples", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    benchmark(args.data, args.model, args.max_samples, args.batch_size)
@@ -0,0 +1,237 @@
+# streaming_baselines.py - 外存（流式）TF-IDF基线模型训练
+# ======================================
+# 替代exp2.2中在内存样本上拟合 TfidfVectorizer + SVC 的做法：
+# 按块读取 train.csv，用无状态的 HashingVectorizer 特征化（可选一次IDF统计），
+# 在进程池中并行特征化，用支持 partial_fit 的线性模型多轮增量训练。
+import argparse
+import json
+import os
+import pickle
+import time
+from itertools import islice
+from multiprocessing import Pool
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.preprocessing import normalize
+
+from data_utils import iter_review_chunks
+
+N_FEATURES = 2 ** 20
+CHUNK_SIZE = 20000
+EPOCHS = 3
+MODEL_PATH = "saved_models/streaming_baselines.pkl"
+CLASSES = np.array([0, 1])
+
+
+def make_vectorizer(n_features=N_FEATURES):
+    """无状态向量化器：不需要拟合，任意进程中构造结果都一致"""
+    return HashingVectorizer(
+        n_features=n_features,
+        stop_words='english',
+        alternate_sign=False,  # 保持特征非负，MultinomialNB 才能使用
+        norm=None,
+        dtype=np.float32
+    )
+
+
+def transform_texts(texts, vectorizer, idf=None):
+    """词频 -> (可选)TF-IDF -> L2归一化"""
+    X = vectorizer.transform(texts)
+    if idf is not None:
+        X = X.multiply(idf).tocsr()
+    return normalize(X, norm='l2', copy=False)
+
+
+_worker_state = {}
+
+
+def _init_featurize_worker(n_features, idf):
+    _worker_state['vectorizer'] = make_vectorizer(n_features)
+    _worker_state['idf'] = idf
+
+
+def _featurize_chunk(chunk):
+    texts, labels = chunk
+    X = transform_texts(texts, _worker_state['vectorizer'], _worker_state['idf'])
+    return X, np.asarray(labels, dtype=np.int8)
+
+
+def _document_frequency_chunk(chunk):
+    texts, _ = chunk
+    X = _worker_state['vectorizer'].transform(texts)
+    return np.bincount(X.indices, minlength=X.shape[1]).astype(np.int64), X.shape[0]
+
+
+def _parallel_chunks(pool, func, csv_path, workers, nrows=None):
+    """
+    每次只读取 workers 个数据块交给进程池，避免 imap 一次性把整个文件读进任务队列，
+    峰值内存与 workers * CHUNK_SIZE 成正比
+    """
+    chunks = iter_review_chunks(csv_path, chunksize=CHUNK_SIZE, nrows=nrows)
+    while True:
+        group = list(islice(chunks, workers))
+        if not group:
+            break
+        for result in pool.map(func, group):
+            yield result
+
+
+def compute_idf(csv_path, n_features=N_FEATURES, workers=None, nrows=None):
+    """一次流式遍历统计文档频率，得到平滑IDF（与TfidfTransformer(smooth_idf=True)一致）"""
+    workers = workers or os.cpu_count()
+    doc_freq = np.zeros(n_features, dtype=np.int64)
+    n_docs = 0
+    with Pool(workers, initializer=_init_featurize_worker, initargs=(n_features, None)) as pool:
+        for df_part, n in _parallel_chunks(pool, _document_frequency_chunk, csv_path, workers, nrows):
+            doc_freq += df_part
+            n_docs += n
+    idf = np.log((1 + n_docs) / (1 + doc_freq)) + 1
+    print(f"✓ IDF统计完成：{n_docs} 篇文档")
+    return idf.astype(np.float32)
+
+
+def build_models():
+    return {
+        'SGD (hinge)': SGDClassifier(loss='hinge', alpha=1e-6, random_state=42),
+        'SGD (log loss)': SGDClassifier(loss='log_loss', alpha=1e-6, random_state=42),
+        'Naive Bayes': MultinomialNB(alpha=0.1),
+    }
+
+
+def train_streaming(train_path, epochs=EPOCHS, use_idf=True, n_features=N_FEATURES, workers=None, nrows=None):
+    """多轮流式训练所有基线模型，返回 (models, idf, 训练统计)"""
+    workers = workers or os.cpu_count()
+    idf = compute_idf(train_path, n_features, workers, nrows) if use_idf else None
+    models = build_models()
+    train_times = {name: 0.0 for name in models}
+    featurize_time = 0.0
+    rows_seen = 0
+
+    with Pool(workers, initializer=_init_featurize_worker, initargs=(n_features, idf)) as pool:
+        for epoch in range(epochs):
+            print(f"\nEpoch {epoch + 1}/{epochs}")
+            epoch_start = time.time()
+            epoch_rows = 0
+            feat_start = time.time()
+            for X, y in _parallel_chunks(pool, _featurize_chunk, train_path, workers, nrows):
+                featurize_time += time.time() - feat_start
+                for name, model in models.items():
+                    start = time.time()
+                    model.partial_fit(X, y, classes=CLASSES)
+                    train_times[name] += time.time() - start
+                epoch_rows += X.shape[0]
+                feat_start = time.time()
+            rows_seen += epoch_rows
+            elapsed = time.time() - epoch_start
+            print(f"  处理 {epoch_rows} 条，耗时 {elapsed:.1f} 秒（{epoch_rows / elapsed:.0f} 条/秒）")
+
+    stats = {
+        'rows_seen': rows_seen,
+        'featurize_seconds': featurize_time,
+        'train_seconds': train_times,
+    }
+    return models, idf, stats
+
+
+def evaluate(models, test_path, idf=None, n_features=N_FEATURES):
+    """流式评估，返回各模型准确率、F1与预测吞吐量"""
+    vectorizer = make_vectorizer(n_features)
+    predictions = {name: [] for name in models}
+    labels = []
+    infer_time = {name: 0.0 for name in models}
+    for texts, chunk_labels in iter_review_chunks(test_path, chunksize=CHUNK_SIZE):
+        X = transform_texts(texts, vectorizer, idf)
+        labels.extend(chunk_labels)
+        for name, model in models.items():
+            start = time.time()
+            predictions[name].extend(model.predict(X).tolist())
+            infer_time[name] += time.time() - start
+
+    results = {}
+    for name in models:
+        results[name] = {
+            'accuracy': float(accuracy_score(labels, predictions[name])),
+            'f1_score': float(f1_score(labels, predictions[name], average='binary')),
+            'predict_rows_per_second': len(labels) / max(infer_time[name], 1e-9),
+        }
+    return results
+
+
+def save_baselines(models, idf, path=MODEL_PATH, n_features=N_FEATURES):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        pickle.dump({'models': models, 'idf': idf, 'n_features': n_features}, f)
+    print(f"✓ 基线模型保存到: {path}")
+
+
+class StreamingBaseline:
+    """加载已训练的基线模型，提供与其他情感模型一致的概率输出"""
+
+    def __init__(self, path=MODEL_PATH, model_name='SGD (log loss)'):
+        with open(path, 'rb') as f:
+            bundle = pickle.load(f)
+        self.model = bundle['models'][model_name]
+        self.idf = bundle['idf']
+        self.vectorizer = make_vectorizer(bundle['n_features'])
+
+    def predict_proba(self, texts):
+        """返回 [N, 2] 概率；hinge损失模型没有概率输出，用决策函数的sigmoid近似"""
+        X = transform_texts(list(texts), self.vectorizer, self.idf)
+        if hasattr(self.model, 'predict_proba'):
+            return self.model.predict_proba(X)
+        scores = self.model.decision_function(X)
+        pos = 1.0 / (1.0 + np.exp(-scores))
+        return np.stack([1 - pos, pos], axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式训练 TF-IDF + 线性模型基线")
+    parser.add_argument("--train", default="train.csv")
+    parser.add_argument("--test", default="test.csv")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--no-idf", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--nrows", type=int, default=None)
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("流式TF-IDF基线训练")
+    print("=" * 50)
+    start = time.time()
+    models, idf, stats = train_streaming(args.train, args.epochs, not args.no_idf,
+                                         workers=args.workers, nrows=args.nrows)
+    total_time = time.time() - start
+    save_baselines(models, idf)
+
+    print("\n在测试集上评估...")
+    results = evaluate(models, args.test, idf)
+
+    print("\n模型对比:")
+    print("-" * 60)
+    print(f"{'Model':<20} {'Accuracy':<10} {'F1-score':<10} {'Train rows/s':<14}")
+    print("-" * 60)
+    for name, res in results.items():
+        train_rps = stats['rows_seen'] / (stats['featurize_seconds'] + stats['train_seconds'][name])
+        res['train_rows_per_second'] = train_rps
+        res['train_seconds'] = stats['train_seconds'][name]
+        print(f"{name:<20} {res['accuracy']:.4f}     {res['f1_score']:.4f}     {train_rps:,.0f}")
+    print("-" * 60)
+    print(f"总耗时: {total_time:.1f} 秒，整体吞吐量: {stats['rows_seen'] / total_time:,.0f} 条/秒")
+
+    with open('streaming_baseline_results.json', 'w', encoding='utf-8') as f:
+        json.dump({
+            'results': results,
+            'config': {'epochs': args.epochs, 'use_idf': not args.no_idf,
+                       'n_features': N_FEATURES, 'chunk_size': CHUNK_SIZE},
+            'rows_seen': stats['rows_seen'],
+            'total_seconds': total_time
+        }, f, indent=4, ensure_ascii=False)
+    print("✓ 实验结果保存到: streaming_baseline_results.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# textcnn_model.py - TextCNN 模型定义与批量预测器
+# ======================================
+# TextCNN 结构原先只定义在 exp2.1.ipynb 中；这里抽成模块，供蒸馏（distill.py）和级联推理复用。
+# 预测器的 predict / predict_proba 与 sentiment_service.SentimentPredictor 接口一致。
+import numpy as np
+import torch
+import torch.nn as nn
+
+from data_utils import LABEL_NAMES
+from textcnn_vocab import CompactVocabulary, MAX_LEN
+
+VOCAB_PATH = "saved_model/vocabulary.json"
+CHECKPOINT_PATH = "saved_model/best_model_checkpoint.pth"
+BATCH_SIZE = 512
+
+# exp2.1 的模型超参数
+DEFAULT_CONFIG = {'embed_dim': 100, 'num_classes': 2, 'kernel_sizes': [3, 5], 'num_filters': 100, 'dropout': 0.5}
+
+
+class TextCNN(nn.Module):
+    """与exp2.1（改进版）相同的结构，state_dict 可直接互相加载"""
+
+    def __init__(self, vocab_size, embed_dim, num_classes,
+                 kernel_sizes=(3, 4, 5), num_filters=100, dropout=0.5):
+        super(TextCNN, self).__init__()
+        self.embedding = nn.Embedding(vocab_size, embed_dim, padding_idx=0)
+        self.convs = nn.ModuleList([
+            nn.Conv1d(in_channels=embed_dim, out_channels=num_filters, kernel_size=k)
+            for k in kernel_sizes
+        ])
+        self.dropout = nn.Dropout(dropout)
+        self.fc = nn.Linear(len(kernel_sizes) * num_filters, num_classes)
+        self._init_weights()
+
+    def _init_weights(self):
+        for conv in self.convs:
+            nn.init.kaiming_normal_(conv.weight, mode='fan_out', nonlinearity='relu')
+            nn.init.constant_(conv.bias, 0)
+        nn.init.xavier_normal_(self.fc.weight)
+        nn.init.constant_(self.fc.bias, 0)
+
+    def forward(self, x):
+        x_embed = self.embedding(x).permute(0, 2, 1)  # [batch, embed_dim, seq_len]
+        pooled = [torch.relu(conv(x_embed)).max(dim=2)[0] for conv in self.convs]
+        return self.fc(self.dropout(torch.cat(pooled, dim=1)))
+
+
+def config_from_state_dict(state_dict):
+    """从权重形状推断结构参数（exp2.1 的 best_model_checkpoint 没有保存 model_config）"""
+    vocab_size, embed_dim = state_dict['embedding.weight'].shape
+    conv_keys = sorted(k for k in state_dict if k.startswith('convs.') and k.endswith('.weight'))
+    return {
+        'vocab_size': int(vocab_size),
+        'embed_dim': int(embed_dim),
+        'num_classes': int(state_dict['fc.weight'].shape[0]),
+        'kernel_sizes': [int(state_dict[k].shape[2]) for k in conv_keys],
+        'num_filters': int(state_dict[conv_keys[0]].shape[0]),
+        'dropout': DEFAULT_CONFIG['dropout'],
+    }
+
+
+class TextCNNClassifier:
+    """TextCNN 批量预测器：整列向量化数值化后按批前向"""
+
+    def __init__(self, model, vocab, max_len=MAX_LEN, batch_size=BATCH_SIZE, device=None):
+        self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = model.to(self.device).eval()
+        self.vocab = vocab
+        self.max_len = max_len
+        self.batch_size = batch_size
+
+    @classmethod
+    def load(cls, checkpoint_path=CHECKPOINT_PATH, vocab_path=VOCAB_PATH, **kwargs):
+        """
+        支持两种检查点：distill.py 导出的学生模型（含 model_config / max_len）
+        和exp2.1的 best_model_checkpoint.pth（只有 model_state_dict）
+        """
+        checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=True)
+        state_dict = checkpoint['model_state_dict']
+        config = checkpoint.get('model_config') or config_from_state_dict(state_dict)
+        model = TextCNN(**config)
+        model.load_state_dict(state_dict)
+        vocab = CompactVocabulary.load(checkpoint.get('vocab_path', vocab_path))
+        return cls(model, vocab, max_len=checkpoint.get('max_len', MAX_LEN), **kwargs)
+
+    def predict_logits(self, ids):
+        """ids: int32 [N, max_len] -> float32 logits [N, num_classes]"""
+        outputs = []
+        with torch.inference_mode():
+            for start in range(0, len(ids), self.batch_size):
+                batch = torch.from_numpy(np.ascontiguousarray(ids[start:start + self.batch_size], dtype=np.int64))
+                outputs.append(self.model(batch.to(self.device)).float().cpu())
+        return torch.cat(outputs).numpy() if outputs else np.zeros((0, 2), dtype=np.float32)
+
+    def predict_proba(self, texts):
+        """返回 [N, 2] 的 [负面概率, 正面概率]"""
+        ids = self.vocab.numericalize_texts([str(t) for t in texts], self.max_len)
+        logits = self.predict_logits(ids)
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def predict(self, texts):
+        """返回 [(情感文本, 置信度, 标签), ...]，与 SentimentPredictor.predict 一致"""
+        probs = self.predict_proba(list(texts))
+        labels = probs.argmax(axis=1)
+        return [(LABEL_NAMES[label], float(p[label]), int(label)) for p, label in zip(probs, labels)]
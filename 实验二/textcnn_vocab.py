@@ -0,0 +1,216 @@
+# textcnn_vocab.py - 数组化词汇表与向量化数值化（TextCNN数据管线）
+# ======================================
+# 词频统计在进程池中流式完成；冻结后的词汇表是 “排序的token哈希数组 + 索引数组”，
+# 整列文本一次性查表写入预分配的 int32 [N, max_len] 矩阵并保存为 .npy，
+# DataLoader 的 worker 只需要做数组切片。
+import argparse
+import json
+import os
+from collections import Counter
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import Dataset
+
+from data_utils import count_reviews, iter_review_chunks
+
+PAD_IDX = 0
+UNK_IDX = 1
+MAX_LEN = 100
+CHUNK_SIZE = 50000
+OUTPUT_DIR = "numericalized"
+
+
+def clean_and_tokenize(texts):
+    """
+    与exp2.1的 preprocess_text + simple_tokenize 规则一致，但用pandas字符串方法整列处理
+    返回 token 列表的列表
+    """
+    series = pd.Series(texts, dtype=object).fillna('').astype(str).str.lower()
+    series = series.str.replace(r'<.*?>', '', regex=True)
+    series = series.str.replace(r'http\S+|www\S+|https\S+', '', regex=True)
+    series = series.str.replace(r'[^a-zA-Z\s!?]', ' ', regex=True)
+    series = series.str.replace(r'([!?])', r' \1 ', regex=True)
+    return series.str.split().tolist()
+
+
+def hash_tokens(tokens):
+    """把token数组映射为稳定的64位哈希（跨进程、跨运行一致）"""
+    return pd.util.hash_array(np.asarray(tokens, dtype=object))
+
+
+def _count_chunk(texts):
+    counter = Counter()
+    for tokens in clean_and_tokenize(texts):
+        counter.update(tokens)
+    return counter
+
+
+class CompactVocabulary:
+    """
+    冻结后的紧凑词汇表
+    - hashes: 排序后的 uint64 token哈希
+    - indices: 与 hashes 对齐的 int32 词ID
+    - words: 按ID排列的词表（仅用于导出和调试）
+    """
+
+    def __init__(self, words, min_freq=2):
+        self.min_freq = min_freq
+        self.words = ["<PAD>", "<UNK>"] + list(words)
+        word_hashes = hash_tokens(self.words[2:]) if len(self.words) > 2 else np.zeros(0, dtype=np.uint64)
+        order = np.argsort(word_hashes)
+        self.hashes = word_hashes[order]
+        self.indices = (order + 2).astype(np.int32)
+
+    @classmethod
+    def build_from_csv(cls, csv_path, min_freq=2, max_size=None, workers=None, nrows=None):
+        """流式读取训练集，并行统计词频后冻结"""
+        print(f"正在统计词频: {csv_path} ...")
+        word_freq = Counter()
+        chunks = (texts for texts, _ in iter_review_chunks(
+            csv_path, chunksize=CHUNK_SIZE, nrows=nrows, text_column='text'))
+        with Pool(processes=workers) as pool:
+            for i, partial in enumerate(pool.imap_unordered(_count_chunk, chunks), start=1):
+                word_freq.update(partial)
+                print(f"  已合并 {i} 个数据块，当前词汇数 {len(word_freq)}")
+
+        print(f"原始词汇表大小（所有出现的token）: {len(word_freq)}")
+        # 按词频降序、同频按字母序，保证结果与worker数量无关
+        words = [w for w, c in sorted(word_freq.items(), key=lambda x: (-x[1], x[0])) if c >= min_freq]
+        if max_size:
+            words = words[:max_size - 2]
+        vocab = cls(words, min_freq=min_freq)
+        print(f"过滤后词汇表大小（频率≥{min_freq}）: {len(vocab)}")
+        return vocab
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def word2idx(self):
+        return {w: i for i, w in enumerate(self.words)}
+
+    def lookup(self, tokens):
+        """向量化查表：token数组 -> int32 ID数组，未登录词映射为 <UNK>"""
+        if len(tokens) == 0:
+            return np.zeros(0, dtype=np.int32)
+        if len(self.hashes) == 0:
+            return np.full(len(tokens), UNK_IDX, dtype=np.int32)
+        token_hashes = hash_tokens(tokens)
+        pos = np.minimum(np.searchsorted(self.hashes, token_hashes), len(self.hashes) - 1)
+        found = self.hashes[pos] == token_hashes
+        return np.where(found, self.indices[pos], UNK_IDX).astype(np.int32)
+
+    def numericalize_into(self, token_lists, out, max_len=MAX_LEN):
+        """把一批 token 列表截断/填充后写入 out（形状 [len(token_lists), max_len]）"""
+        lengths = np.fromiter((min(len(t), max_len) for t in token_lists), dtype=np.int64, count=len(token_lists))
+        flat = [tok for tokens in token_lists for tok in tokens[:max_len]]
+        ids = self.lookup(flat)
+        rows = np.repeat(np.arange(len(token_lists)), lengths)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]) if len(lengths) else lengths
+        cols = np.arange(len(flat)) - np.repeat(starts, lengths)
+        out[:] = PAD_IDX
+        out[rows, cols] = ids
+        return out
+
+    def numericalize_texts(self, texts, max_len=MAX_LEN):
+        """对原始文本整列数值化，返回 int32 [N, max_len]"""
+        out = np.empty((len(texts), max_len), dtype=np.int32)
+        return self.numericalize_into(clean_and_tokenize(texts), out, max_len)
+
+    def save(self, path):
+        """保存为与 saved_model/vocabulary.json 相同的结构，另附冻结后的数组"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        vocab_dict = {
+            'word2idx': self.word2idx,
+            'idx2word': {str(i): w for i, w in enumerate(self.words)},
+            'size': len(self),
+            'min_freq': self.min_freq
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(vocab_dict, f, ensure_ascii=False, indent=2)
+        np.savez(os.path.splitext(path)[0] + "_arrays.npz", hashes=self.hashes, indices=self.indices)
+        print(f"✅ 词汇表已保存到: {path}")
+
+    @classmethod
+    def load(cls, path):
+        """从 vocabulary.json 加载（兼容exp2.1导出的文件）"""
+        with open(path, 'r', encoding='utf-8') as f:
+            vocab_dict = json.load(f)
+        idx2word = vocab_dict['idx2word']
+        words = [idx2word[str(i)] for i in range(2, vocab_dict['size'])]
+        return cls(words, min_freq=vocab_dict.get('min_freq', 2))
+
+
+def numericalize_csv(csv_path, vocab, max_len=MAX_LEN, output_dir=OUTPUT_DIR, nrows=None, text_column='text'):
+    """
+    流式数值化整个CSV：
+    - {name}_ids.npy     int32 [N, max_len]，预分配后逐块写入
+    - {name}_labels.npy  int8  [N]
+    text_column: 'text'（exp2.1）或 'combined_text'（与Qwen教师模型输入一致，蒸馏时使用）
+    """
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    os.makedirs(output_dir, exist_ok=True)
+    total = count_reviews(csv_path, nrows=nrows)
+    ids_path = os.path.join(output_dir, f"{name}_ids.npy")
+    labels_path = os.path.join(output_dir, f"{name}_labels.npy")
+
+    matrix = np.lib.format.open_memmap(ids_path, mode='w+', dtype=np.int32, shape=(total, max_len))
+    labels_out = np.lib.format.open_memmap(labels_path, mode='w+', dtype=np.int8, shape=(total,))
+
+    print(f"正在数值化 {csv_path}（{total} 条，max_len={max_len}）...")
+    row = 0
+    for texts, labels in iter_review_chunks(csv_path, chunksize=CHUNK_SIZE, nrows=nrows, text_column=text_column):
+        n = len(texts)
+        vocab.numericalize_into(clean_and_tokenize(texts), matrix[row:row + n], max_len)
+        labels_out[row:row + n] = labels
+        row += n
+    matrix.flush()
+    labels_out.flush()
+
+    sample = matrix[:min(total, 100000)]
+    unk_rate = float((sample == UNK_IDX).sum() / max((sample != PAD_IDX).sum(), 1))
+    print(f"✅ 已保存: {ids_path}（<UNK>占比约 {unk_rate:.2%}）")
+    return ids_path, labels_path
+
+
+class NumericalizedDataset(Dataset):
+    """读取数值化后的 .npy（内存映射），返回与exp2.1 AmazonReviewDataset相同的字段"""
+
+    def __init__(self, ids_path, labels_path):
+        self.ids = np.load(ids_path, mmap_mode='r')
+        self.labels = np.load(labels_path, mmap_mode='r')
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        return {
+            'text': torch.from_numpy(self.ids[idx].astype(np.int64)),
+            'label': torch.tensor(int(self.labels[idx]), dtype=torch.long)
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建紧凑词汇表并数值化 train/dev/test.csv")
+    parser.add_argument("--train", default="train.csv")
+    parser.add_argument("--files", nargs="+", default=["train.csv", "dev.csv", "test.csv"])
+    parser.add_argument("--min-freq", type=int, default=2)
+    parser.add_argument("--max-size", type=int, default=None)
+    parser.add_argument("--max-len", type=int, default=MAX_LEN)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--nrows", type=int, default=None)
+    args = parser.parse_args()
+
+    vocab = CompactVocabulary.build_from_csv(args.train, min_freq=args.min_freq, max_size=args.max_size,
+                                             workers=args.workers, nrows=args.nrows)
+    vocab.save(os.path.join(args.output_dir, "vocabulary.json"))
+    for csv_file in args.files:
+        if os.path.exists(csv_file):
+            numericalize_csv(csv_file, vocab, max_len=args.max_len, output_dir=args.output_dir,
+                             nrows=args.nrows if csv_file == args.train else None)
+        else:
+            print(f"✗ {csv_file}: 未找到，跳过")
@@ -0,0 +1,228 @@
+# token_cache.py - 预分词的内存映射数据集缓存
+# ======================================
+# 一次性把 train/dev/test.csv 分词，写成变长数组（offsets + 扁平int32 token），
+# 训练时按长度分桶组批，并只填充到批次内最长序列，不再每个epoch重复分词。
+import argparse
+import hashlib
+import json
+import os
+from multiprocessing import Pool
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader, Sampler
+from transformers import AutoTokenizer
+
+from data_utils import iter_review_chunks
+
+CACHE_DIR = "token_cache"
+CHUNK_SIZE = 20000  # 每次从CSV读取的行数
+TOKENIZE_BATCH = 2000  # 每个子进程任务的分词条数
+
+_worker_tokenizer = {}
+
+
+def _init_tokenizer_worker(tokenizer_name, max_length):
+    """子进程初始化：分词器每个进程只加载一次"""
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    _worker_tokenizer['tokenizer'] = AutoTokenizer.from_pretrained(tokenizer_name)
+    _worker_tokenizer['max_length'] = max_length
+
+
+def _tokenize_batch(texts):
+    tokenizer = _worker_tokenizer['tokenizer']
+    encoded = tokenizer(texts, truncation=True, max_length=_worker_tokenizer['max_length'])
+    lengths = np.fromiter((len(ids) for ids in encoded['input_ids']), dtype=np.int64, count=len(texts))
+    flat = np.fromiter((t for ids in encoded['input_ids'] for t in ids), dtype=np.int32, count=int(lengths.sum()))
+    return lengths, flat
+
+
+def cache_key(csv_path, tokenizer_name, max_length, nrows=None):
+    """缓存键：分词器名、最大长度、读取行数（None 为全量）以及数据文件的大小和修改时间"""
+    stat = os.stat(csv_path)
+    raw = f"{tokenizer_name}|{max_length}|{nrows}|{os.path.abspath(csv_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()[:12]
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    safe_tokenizer = tokenizer_name.replace('/', '_')
+    rows = 'all' if nrows is None else nrows
+    return f"{name}_{safe_tokenizer}_{max_length}_{rows}_{digest}"
+
+
+def build_token_cache(csv_path, tokenizer_name, max_length=128, cache_dir=CACHE_DIR,
+                      workers=None, nrows=None):
+    """
+    流式读取CSV并在进程池中分批分词，结果写入：
+    - tokens.bin   扁平 int32 token ID
+    - offsets.npy  int64，第i条样本为 tokens[offsets[i]:offsets[i+1]]
+    - labels.npy   int8 标签
+    已存在同键缓存时直接返回其目录
+    """
+    out_dir = os.path.join(cache_dir, cache_key(csv_path, tokenizer_name, max_length, nrows))
+    meta_path = os.path.join(out_dir, "meta.json")
+    if os.path.exists(meta_path):
+        print(f"✅ 复用已有缓存: {out_dir}")
+        return out_dir
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokens_path = os.path.join(out_dir, "tokens.bin")
+    all_lengths = []
+    all_labels = []
+
+    print(f"正在分词 {csv_path}（{tokenizer_name}, max_length={max_length}）...")
+    with open(tokens_path, 'wb') as token_file, \
+            Pool(processes=workers, initializer=_init_tokenizer_worker,
+                 initargs=(tokenizer_name, max_length)) as pool:
+        for texts, labels in iter_review_chunks(csv_path, chunksize=CHUNK_SIZE, nrows=nrows):
+            batches = [texts[i:i + TOKENIZE_BATCH] for i in range(0, len(texts), TOKENIZE_BATCH)]
+            # imap 保持顺序，子进程结果按输入顺序写盘
+            for lengths, flat in pool.imap(_tokenize_batch, batches):
+                flat.tofile(token_file)
+                all_lengths.append(lengths)
+            all_labels.append(np.asarray(labels, dtype=np.int8))
+            print(f"  已处理 {sum(len(l) for l in all_labels)} 条")
+
+    lengths = np.concatenate(all_lengths) if all_lengths else np.zeros(0, dtype=np.int64)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(out_dir, "labels.npy"),
+            np.concatenate(all_labels) if all_labels else np.zeros(0, dtype=np.int8))
+
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    meta = {
+        'csv_path': csv_path,
+        'tokenizer': tokenizer_name,
+        'max_length': max_length,
+        'nrows': nrows,
+        'num_samples': int(len(lengths)),
+        'num_tokens': int(offsets[-1]),
+        'pad_token_id': int(pad_token_id),
+    }
+    # meta.json 最后写入，作为缓存完整的标志
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ 缓存已保存到: {out_dir}")
+    print(f"   样本数: {meta['num_samples']}，平均长度: {offsets[-1] / max(len(lengths), 1):.1f} tokens"
+          f"（固定填充需 {max_length} tokens）")
+    return out_dir
+
+
+class TokenCacheDataset(Dataset):
+    """基于内存映射的数据集，__getitem__ 只做数组切片"""
+
+    def __init__(self, cache_path):
+        with open(os.path.join(cache_path, "meta.json"), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.tokens = np.memmap(os.path.join(cache_path, "tokens.bin"), dtype=np.int32, mode='r')
+        self.offsets = np.load(os.path.join(cache_path, "offsets.npy"), mmap_mode='r')
+        self.labels = np.load(os.path.join(cache_path, "labels.npy"), mmap_mode='r')
+        self.lengths = np.diff(self.offsets)
+        self.pad_token_id = self.meta['pad_token_id']
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, idx):
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return {
+            'input_ids': torch.from_numpy(np.array(self.tokens[start:end], dtype=np.int64)),
+            'labels': int(self.labels[idx])
+        }
+
+
+class LengthBucketBatchSampler(Sampler):
+    """
+    长度分桶批采样器
+    打乱后每 batch_size * bucket_size 条样本组成一个桶，桶内按长度排序切成批次，
+    最后再打乱批次顺序，兼顾随机性与填充效率
+    """
+
+    def __init__(self, lengths, batch_size, bucket_size=50, shuffle=True, drop_last=False, seed=42):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.bucket_size = bucket_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _batches(self):
+        rng = np.random.RandomState(self.seed + self.epoch)
+        indices = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        span = self.batch_size * self.bucket_size
+        batches = []
+        for start in range(0, len(indices), span):
+            bucket = indices[start:start + span]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind='stable')]
+            for b in range(0, len(bucket), self.batch_size):
+                batch = bucket[b:b + self.batch_size]
+                if len(batch) < self.batch_size and self.drop_last:
+                    continue
+                batches.append(batch.tolist())
+        if self.shuffle:
+            rng.shuffle(batches)
+        return batches
+
+    def __iter__(self):
+        return iter(self._batches())
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.lengths) // self.batch_size
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+
+def pad_collate(pad_token_id):
+    """返回只填充到批次内最长序列的 collate_fn"""
+
+    def collate(samples):
+        max_len = max(len(s['input_ids']) for s in samples)
+        input_ids = torch.full((len(samples), max_len), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(samples), max_len), dtype=torch.long)
+        for i, s in enumerate(samples):
+            n = len(s['input_ids'])
+            input_ids[i, :n] = s['input_ids']
+            attention_mask[i, :n] = 1
+        return {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'labels': torch.tensor([s['labels'] for s in samples], dtype=torch.long)
+        }
+
+    return collate
+
+
+def create_cached_dataloader(cache_path, batch_size=8, shuffle=True, num_workers=2):
+    """从缓存目录创建 DataLoader，可直接替换exp2.2/exp2.3中的加载器"""
+    dataset = TokenCacheDataset(cache_path)
+    sampler = LengthBucketBatchSampler(dataset.lengths, batch_size, shuffle=shuffle)
+    return DataLoader(
+        dataset,
+        batch_sampler=sampler,
+        collate_fn=pad_collate(dataset.pad_token_id),
+        num_workers=num_workers,
+        pin_memory=torch.cuda.is_available()
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="预先分词 train/dev/test.csv 并写入内存映射缓存")
+    parser.add_argument("--tokenizer", default="Qwen/Qwen2.5-0.5B")
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--files", nargs="+", default=["train.csv", "dev.csv", "test.csv"])
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--nrows", type=int, default=None)
+    args = parser.parse_args()
+
+    for csv_file in args.files:
+        if not os.path.exists(csv_file):
+            print(f"✗ {csv_file}: 未找到，跳过")
+            continue
+        build_token_cache(csv_file, args.tokenizer, args.max_length,
+                          cache_dir=args.cache_dir, workers=args.workers, nrows=args.nrows)
@@ -3,7 +3,6 @@
 import streamlit as st
 import time
 import os
-import shutil
 import re
 from dotenv import load_dotenv
 
@@ -21,12 +20,16 @@ os.environ['HF_TOKEN'] = HF_TOKEN
 from config import (
     DATA_FILE, EMBEDDING_MODEL_NAME, GENERATION_MODEL_NAME, TOP_K,
     MAX_ARTICLES_TO_INDEX, COLLECTION_NAME, CHROMA_DATA_PATH, id_to_doc_map,
-    QUERY_PREPROCESSING_ENABLED, QUERY_PREPROCESSING_MAX_TOKENS, QUERY_PREPROCESSING_TEMPERATURE
+    QUERY_PREPROCESSING_ENABLED, QUERY_PREPROCESSING_MAX_TOKENS, QUERY_PREPROCESSING_TEMPERATURE,
+    KG_GRAPH_FILE, KG_ANALYSIS_FILE, INDEX_BUNDLE_ROOT
 )
 from data_utils import load_data
 from models import load_embedding_model, load_generation_model
 from chromadb_utils import get_chroma_client, setup_chroma_collection, index_data_if_needed, search_similar_documents
 from rag_core import generate_answer_stream, preprocess_query, extract_medical_keywords
+from kg_query_expansion import load_query_expander
+from streaming import CancellationToken, CoalescingRenderer, stream_in_background
+from index_bundle import BundleIndex, BundleIntegrityError, current_version
 
 # ========== CSS样式 ==========
 st.markdown("""
@@ -60,6 +63,17 @@ def initialize_system():
 
 chroma_client, embedding_model, generation_model, tokenizer = initialize_system()
 
+
+@st.cache_resource
+def load_kg_expander():
+    """知识图谱实体索引只在进程启动时构建一次"""
+    return load_query_expander(KG_GRAPH_FILE, KG_ANALYSIS_FILE)
+
+
+query_expander = load_kg_expander()
+if query_expander is None:
+    st.warning(f"⚠️ 未找到知识图谱文件 {KG_GRAPH_FILE}，图谱查询扩展已停用，问题优化全部走LLM改写")
+
 if not chroma_client or not embedding_model or not generation_model or not tokenizer:
     st.error("❌ 系统初始化失败")
     st.stop()
@@ -77,24 +91,52 @@ def load_and_index_data():
 
 pubmed_data = load_and_index_data()
 
-# 检查是否需要重建索引
+
+
+@st.cache_resource(show_spinner=False)
+def load_index_bundle(version):
+    """每个版本只加载、校验一次；CURRENT 切换后，新一轮运行自动使用新版本，进行中的会话不受影响"""
+    return BundleIndex(os.path.join(INDEX_BUNDLE_ROOT, version))
+
+
+# 优先使用离线构建的索引包（python index_bundle.py build），没有时回退到在线建Chroma索引
+index_bundle = None
+bundle_version = current_version(INDEX_BUNDLE_ROOT)
+if bundle_version:
+    try:
+        index_bundle = load_index_bundle(bundle_version)
+    except (BundleIntegrityError, OSError, ValueError) as e:
+        print(f"❌ 索引包 {bundle_version} 校验失败: {e}，回退到请求时建Chroma索引")
+        st.error(f"❌ 索引包 {bundle_version} 校验失败: {e}，回退到在线索引")
+else:
+    print(f"⚠️ {os.path.abspath(INDEX_BUNDLE_ROOT)} 下没有索引包（缺少 CURRENT），回退到请求时建Chroma索引")
+    st.warning(f"⚠️ 未找到离线索引包（{INDEX_BUNDLE_ROOT}），本次在请求时建立Chroma索引；"
+               "请先运行 `python index_bundle.py build`")
+
 reindex_marker = os.path.join(os.path.dirname(CHROMA_DATA_PATH), "NEED_REINDEX")
 if os.path.exists(reindex_marker):
-    st.warning("🔔 检测到重建索引标记，正在重建...")
-    if os.path.exists(CHROMA_DATA_PATH):
-        shutil.rmtree(CHROMA_DATA_PATH, ignore_errors=True)
-    os.remove(reindex_marker)
-    st.rerun()
+    st.warning("🔔 检测到 NEED_REINDEX 标记：请求时不再删除重建索引，"
+               "请离线运行 `python index_bundle.py build` 发布新版本")
 
-# 执行索引
 with st.status("📚 正在加载知识库...", expanded=False):
-    indexing_successful = index_data_if_needed(chroma_client, pubmed_data, embedding_model)
-    if indexing_successful:
-        st.success(f"✅ 知识库加载完成！共索引 {len(pubmed_data)} 篇文档")
+    if index_bundle is not None:
+        doc_map = index_bundle.docs
+        indexing_successful = True
+        st.success(f"✅ 知识库加载完成！索引版本 {index_bundle.version}，共 {len(doc_map)} 篇文档")
+    else:
+        doc_map = id_to_doc_map
+        indexing_successful = index_data_if_needed(chroma_client, pubmed_data, embedding_model)
+        if indexing_successful:
+            st.success(f"✅ 知识库加载完成！共索引 {len(pubmed_data)} 篇文档")
 
 # ========== 主交互界面 ==========
 st.markdown("---")
 
+# 上一轮的生成线程正常情况下已在其 finally 中取消；这里兜底，确保同一会话不会有两个生成线程
+previous_token = st.session_state.pop('cancel_token', None)
+if previous_token is not None:
+    previous_token.cancel("rerun")
+
 # 初始化session_state
 if 'query_state' not in st.session_state:
     st.session_state.query_state = {
@@ -123,7 +165,7 @@ if indexing_successful:
         if st.button("🤖 分析并优化问题", disabled=preprocess_disabled, use_container_width=True):
             st.session_state.query_state['is_processed'] = True
             with st.status("🔍 正在分析问题...", expanded=True):
-                processed = preprocess_query(query, generation_model, tokenizer)
+                processed = preprocess_query(query, generation_model, tokenizer, query_expander)
                 keywords = extract_medical_keywords(processed)
                 st.session_state.query_state.update({
                     'processed': processed,
@@ -171,18 +213,27 @@ if indexing_successful:
 
     # 第四步：检索和生成（当确认后）
     if st.session_state.query_state['is_confirmed']:
+        # 点击会触发重新运行：正在进行的生成在下一次界面刷新时被中断并取消，这里退回到确认步骤
+        if st.button("⏹ 停止生成", key="stop_generation"):
+            st.session_state.query_state['is_confirmed'] = False
+            st.rerun()
+
         final_query = st.session_state.query_state['confirmed_query']
         start_time = time.time()
+        answer_ok = True
 
         with st.status("🔍 正在检索相关文献...", expanded=True):
-            retrieved_ids, distances = search_similar_documents(chroma_client, final_query, embedding_model)
+            if index_bundle is not None:
+                retrieved_ids, distances = index_bundle.search_query(final_query, embedding_model, TOP_K)
+            else:
+                retrieved_ids, distances = search_similar_documents(chroma_client, final_query, embedding_model)
             if retrieved_ids:
                 st.write(f"✅ 找到 {len(retrieved_ids)} 篇相关文档")
             else:
                 st.warning("⚠️ 未找到相关文献")
 
         if retrieved_ids:
-            retrieved_docs = [id_to_doc_map[id] for id in retrieved_ids if id in id_to_doc_map]
+            retrieved_docs = [doc_map[id] for id in retrieved_ids if id in doc_map]
             if retrieved_docs:
                 st.markdown("### 📚 参考医学证据")
                 for i, doc in enumerate(retrieved_docs):
@@ -194,19 +245,28 @@ if indexing_successful:
 
                 st.markdown("### 💡 智能答案")
                 answer_container = st.empty()
+                cancel_token = CancellationToken()
+                st.session_state.cancel_token = cancel_token
+                renderer = CoalescingRenderer(answer_container)
+                answer_ok = False
                 try:
-                    full_answer = ""
-                    for token in generate_answer_stream(final_query, retrieved_docs, generation_model, tokenizer):
-                        if token:
-                            full_answer += token
-                            answer_container.markdown(full_answer + '<span class="streaming-cursor">▌</span>',
-                                                      unsafe_allow_html=True)
-                    answer_container.markdown(full_answer)
+                    # 生成在工作线程中进行；点击停止/新问题或断开连接时，本线程在 renderer 刷新处被 Streamlit 中断
+                    for token in stream_in_background(
+                            lambda: generate_answer_stream(final_query, retrieved_docs, generation_model, tokenizer,
+                                                           cancel_token=cancel_token),
+                            cancel_token):
+                        renderer.push(token)
+                    answer_ok = True
                 except Exception as e:
                     st.error(f"❌ 生成错误: {e}")
+                finally:
+                    # 无论正常结束、出错还是被中断，都通知工作线程在下一个解码步退出，再输出已生成的部分
+                    cancel_token.cancel("script stopped")
+                    renderer.close()
 
-        end_time = time.time()
-        st.success(f"✅ 回答生成完成！总耗时: {end_time - start_time:.2f} 秒")
+        if answer_ok:
+            end_time = time.time()
+            st.success(f"✅ 回答生成完成！总耗时: {end_time - start_time:.2f} 秒")
 
         # 第五步：重新开始
         col1, col2 = st.columns([1, 3])
@@ -223,6 +283,8 @@ st.sidebar.header("⚙️ 系统配置")
 st.sidebar.markdown(f"**向量存储:** ChromaDB")
 st.sidebar.markdown(f"**数据路径:** `{os.path.abspath(CHROMA_DATA_PATH)}`")
 st.sidebar.markdown(f"**Collection:** `{COLLECTION_NAME}`")
+if index_bundle is not None:
+    st.sidebar.markdown(f"**索引版本:** `{index_bundle.version}`")
 st.sidebar.success("✅ Token已配置")
 st.sidebar.markdown(f"**嵌入模型:** `{EMBEDDING_MODEL_NAME}`")
 st.sidebar.markdown(f"**生成模型:** `{GENERATION_MODEL_NAME}`")
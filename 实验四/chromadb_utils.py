@@ -9,8 +9,10 @@ import os
 # 导入配置
 from config import (
     CHROMA_DATA_PATH, COLLECTION_NAME, EMBEDDING_DIM,
-    MAX_ARTICLES_TO_INDEX, TOP_K, id_to_doc_map
+    MAX_ARTICLES_TO_INDEX, TOP_K, id_to_doc_map,
+    COMPRESSED_DIM, EMBEDDING_WHITEN, EMBEDDING_QUANTIZE, COMPRESSOR_FILE, QUANTIZED_INDEX_FILE
 )
+from embedding_compression import EmbeddingCompressor, QuantizedIndex, evaluate_recall
 
 
 @st.cache_resource
@@ -43,6 +45,27 @@ def get_chroma_client():
         return None
 
 
+def _create_collection(client):
+    return client.create_collection(
+        name=COLLECTION_NAME,
+        metadata={
+            "hnsw:space": "cosine",  # 使用余弦相似度
+            "hnsw:construction_ef": 100,  # 索引构建参数
+            "hnsw:M": 16
+        },
+        get_or_create=True
+    )
+
+
+def _stored_dim(collection):
+    """已有向量的维度；collection 为空时返回 None"""
+    sample = collection.get(limit=1, include=["embeddings"])
+    embeddings = sample.get("embeddings")
+    if embeddings is None or len(embeddings) == 0:
+        return None
+    return len(embeddings[0])
+
+
 @st.cache_resource
 def setup_chroma_collection(_client):
     """
@@ -64,15 +87,7 @@ def setup_chroma_collection(_client):
         except Exception:
             # 创建新collection（自动使用HNSW索引）
             st.write(f"Collection '{collection_name}' not found. Creating...")
-            collection = _client.create_collection(
-                name=collection_name,
-                metadata={
-                    "hnsw:space": "cosine",  # 使用余弦相似度
-                    "hnsw:construction_ef": 100,  # 索引构建参数
-                    "hnsw:M": 16
-                },
-                get_or_create=True
-            )
+            collection = _create_collection(_client)
             st.success(f"Collection '{collection_name}' created with HNSW index.")
 
         # 获取文档数量
@@ -85,6 +100,52 @@ def setup_chroma_collection(_client):
         return False
 
 
+@st.cache_resource
+def load_compression():
+    """
+    读取索引时训练的压缩器和int8索引；文件不存在（旧索引或未启用压缩）时返回 (None, None)，按原始向量检索
+    """
+    compressor = EmbeddingCompressor.load(COMPRESSOR_FILE) if os.path.exists(COMPRESSOR_FILE) else None
+    quantized_index = None
+    if compressor is not None and compressor.quantized and EMBEDDING_QUANTIZE and os.path.exists(QUANTIZED_INDEX_FILE):
+        quantized_index = QuantizedIndex.load(QUANTIZED_INDEX_FILE)
+    return compressor, quantized_index
+
+
+def compress_for_index(embeddings):
+    """
+    训练压缩器，返回 (写入Chroma的向量, 压缩器或None)；同时报告相对全维向量的 recall@k
+    压缩器此时还不落盘，等 collection.add 成功后由 save_compression 保存
+    """
+    if embeddings.shape[1] != EMBEDDING_DIM:
+        st.warning(f"嵌入维度 {embeddings.shape[1]} 与配置 EMBEDDING_DIM={EMBEDDING_DIM} 不一致")
+    if not COMPRESSED_DIM or COMPRESSED_DIM >= embeddings.shape[1]:
+        return embeddings, None
+
+    compressor = EmbeddingCompressor.fit(embeddings, COMPRESSED_DIM, EMBEDDING_WHITEN, EMBEDDING_QUANTIZE)
+    report = evaluate_recall(embeddings, compressor, k=TOP_K)
+    st.write(f"Embedding compression: {embeddings.shape[1]} → {compressor.dim} dims"
+             f"{' + int8' if compressor.quantized else ''}, "
+             f"{report['compression_ratio']:.1f}x smaller, recall@{TOP_K} = {report[f'recall@{TOP_K}']:.3f}")
+    return compressor.transform(embeddings), compressor
+
+
+def save_compression(compressor, embeddings, ids):
+    """collection 写入成功后保存压缩器和int8索引；未启用压缩时删除旧文件，查询按原始向量进行"""
+    if compressor is None:
+        for path in (COMPRESSOR_FILE, QUANTIZED_INDEX_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+    else:
+        compressor.save(COMPRESSOR_FILE)
+        if compressor.quantized:
+            QuantizedIndex(compressor.quantize(compressor.project(embeddings)), [int(i) for i in ids],
+                           compressor.quant_scale).save(QUANTIZED_INDEX_FILE)
+        elif os.path.exists(QUANTIZED_INDEX_FILE):
+            os.remove(QUANTIZED_INDEX_FILE)
+    load_compression.clear()
+
+
 def index_data_if_needed(client, data, embedding_model):
     """
     检查并索引数据到ChromaDB
@@ -156,16 +217,26 @@ def index_data_if_needed(client, data, embedding_model):
         )
         end_embed = time.time()
         st.write(f"Embedding took {end_embed - start_embed:.2f} seconds.")
+        vectors, compressor = compress_for_index(embeddings)
+
+        # 已有向量与本次维度不同，或来自另一次拟合的压缩器（投影基不同），都不能与新向量混在一起检索：
+        # 重建 collection 后全量写入
+        if current_count > 0 and (compressor is not None or _stored_dim(collection) != vectors.shape[1]):
+            st.warning(f"Existing {current_count} vectors are incompatible with the new "
+                       f"{vectors.shape[1]}-d index. Recreating collection '{collection_name}'...")
+            client.delete_collection(name=collection_name)
+            collection = _create_collection(client)
 
         # 批量插入到ChromaDB
         st.write("Inserting data into ChromaDB...")
         start_insert = time.time()
         collection.add(
-            embeddings=embeddings.tolist(),
+            embeddings=vectors.tolist(),
             documents=texts_to_encode,
             metadatas=metadatas,
             ids=ids
         )
+        save_compression(compressor, embeddings, ids)
         end_insert = time.time()
         st.success(
             f"Successfully indexed {len(texts_to_encode)} documents. Insert took {end_insert - start_insert:.2f} seconds.")
@@ -175,6 +246,8 @@ def index_data_if_needed(client, data, embedding_model):
         return True
     else:
         st.write("Data indexing is complete.")
+        if COMPRESSED_DIM and not os.path.exists(COMPRESSOR_FILE):
+            st.info("现有索引为原始维度向量，删除索引目录重建后启用嵌入压缩")
         # 如果全局映射为空，填充它
         if not id_to_doc_map:
             id_to_doc_map.update(temp_id_map)
@@ -194,11 +267,21 @@ def search_similar_documents(client, query, embedding_model):
     collection_name = COLLECTION_NAME
     collection = client.get_collection(name=collection_name)
 
-    # 生成查询向量
+    # 生成查询向量（与文档走同一压缩变换）
     query_embedding = embedding_model.encode(
         [query],
         normalize_embeddings=True
-    )[0].tolist()
+    )
+    compressor, quantized_index = load_compression()
+    if compressor is not None:
+        query_embedding = compressor.project(query_embedding)
+
+    # int8索引：numpy非对称内积扫描，分数即余弦相似度
+    if quantized_index is not None:
+        ids, scores = quantized_index.search(query_embedding, TOP_K)
+        return ids[0].tolist(), scores[0].tolist()
+
+    query_embedding = query_embedding[0].tolist()
 
     # 执行搜索
     try:
@@ -1,18 +1,40 @@
 # config.py - 删除查询优化配置
 # =====================================
+import os
+
 # ========== 查询预处理配置 ==========
 QUERY_PREPROCESSING_ENABLED = True  # 是否启用查询预处理
 QUERY_PREPROCESSING_TEMPERATURE = 0.1  # 预处理温度（越低越稳定）
 QUERY_PREPROCESSING_MAX_TOKENS = 128  # 预处理后最大长度
 
+# ========== 知识图谱查询扩展 ==========
+# 实验三产出的图谱复制在 data/ 下，镜像和 compose 挂载（只含实验四）中都能找到；可用环境变量指向其他版本
+KG_GRAPH_FILE = os.getenv("KG_GRAPH_FILE", "./data/focused_knowledge_graph.json")
+KG_ANALYSIS_FILE = os.getenv("KG_ANALYSIS_FILE", "./data/medical_network_analysis.json")
+KG_EXPANSION_NEIGHBORS = 3  # 追加的图谱近邻实体数
+
 # ========== ChromaDB配置 ==========
 CHROMA_DATA_PATH = "./chroma_data"
 COLLECTION_NAME = "medical_rag_chroma"
-EMBEDDING_DIM = 384
+EMBEDDING_DIM = 384  # 嵌入模型输出维度（all-MiniLM-L6-v2）
+
+# ========== 嵌入压缩配置 ==========
+COMPRESSED_DIM = 96  # PCA降维后的维度，None 表示按原始维度存储
+EMBEDDING_WHITEN = False  # 是否白化（各主成分方差归一）
+EMBEDDING_QUANTIZE = True  # 是否对降维后的向量做int8量化，检索走numpy扫描
+COMPRESSOR_FILE = "./chroma_data/embedding_compressor.npz"
+QUANTIZED_INDEX_FILE = "./chroma_data/quantized_index.npz"
+
+# ========== 离线索引包 ==========
+# python index_bundle.py build 的输出目录，CURRENT 指向当前版本；
+# Docker 镜像里构建在 /app 之外（/srv/index_bundles），不会被 compose 的项目挂载覆盖
+INDEX_BUNDLE_ROOT = os.getenv("INDEX_BUNDLE_ROOT", "./index_bundles")
 
 # ========== 数据配置 ==========
 DATA_FILE = "./data/processed_data.json"
 PUBMED_RAW_FILE = "./data/Open-Patients.jsonl"
+# 实验三/pdf_extraction.py 的逐页输出（默认写在实验三目录下），preprocess.py 把它并入知识库；可用环境变量改路径
+EXTRACTED_PAGES_FILE = os.getenv("EXTRACTED_PAGES_FILE", "../实验三/extracted_pages.jsonl")
 PUBMED_DOWNLOAD_URL = "https://huggingface.co/datasets/ncbi/pubmed/resolve/main/pubmed_test.jsonl"
 
 # ========== 模型配置 ==========
@@ -29,6 +51,10 @@ TEMPERATURE = 0.3
 TOP_P = 0.8
 REPETITION_PENALTY = 1.1
 
+# ========== 流式输出配置 ==========
+STREAM_FLUSH_INTERVAL = 0.15  # 两次刷新答案区域的最小间隔（秒）
+STREAM_FLUSH_CHARS = 64  # 累积超过该字符数时立即刷新
+
 # ========== 全局文档映射 ==========
 id_to_doc_map = {}
 
@@ -0,0 +1,201 @@
+# embedding_compression.py - 嵌入向量降维与int8量化
+# ======================================
+# 原实现把每个文档的 384 维 float32 向量经 embeddings.tolist() 原样写入Chroma，EMBEDDING_DIM 也没有被使用。这里：
+# 1. 在语料向量上学习 PCA（可选白化）投影到 COMPRESSED_DIM 维，投影后重新L2归一化，余弦检索语义不变
+# 2. 可选 int8 标量量化（每维对称缩放）：Chroma 只能存 float32，量化码另存为 .npy，
+#    检索时用 "int8 文档 × float32 查询" 的非对称内积在 numpy 中精确扫描
+# 3. 查询向量在 search_similar_documents 中走同一变换；evaluate_recall 报告相对全维向量的 recall@k，
+#    据此在内存/检索开销（4~8倍）与召回之间权衡
+import argparse
+import os
+import time
+
+import numpy as np
+
+
+class EmbeddingCompressor:
+    """PCA/白化 + 可选int8量化；参数保存为一个 .npz 文件"""
+
+    def __init__(self, mean, components, scale=None, whiten=False, quant_scale=None):
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)  # [dim, input_dim]
+        self.scale = None if scale is None else scale.astype(np.float32)  # 白化时为 1/sqrt(方差)
+        self.whiten = whiten
+        self.quant_scale = None if quant_scale is None else quant_scale.astype(np.float32)
+
+    @property
+    def input_dim(self):
+        return self.components.shape[1]
+
+    @property
+    def dim(self):
+        return self.components.shape[0]
+
+    @property
+    def quantized(self):
+        return self.quant_scale is not None
+
+    @classmethod
+    def fit(cls, embeddings, dim, whiten=False, quantize=False):
+        """embeddings: [N, input_dim]；dim 超过样本数/原始维度时自动截断"""
+        X = np.asarray(embeddings, dtype=np.float32)
+        dim = int(min(dim, X.shape[1], X.shape[0]))
+        mean = X.mean(axis=0)
+        # 协方差矩阵只有 input_dim × input_dim，直接特征分解比对 N × input_dim 做SVD更省
+        centered = X - mean
+        cov = centered.T @ centered / max(len(X) - 1, 1)
+        eigvals, eigvecs = np.linalg.eigh(cov)
+        order = np.argsort(eigvals)[::-1][:dim]
+        components = eigvecs[:, order].T
+        scale = 1.0 / np.sqrt(np.maximum(eigvals[order], 1e-12)) if whiten else None
+
+        compressor = cls(mean, components, scale, whiten)
+        if quantize:
+            reduced = compressor.project(X)
+            compressor.quant_scale = np.maximum(np.abs(reduced).max(axis=0), 1e-12) / 127.0
+        explained = eigvals[order].sum() / max(eigvals.sum(), 1e-12)
+        print(f"✅ 嵌入压缩器训练完成：{X.shape[1]} → {dim} 维（解释方差 {explained:.1%}）"
+              f"{'，白化' if whiten else ''}{'，int8量化' if quantize else ''}")
+        return compressor
+
+    def project(self, embeddings):
+        """降维（+白化）并重新L2归一化，返回 float32 [N, dim]"""
+        X = np.asarray(embeddings, dtype=np.float32)
+        reduced = (X - self.mean) @ self.components.T
+        if self.scale is not None:
+            reduced *= self.scale
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        return reduced / np.maximum(norms, 1e-12)
+
+    def quantize(self, reduced):
+        return np.clip(np.rint(reduced / self.quant_scale), -127, 127).astype(np.int8)
+
+    def dequantize(self, codes):
+        return codes.astype(np.float32) * self.quant_scale
+
+    def transform(self, embeddings):
+        """写入Chroma的向量：量化时存反量化后的值，与 int8 扫描的结果一致"""
+        reduced = self.project(embeddings)
+        return self.dequantize(self.quantize(reduced)) if self.quantized else reduced
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        arrays = {'mean': self.mean, 'components': self.components, 'whiten': np.array(self.whiten)}
+        if self.scale is not None:
+            arrays['scale'] = self.scale
+        if self.quant_scale is not None:
+            arrays['quant_scale'] = self.quant_scale
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['mean'], data['components'], data['scale'] if 'scale' in data else None,
+                   bool(data['whiten']), data['quant_scale'] if 'quant_scale' in data else None)
+
+
+class QuantizedIndex:
+    """int8 文档码 + 对应ID，检索为非对称内积：codes · (query * quant_scale)"""
+
+    def __init__(self, codes, ids, quant_scale):
+        self.codes = codes
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.quant_scale = quant_scale
+
+    def search(self, query_vectors, k, block_size=65536):
+        """query_vectors: 已经 project 过的 [Q, dim]；返回 (ids [Q, k], scores [Q, k])"""
+        weighted = np.atleast_2d(query_vectors).astype(np.float32) * self.quant_scale
+        k = min(k, len(self.ids))
+        best_scores = np.full((len(weighted), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(weighted), 0), dtype=np.int64)
+        # 分块反量化，避免一次把全部文档码展开成 float32
+        for start in range(0, len(self.codes), block_size):
+            scores = weighted @ self.codes[start:start + block_size].astype(np.float32).T
+            rows = np.arange(start, start + scores.shape[1])
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, np.broadcast_to(rows, scores.shape)], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return (self.ids[np.take_along_axis(best_rows, order, axis=1)],
+                np.take_along_axis(best_scores, order, axis=1))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, codes=self.codes, ids=self.ids, quant_scale=self.quant_scale)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['codes'], data['ids'], data['quant_scale'])
+
+
+def _top_k(scores, k):
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+
+def evaluate_recall(embeddings, compressor, k=3, num_queries=500, seed=42):
+    """
+    以语料中随机抽取的文档作为查询（排除自身），比较压缩前后的 top-k 结果，
+    返回 {'recall@k', 'bytes_per_vector', 'compression_ratio'}
+    """
+    X = np.asarray(embeddings, dtype=np.float32)
+    k = min(k, len(X) - 1)
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(len(X), size=min(num_queries, len(X)), replace=False)
+
+    full = X[queries] @ X.T
+    full[np.arange(len(queries)), queries] = -np.inf
+    truth = _top_k(full, k)
+
+    reduced_docs = compressor.transform(X)
+    approx = compressor.project(X[queries]) @ reduced_docs.T
+    approx[np.arange(len(queries)), queries] = -np.inf
+    found = _top_k(approx, k)
+
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist()))
+    bytes_per_vector = compressor.dim * (1 if compressor.quantized else 4)
+    return {
+        f'recall@{k}': hits / (len(queries) * k),
+        'bytes_per_vector': bytes_per_vector,
+        'compression_ratio': X.shape[1] * 4 / bytes_per_vector,
+    }
+
+
+def main():
+    """在语料上比较不同维度/量化组合的 recall@k 与压缩比"""
+    from sentence_transformers import SentenceTransformer
+    from config import DATA_FILE, EMBEDDING_MODEL_NAME, MAX_ARTICLES_TO_INDEX, TOP_K
+    from data_utils import load_data
+
+    parser = argparse.ArgumentParser(description="嵌入降维/量化的召回评估")
+    parser.add_argument("--dims", type=int, nargs='+', default=[48, 64, 96, 128, 192])
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--whiten", action="store_true")
+    parser.add_argument("--max-docs", type=int, default=MAX_ARTICLES_TO_INDEX)
+    args = parser.parse_args()
+
+    docs = load_data(DATA_FILE)[:args.max_docs]
+    texts = [f"Title: {d.get('title', '') or ''}\nAbstract: {d.get('abstract', '') or ''}".strip() for d in docs]
+    start = time.time()
+    embeddings = SentenceTransformer(EMBEDDING_MODEL_NAME).encode(texts, normalize_embeddings=True)
+    print(f"编码 {len(texts)} 篇文档，耗时 {time.time() - start:.1f} 秒")
+
+    print(f"{'维度':>6} {'int8':>6} {'recall@' + str(args.k):>10} {'字节/向量':>10} {'压缩比':>8}")
+    for dim in args.dims:
+        for quantize in (False, True):
+            compressor = EmbeddingCompressor.fit(embeddings, dim, args.whiten, quantize)
+            report = evaluate_recall(embeddings, compressor, args.k)
+            print(f"{compressor.dim:>6} {str(quantize):>6} {report[f'recall@{args.k}']:>10.3f} "
+                  f"{report['bytes_per_vector']:>10} {report['compression_ratio']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
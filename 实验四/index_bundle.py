@@ -0,0 +1,298 @@
+# index_bundle.py - 离线构建、带版本的检索索引包
+# ======================================
+# 原流程在第一个用户的 Streamlit 会话里才做嵌入和建索引，NEED_REINDEX 标记还会在请求时 rmtree 后全量重建。这里：
+# 1. 离线命令 `python index_bundle.py build` 生成自包含的索引包：向量（mmap友好的 .npy）、文档库、
+#    压缩器/int8索引、可选的 BM25/元数据旁路文件，以及记录模型名、语料哈希和各文件 sha256 的 manifest.json
+# 2. 先写入临时目录再 rename 发布，CURRENT 指针文件用 os.replace 原子切换；旧版本保留，可随时回滚
+# 3. 应用启动时按 CURRENT 加载（向量 mmap），校验完整性；新会话读到新版本即切换，正在进行的会话不受影响
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from config import (
+    INDEX_BUNDLE_ROOT, DATA_FILE, EMBEDDING_MODEL_NAME, EMBEDDING_DIM, MAX_ARTICLES_TO_INDEX,
+    COMPRESSED_DIM, EMBEDDING_WHITEN, EMBEDDING_QUANTIZE, TOP_K
+)
+from data_utils import load_data
+from embedding_compression import EmbeddingCompressor, QuantizedIndex, evaluate_recall
+
+BUNDLE_FORMAT = 1
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+VECTORS_FILE = "vectors.npy"
+DOCS_FILE = "docs.jsonl"
+COMPRESSOR_NAME = "embedding_compressor.npz"
+QUANTIZED_NAME = "quantized_index.npz"
+SIDECAR_DIR = "sidecars"
+
+
+class BundleIntegrityError(Exception):
+    """索引包缺失文件、文件被改动或与当前配置不兼容"""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def prepare_documents(data, max_docs=MAX_ARTICLES_TO_INDEX):
+    """与 index_data_if_needed 相同的文档拼接方式，返回 [(doc_id, content, record), ...]"""
+    documents = []
+    for i, doc in enumerate(data[:max_docs]):
+        title = doc.get('title', '') or ""
+        abstract = doc.get('abstract', '') or ""
+        content = f"Title: {title}\nAbstract: {abstract}".strip()
+        if not content:
+            continue
+        documents.append((i, content, {
+            'title': title,
+            'abstract': abstract,
+            'content': content,
+            'source': doc.get('source', ''),
+            'publish_time': doc.get('publish_time', '')
+        }))
+    return documents
+
+
+def build_bundle(data_file=DATA_FILE, root=INDEX_BUNDLE_ROOT, model_name=EMBEDDING_MODEL_NAME,
+                 max_docs=MAX_ARTICLES_TO_INDEX, sidecars=(), activate=True, embedding_model=None):
+    """编码语料并发布一个新版本的索引包，返回版本号"""
+    corpus_hash = _sha256(data_file)
+    documents = prepare_documents(load_data(data_file), max_docs)
+    if not documents:
+        raise ValueError(f"{data_file} 中没有可索引的文档")
+
+    if embedding_model is None:
+        from sentence_transformers import SentenceTransformer
+        embedding_model = SentenceTransformer(model_name)
+    start = time.time()
+    embeddings = np.asarray(embedding_model.encode([content for _, content, _ in documents],
+                                                   normalize_embeddings=True, show_progress_bar=True),
+                            dtype=np.float32)
+    print(f"编码 {len(documents)} 篇文档，耗时 {time.time() - start:.1f} 秒")
+    if embeddings.shape[1] != EMBEDDING_DIM:
+        raise ValueError(f"嵌入维度 {embeddings.shape[1]} 与配置 EMBEDDING_DIM={EMBEDDING_DIM} 不一致")
+
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{corpus_hash[:8]}"
+    staging = os.path.join(root, f".staging-{version}")
+    os.makedirs(staging)
+    try:
+        ids = np.array([doc_id for doc_id, _, _ in documents], dtype=np.int64)
+        vectors = embeddings
+        compression = None
+        if COMPRESSED_DIM and COMPRESSED_DIM < embeddings.shape[1]:
+            compressor = EmbeddingCompressor.fit(embeddings, COMPRESSED_DIM, EMBEDDING_WHITEN, EMBEDDING_QUANTIZE)
+            compression = evaluate_recall(embeddings, compressor, k=TOP_K)
+            compression.update(dim=compressor.dim, whiten=EMBEDDING_WHITEN, quantized=compressor.quantized)
+            print(f"压缩: {embeddings.shape[1]} → {compressor.dim} 维，recall@{TOP_K} = {compression[f'recall@{TOP_K}']:.3f}")
+            compressor.save(os.path.join(staging, COMPRESSOR_NAME))
+            if compressor.quantized:
+                QuantizedIndex(compressor.quantize(compressor.project(embeddings)), ids,
+                               compressor.quant_scale).save(os.path.join(staging, QUANTIZED_NAME))
+            vectors = compressor.transform(embeddings)
+        np.save(os.path.join(staging, VECTORS_FILE), np.ascontiguousarray(vectors, dtype=np.float32))
+        np.save(os.path.join(staging, "ids.npy"), ids)
+
+        with open(os.path.join(staging, DOCS_FILE), 'w', encoding='utf-8') as f:
+            for doc_id, _, record in documents:
+                f.write(json.dumps({'id': doc_id, **record}, ensure_ascii=False) + '\n')
+
+        for path in sidecars:
+            if os.path.exists(path):
+                os.makedirs(os.path.join(staging, SIDECAR_DIR), exist_ok=True)
+                shutil.copy2(path, os.path.join(staging, SIDECAR_DIR, os.path.basename(path)))
+            else:
+                print(f"⚠️ 旁路文件不存在，已跳过: {path}")
+
+        files = {}
+        for dirpath, _, filenames in os.walk(staging):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                rel = os.path.relpath(path, staging).replace(os.sep, '/')
+                files[rel] = {'sha256': _sha256(path), 'size': os.path.getsize(path)}
+
+        manifest = {
+            'format': BUNDLE_FORMAT,
+            'version': version,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'embedding_model': model_name,
+            'embedding_dim': int(embeddings.shape[1]),
+            'vector_dim': int(vectors.shape[1]),
+            'num_documents': len(documents),
+            'corpus_file': os.path.basename(data_file),
+            'corpus_sha256': corpus_hash,
+            'compression': compression,
+            'files': files,
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        os.rename(staging, os.path.join(root, version))  # 同一文件系统内原子发布
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    print(f"✅ 索引包已构建: {os.path.join(root, version)}（{len(documents)} 篇文档）")
+    if activate:
+        activate_bundle(version, root)
+    return version
+
+
+def activate_bundle(version, root=INDEX_BUNDLE_ROOT):
+    """校验后原子切换 CURRENT 指针"""
+    verify_bundle(os.path.join(root, version))
+    tmp_path = os.path.join(root, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+    print(f"✅ 当前索引版本: {version}")
+
+
+def current_version(root=INDEX_BUNDLE_ROOT):
+    path = os.path.join(root, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip() or None
+
+
+def list_versions(root=INDEX_BUNDLE_ROOT):
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if not name.startswith('.') and os.path.exists(os.path.join(root, name, MANIFEST_FILE)))
+
+
+def prune_bundles(root=INDEX_BUNDLE_ROOT, keep=3):
+    """只保留最近 keep 个版本（当前版本始终保留）"""
+    current = current_version(root)
+    for version in list_versions(root)[:-keep] if keep else list_versions(root):
+        if version != current:
+            shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+            print(f"🗑️ 已删除旧索引版本: {version}")
+
+
+def verify_bundle(bundle_dir, check_hashes=True, model_name=EMBEDDING_MODEL_NAME):
+    """校验文件齐全、大小/哈希一致，且与当前嵌入模型配置兼容；返回 manifest"""
+    manifest_path = os.path.join(bundle_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise BundleIntegrityError(f"缺少 {MANIFEST_FILE}: {bundle_dir}")
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise BundleIntegrityError(f"不支持的索引包格式: {manifest.get('format')}")
+    if manifest['embedding_model'] != model_name:
+        raise BundleIntegrityError(f"索引包使用的嵌入模型 {manifest['embedding_model']} 与配置 {model_name} 不一致")
+    for rel, info in manifest['files'].items():
+        path = os.path.join(bundle_dir, rel)
+        if not os.path.exists(path) or os.path.getsize(path) != info['size']:
+            raise BundleIntegrityError(f"文件缺失或大小不符: {rel}")
+        if check_hashes and _sha256(path) != info['sha256']:
+            raise BundleIntegrityError(f"文件哈希不符: {rel}")
+    return manifest
+
+
+class BundleIndex:
+    """只读加载的索引包：向量 mmap，文档库常驻内存，检索为精确内积（int8索引存在时走量化扫描）"""
+
+    def __init__(self, bundle_dir, check_hashes=True):
+        start = time.time()
+        self.manifest = verify_bundle(bundle_dir, check_hashes)
+        self.version = self.manifest['version']
+        self.vectors = np.load(os.path.join(bundle_dir, VECTORS_FILE), mmap_mode='r')
+        self.ids = np.load(os.path.join(bundle_dir, "ids.npy"))
+
+        compressor_path = os.path.join(bundle_dir, COMPRESSOR_NAME)
+        quantized_path = os.path.join(bundle_dir, QUANTIZED_NAME)
+        self.compressor = EmbeddingCompressor.load(compressor_path) if os.path.exists(compressor_path) else None
+        self.quantized_index = QuantizedIndex.load(quantized_path) if os.path.exists(quantized_path) else None
+
+        self.docs = {}
+        with open(os.path.join(bundle_dir, DOCS_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                self.docs[record.pop('id')] = record
+        self.sidecar_dir = os.path.join(bundle_dir, SIDECAR_DIR)
+        print(f"✅ 索引包 {self.version} 加载完成：{len(self.docs)} 篇文档，"
+              f"{self.vectors.shape[1]} 维，耗时 {time.time() - start:.2f} 秒")
+
+    def search(self, query_embedding, k=TOP_K):
+        """query_embedding: 归一化后的原始嵌入 [dim]；返回 (ids, 相似度)"""
+        query = np.atleast_2d(np.asarray(query_embedding, dtype=np.float32))
+        if self.compressor is not None:
+            query = self.compressor.project(query)
+        if self.quantized_index is not None:
+            ids, scores = self.quantized_index.search(query, k)
+            return ids[0].tolist(), scores[0].tolist()
+        scores = np.asarray(self.vectors @ query[0])
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return self.ids[top].tolist(), scores[top].tolist()
+
+    def search_query(self, query, embedding_model, k=TOP_K):
+        return self.search(embedding_model.encode([query], normalize_embeddings=True)[0], k)
+
+
+def load_current_bundle(root=INDEX_BUNDLE_ROOT, check_hashes=True):
+    """加载 CURRENT 指向的索引包；不存在或校验失败时返回 None，调用方回退到在线建索引"""
+    version = current_version(root)
+    if version is None:
+        return None
+    try:
+        return BundleIndex(os.path.join(root, version), check_hashes)
+    except (BundleIntegrityError, OSError, ValueError) as e:
+        print(f"❌ 索引包 {version} 加载失败: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线构建/校验/切换检索索引包")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="编码语料并发布新版本")
+    build.add_argument("--data", default=DATA_FILE)
+    build.add_argument("--root", default=INDEX_BUNDLE_ROOT)
+    build.add_argument("--max-docs", type=int, default=MAX_ARTICLES_TO_INDEX)
+    build.add_argument("--sidecar", action="append", default=[], help="随包发布的BM25/元数据文件，可重复")
+    build.add_argument("--no-activate", action="store_true", help="只构建，不切换 CURRENT")
+    build.add_argument("--keep", type=int, default=3, help="保留的历史版本数")
+    verify = sub.add_parser("verify", help="校验索引包（默认当前版本）")
+    verify.add_argument("version", nargs="?")
+    verify.add_argument("--root", default=INDEX_BUNDLE_ROOT)
+    activate = sub.add_parser("activate", help="切换到指定版本（回滚）")
+    activate.add_argument("version")
+    activate.add_argument("--root", default=INDEX_BUNDLE_ROOT)
+    listing = sub.add_parser("list", help="列出所有版本")
+    listing.add_argument("--root", default=INDEX_BUNDLE_ROOT)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        os.makedirs(args.root, exist_ok=True)
+        build_bundle(args.data, args.root, max_docs=args.max_docs, sidecars=args.sidecar,
+                     activate=not args.no_activate)
+        prune_bundles(args.root, args.keep)
+    elif args.command == "verify":
+        version = args.version or current_version(args.root)
+        if version is None:
+            parser.error("没有可校验的索引包")
+        manifest = verify_bundle(os.path.join(args.root, version))
+        print(f"✅ 索引包 {version} 校验通过：{manifest['num_documents']} 篇文档，模型 {manifest['embedding_model']}")
+    elif args.command == "activate":
+        activate_bundle(args.version, args.root)
+    else:
+        current = current_version(args.root)
+        for version in list_versions(args.root):
+            print(f"{'*' if version == current else ' '} {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# kg_query_expansion.py - 基于知识图谱的查询扩展
+# ======================================
+# preprocess_query 每次都要调用一次 Qwen generate，只为把口语化症状映射成医学术语。
+# 实验三已经产出了实体共现图（focused_knowledge_graph.json / medical_network_analysis.json），这里：
+# 1. 启动时一次性构建内存实体索引：同义词表（口语 / 中文术语 / 英文实体名 → 图谱实体）编译成一个正则
+# 2. 每个实体预先按关联强度排好近邻列表（Ochiai 系数 weight / sqrt(f_i·f_j)，同社区加权），
+#    抑制 pain / surgery 这类高频枢纽实体
+# 3. 查询扩展只做一次正则扫描和几次字典查找（微秒级）；没有命中任何实体时返回 None，
+#    由调用方回退到 LLM 改写
+import json
+import math
+import os
+import re
+import time
+
+# 图谱实体（英文）→ 中文标准术语 + 常见口语说法
+SYNONYMS = {
+    # 症状
+    'fever': ('发热', ['发烧', '高烧', '低烧', '体温高']),
+    'cough': ('咳嗽', ['咳痰', '干咳']),
+    'headache': ('头痛', ['头疼', '脑袋疼', '偏头痛']),
+    'dizziness': ('眩晕', ['头晕', '头昏', '晕乎乎']),
+    'nausea': ('恶心', ['想吐', '反胃']),
+    'vomiting': ('呕吐', ['吐了', '老是吐']),
+    'diarrhea': ('腹泻', ['拉肚子', '拉稀']),
+    'fatigue': ('乏力', ['疲劳', '没力气', '没劲']),
+    'weakness': ('虚弱', ['无力', '浑身没劲']),
+    'chest pain': ('胸痛', ['胸口疼', '胸口痛', '心口疼']),
+    'back pain': ('背痛', ['腰疼', '腰痛', '背疼']),
+    'shortness of breath': ('气短', ['喘不上气', '上不来气', '气急']),
+    'dyspnea': ('呼吸困难', ['憋气', '喘不过气']),
+    'rash': ('皮疹', ['起疹子', '出疹子', '红疹']),
+    'swelling': ('肿胀', ['肿了', '浮肿', '水肿']),
+    'bleeding': ('出血', ['流血', '出血了']),
+    'pain': ('疼痛', ['疼', '痛']),
+    'infection': ('感染', ['发炎']),
+    'inflammation': ('炎症', []),
+    'confusion': ('意识模糊', ['糊涂', '神志不清']),
+    'weight loss': ('体重下降', ['消瘦', '变瘦', '掉秤']),
+    'shaking': ('震颤', ['发抖', '手抖']),
+    'twitching': ('抽搐', ['抽筋']),
+    'visual changes': ('视力改变', ['看不清', '视力模糊', '眼花']),
+    'flushing': ('潮红', ['脸红', '面部发红']),
+    # 疾病
+    'hypertension': ('高血压', ['血压高']),
+    'diabetes': ('糖尿病', ['血糖高', '高血糖']),
+    'pneumonia': ('肺炎', []),
+    'asthma': ('哮喘', ['气喘']),
+    'stroke': ('脑卒中', ['中风', '脑梗']),
+    'myocardial infarction': ('心肌梗死', ['心梗', '心脏病发作']),
+    'heart failure': ('心力衰竭', ['心衰']),
+    'cancer': ('癌症', ['肿瘤', '恶性肿瘤']),
+    'lung cancer': ('肺癌', []),
+    'breast cancer': ('乳腺癌', []),
+    'ovarian cancer': ('卵巢癌', []),
+    'leukemia': ('白血病', ['血癌']),
+    'melanoma': ('黑色素瘤', []),
+    'arthritis': ('关节炎', ['关节疼', '关节痛']),
+    'epilepsy': ('癫痫', ['羊癫疯']),
+    'gastritis': ('胃炎', ['胃疼', '胃痛']),
+    'cirrhosis': ('肝硬化', []),
+    'liver disease': ('肝病', ['肝不好']),
+    'kidney disease': ('肾病', ['肾不好', '肾功能不全']),
+    'lung disease': ('肺病', []),
+    'preeclampsia': ('子痫前期', ['妊娠高血压']),
+    'toxoplasmosis': ('弓形虫病', []),
+    'mastocytosis': ('肥大细胞增多症', []),
+    # 治疗
+    'medication': ('药物治疗', ['吃药', '用药', '吃什么药', '该用什么药']),
+    'treatment': ('治疗', ['怎么治', '咋治', '如何治', '怎么办']),
+    'surgery': ('手术', ['开刀', '动手术']),
+    'antibiotic': ('抗生素', ['消炎药']),
+    'antibiotics': ('抗生素', []),
+    'antiviral': ('抗病毒药', []),
+    'chemotherapy': ('化疗', []),
+    'radiation': ('放疗', ['放射治疗']),
+    'immunotherapy': ('免疫治疗', []),
+    'transplant': ('移植', ['器官移植']),
+    'dialysis': ('透析', ['血透']),
+    'insulin': ('胰岛素', []),
+    'aspirin': ('阿司匹林', []),
+    'warfarin': ('华法林', []),
+    'morphine': ('吗啡', []),
+    'prednisone': ('泼尼松', ['强的松']),
+    'steroid': ('激素', ['类固醇']),
+    'mycophenolate': ('吗替麦考酚酯', []),
+    'therapy': ('疗法', []),
+}
+
+EXPANDABLE_TYPES = ('disease', 'symptom', 'treatment')  # 人口学节点（age_*/gender_*）不参与扩展
+COMMUNITY_BONUS = 0.2  # 近邻与查询实体同属一个社区时的加权比例
+MAX_NEIGHBORS = 10  # 每个实体预存的近邻数
+INTENT_ENTITIES = frozenset({'treatment', 'medication', 'therapy'})  # 只表达意图，单独命中不算识别出医学实体
+
+
+def _load_json(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class KGQueryExpander:
+    """内存实体索引：同义词匹配 + 按关联强度排序的近邻列表"""
+
+    def __init__(self, graph_path, analysis_path=None, synonyms=SYNONYMS, max_neighbors=MAX_NEIGHBORS):
+        start = time.time()
+        graph = _load_json(graph_path) or {'nodes': [], 'edges': []}
+        analysis = _load_json(analysis_path) or {}
+
+        self.entities = {}  # name -> {'type', 'frequency', 'term'}
+        id_to_name = {}
+        for node in graph['nodes']:
+            props = node['properties']
+            if props.get('type') not in EXPANDABLE_TYPES:
+                continue
+            id_to_name[node['id']] = props['name']
+            self.entities[props['name']] = {'type': props['type'], 'frequency': props.get('frequency', 1)}
+        # 分析文件里有、聚焦图里没有的实体也纳入索引（无近邻）
+        for entity in analysis.get('top_entities_by_degree', []):
+            if entity.get('type') in EXPANDABLE_TYPES:
+                self.entities.setdefault(entity['name'], {'type': entity['type'],
+                                                          'frequency': entity.get('frequency', 1)})
+        for name, info in self.entities.items():
+            info['term'] = synonyms[name][0] if name in synonyms else name
+
+        community_of = {}
+        for community in analysis.get('network_communities', []):
+            for entity in community.get('entities', []):
+                community_of[entity['name']] = community['community_id']
+
+        # 近邻列表：Ochiai 系数，边上有 npmi（cooccurrence.py 输出）时取两者较大者
+        scored = {name: {} for name in self.entities}
+        for edge in graph.get('edges', []):
+            a, b = id_to_name.get(edge['source']), id_to_name.get(edge['target'])
+            if a is None or b is None or a == b:
+                continue
+            props = edge.get('properties') or {}
+            fa, fb = self.entities[a]['frequency'], self.entities[b]['frequency']
+            score = props.get('weight', 1) / math.sqrt(max(fa * fb, 1))
+            if 'npmi' in props:
+                score = max(score, props['npmi'])
+            if a in community_of and community_of.get(a) == community_of.get(b):
+                score *= 1 + COMMUNITY_BONUS
+            for u, v in ((a, b), (b, a)):
+                scored[u][v] = max(scored[u].get(v, 0.0), score)
+        self.neighbors = {
+            name: sorted(nbrs.items(), key=lambda x: (-x[1], x[0]))[:max_neighbors]
+            for name, nbrs in scored.items()
+        }
+
+        # 同义词表：任意说法 → 实体名；长词优先，保证"胸口疼"不会先被"疼"截走
+        self.surface_to_entity = {}
+        for name in self.entities:
+            term, colloquial = synonyms.get(name, (name, []))
+            for surface in [name, term] + list(colloquial):
+                self.surface_to_entity.setdefault(surface.lower(), name)
+        surfaces = sorted(self.surface_to_entity, key=len, reverse=True)
+        # 英文实体名加单词边界，避免 "pain" 命中 "painful"
+        parts = [rf'\b{re.escape(s)}\b' if s.isascii() else re.escape(s) for s in surfaces]
+        self._pattern = re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+
+        self.build_seconds = time.time() - start
+        print(f"✅ 知识图谱实体索引构建完成：{len(self.entities)} 个实体，"
+              f"{len(self.surface_to_entity)} 个同义说法，耗时 {self.build_seconds * 1000:.1f} ms")
+
+    def __bool__(self):
+        return bool(self.entities)
+
+    def match(self, text):
+        """按出现顺序返回查询中命中的实体名（去重）"""
+        if not text or self._pattern is None:
+            return []
+        found = (self.surface_to_entity[m.group(0).lower()] for m in self._pattern.finditer(text))
+        return list(dict.fromkeys(found))
+
+    def related(self, entities, top_n=3):
+        """汇总多个实体的近邻得分，返回不在查询中的前 top_n 个相关实体 [(name, score), ...]"""
+        totals = {}
+        for name in entities:
+            for neighbor, score in self.neighbors.get(name, []):
+                if neighbor not in entities and neighbor not in INTENT_ENTITIES:
+                    totals[neighbor] = totals.get(neighbor, 0.0) + score
+        return sorted(totals.items(), key=lambda x: (-x[1], x[0]))[:top_n]
+
+    def expand(self, user_input, top_neighbors=3):
+        """
+        返回扩展结果 dict 或 None（未命中任何实体）：
+        - matched: 命中的实体；related: 图谱近邻（只命中"怎么办"这类意图词时也返回 None）
+        - query: 用户原文 + 中文标准术语 + 英文实体名（检索库为英文PubMed摘要，英文名直接提升召回）；
+          原文整体保留，年龄、部位等未命中实体的信息不会丢失（与LLM改写"禁止删除原始信息"的要求一致）
+        """
+        matched = self.match(user_input)
+        if not matched or INTENT_ENTITIES.issuperset(matched):
+            return None
+        related = [name for name, _ in self.related(matched, top_neighbors)]
+
+        terms = [self.entities[name]['term'] for name in matched]
+        if any(name in INTENT_ENTITIES for name in matched):
+            terms.extend(['诊断', '病因'])
+        english = matched + related
+        query = " ".join([user_input.strip()] + list(dict.fromkeys(terms + english)))
+        return {'matched': matched, 'related': related, 'query': query}
+
+
+def load_query_expander(graph_path, analysis_path=None):
+    """图谱文件缺失时返回 None，调用方照常走 LLM 改写"""
+    if not os.path.exists(graph_path):
+        print(f"⚠️ 未找到知识图谱文件 {graph_path}，查询扩展回退到LLM改写")
+        return None
+    return KGQueryExpander(graph_path, analysis_path)
@@ -0,0 +1,456 @@
+# load_test.py - 多用户并发压测
+# ======================================
+# Streamlit 为每个会话开一个线程，@st.cache_resource 的 Qwen 模型、共享的 Chroma PersistentClient
+# 以及全局 id_to_doc_map 在会话之间共享，线程安全性没有任何文档说明。这里：
+# 1. 用 N 个线程模拟 N 个并发会话，循环执行 改写 → 检索 → 生成，每轮之间按指数分布的思考时间等待
+# 2. 查询从 processed_data 的标题按模板生成，可混入口语化问题以覆盖图谱扩展 / LLM改写两条路径
+# 3. --backend tiny 使用极小的替身模型（字节级分词 + 两层线性网络、字符n-gram哈希嵌入），本地无GPU也能跑
+# 4. 报告吞吐、各阶段 p50/p99、错误率、随时间变化的内存，并标记共享状态上的数据竞争：
+#    共享对象被并发进入的最大并发数、共享状态在服务期间被修改、相同输入在不同会话得到不同结果
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+import numpy as np
+
+from config import (
+    DATA_FILE, EMBEDDING_DIM, EMBEDDING_MODEL_NAME, GENERATION_MODEL_NAME, INDEX_BUNDLE_ROOT,
+    KG_GRAPH_FILE, KG_ANALYSIS_FILE, TOP_K, id_to_doc_map
+)
+from data_utils import load_data
+
+QUERY_TEMPLATES = ["{title}的临床经验", "{title}如何治疗咳嗽", "{title} 治疗方案", "{title}的用药特点"]
+COLLOQUIAL_QUERIES = [
+    "我发烧咳嗽好几天了，该吃什么药？", "血压高，头疼头晕怎么办", "胸口疼喘不上气", "拉肚子还想吐",
+    "鼻子堵了怎么办", "最近总是没劲，睡不好", "糖尿病要注意什么", "关节疼是不是关节炎",
+]
+
+
+# ========== 替身模型 ==========
+class TinyEmbedder:
+    """字符 n-gram 哈希到 EMBEDDING_DIM 维的带符号计数，接口与 SentenceTransformer.encode 一致"""
+
+    def __init__(self, dim=EMBEDDING_DIM, delay=0.002):
+        self.dim = dim
+        self.delay = delay
+
+    def _vector(self, text):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for n in (1, 2, 3):
+            for i in range(max(len(text) - n + 1, 0)):
+                h = int.from_bytes(hashlib.blake2b(text[i:i + n].encode('utf-8'), digest_size=8).digest(), 'little')
+                vec[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        return vec
+
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        time.sleep(self.delay)
+        X = np.stack([self._vector(t) for t in texts])
+        if normalize_embeddings:
+            X /= np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+        return X
+
+
+def build_tiny_generator(step_delay=0.005, seed=0):
+    """字节级分词器 + 极小的因果语言模型；接口覆盖 preprocess_query / generate_answer_stream 用到的部分"""
+    import torch
+
+    class _Batch(dict):
+        def to(self, device):
+            return _Batch({k: v.to(device) for k, v in self.items()})
+
+    class TinyTokenizer:
+        eos_token_id = 0
+        pad_token_id = 0
+        offset = 3
+
+        def __call__(self, text, return_tensors="pt"):
+            ids = [b + self.offset for b in text.encode('utf-8')[-512:]]
+            return _Batch({'input_ids': torch.tensor([ids], dtype=torch.long)})
+
+        def decode(self, ids, skip_special_tokens=True, **kwargs):
+            data = bytes(int(i) - self.offset for i in ids if int(i) >= self.offset)
+            return data.decode('utf-8', errors='ignore')
+
+    class TinyCausalLM(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            torch.manual_seed(seed)
+            self.embed = torch.nn.Embedding(256 + TinyTokenizer.offset, 32)
+            self.head = torch.nn.Linear(32, 256 + TinyTokenizer.offset)
+            self.generation_config = SimpleNamespace(output_scores=False)
+
+        @property
+        def device(self):
+            return self.head.weight.device
+
+        def forward(self, input_ids, past_key_values=None, use_cache=True):
+            time.sleep(step_delay)  # 模拟一次解码的计算时间（sleep 释放GIL，与真实模型在C++内核中一致）
+            logits = self.head(self.embed(input_ids))
+            # ASCII 字母区间加偏置，保证输出可打印、便于肉眼检查
+            logits[..., ord('a') + TinyTokenizer.offset:ord('z') + TinyTokenizer.offset + 1] += 4.0
+            past = (past_key_values or 0) + input_ids.shape[1]
+            return SimpleNamespace(logits=logits, past_key_values=past)
+
+        @torch.no_grad()
+        def generate(self, input_ids, max_new_tokens=16, **kwargs):
+            tokens = input_ids
+            for _ in range(max_new_tokens):
+                next_token = self(tokens[:, -1:]).logits[:, -1, :].argmax(dim=-1, keepdim=True)
+                tokens = torch.cat([tokens, next_token], dim=-1)
+            return tokens
+
+    return TinyCausalLM().eval(), TinyTokenizer()
+
+
+def load_real_models(embedding_name=EMBEDDING_MODEL_NAME, generation_name=GENERATION_MODEL_NAME):
+    """与 models.py 相同的加载方式，但不经过 Streamlit"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    embedder = SentenceTransformer(embedding_name)
+    tokenizer = AutoTokenizer.from_pretrained(generation_name, trust_remote_code=True)
+    model = AutoModelForCausalLM.from_pretrained(
+        generation_name, trust_remote_code=True, device_map="auto",
+        torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    return embedder, model, tokenizer
+
+
+# ========== 检索后端 ==========
+class MemorySearch:
+    """用替身/真实嵌入在内存中建精确索引，文档ID与 index_data_if_needed 一致（数据下标）"""
+
+    def __init__(self, data, embedder, max_docs=500):
+        from index_bundle import prepare_documents
+        documents = prepare_documents(data, max_docs)
+        self.ids = np.array([doc_id for doc_id, _, _ in documents], dtype=np.int64)
+        self.docs = {doc_id: record for doc_id, _, record in documents}
+        self.vectors = embedder.encode([content for _, content, _ in documents], normalize_embeddings=True)
+        self.embedder = embedder
+
+    def __call__(self, query):
+        scores = self.vectors @ self.embedder.encode([query], normalize_embeddings=True)[0]
+        top = np.argsort(-scores)[:TOP_K]
+        return self.ids[top].tolist(), scores[top].tolist()
+
+
+def build_search(backend, data, embedder):
+    """返回 (search(query) -> (ids, scores), doc_map)"""
+    if backend == 'bundle':
+        from index_bundle import load_current_bundle
+        bundle = load_current_bundle(INDEX_BUNDLE_ROOT)
+        if bundle is None:
+            raise RuntimeError("没有可用的索引包，请先运行 python index_bundle.py build")
+        return (lambda q: bundle.search_query(q, embedder, TOP_K)), bundle.docs
+    if backend == 'chroma':
+        from chromadb_utils import get_chroma_client, setup_chroma_collection, index_data_if_needed, \
+            search_similar_documents
+        client = get_chroma_client()
+        setup_chroma_collection(client)
+        index_data_if_needed(client, data, embedder)
+        return (lambda q: search_similar_documents(client, q, embedder)), id_to_doc_map
+    search = MemorySearch(data, embedder)
+    return search, search.docs
+
+
+# ========== 共享状态探针 ==========
+class ConcurrencyProbe:
+    """包装共享对象的方法，统计同时在其中执行的线程数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = Counter()
+        self.max_inflight = Counter()
+
+    def wrap(self, name, func):
+        def wrapper(*args, **kwargs):
+            with self.lock:
+                self.inflight[name] += 1
+                self.max_inflight[name] = max(self.max_inflight[name], self.inflight[name])
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.inflight[name] -= 1
+        return wrapper
+
+
+def _fingerprint(obj):
+    return hashlib.md5(repr(obj).encode('utf-8')).hexdigest()
+
+
+class SharedStateMonitor:
+    """周期性采样内存和共享状态指纹；指纹在服务期间变化即记为共享状态被修改"""
+
+    def __init__(self, probes, interval=1.0):
+        self.probes = probes  # {name: getter}
+        self.interval = interval
+        self.baseline = {name: _fingerprint(get()) for name, get in probes.items()}
+        self.mutations = []
+        self.memory = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.start_time = time.time()
+
+    def _rss_mb(self):
+        try:
+            import psutil
+            return psutil.Process().memory_info().rss / 1024 ** 2
+        except ImportError:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+
+    def sample(self):
+        elapsed = time.time() - self.start_time
+        self.memory.append((round(elapsed, 2), round(self._rss_mb(), 1)))
+        for name, get in self.probes.items():
+            try:
+                fingerprint = _fingerprint(get())
+            except RuntimeError as e:  # 例如 "dictionary changed size during iteration"
+                self.mutations.append((round(elapsed, 2), name, f"采样时并发修改: {e}"))
+                continue
+            if fingerprint != self.baseline[name]:
+                self.mutations.append((round(elapsed, 2), name, "指纹变化"))
+                self.baseline[name] = fingerprint
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+# ========== 会话模拟 ==========
+def build_query_mix(data, size=200, colloquial_ratio=0.3, seed=42):
+    rng = random.Random(seed)
+    titles = sorted({(doc.get('title') or '').strip() for doc in data} - {''})
+    mix = []
+    for _ in range(size):
+        if not titles or rng.random() < colloquial_ratio:
+            mix.append(rng.choice(COLLOQUIAL_QUERIES))
+        else:
+            mix.append(rng.choice(QUERY_TEMPLATES).format(title=rng.choice(titles)))
+    return mix
+
+
+class LoadTest:
+    def __init__(self, rewrite, search, generate, doc_map, queries, think_time=1.0, seed=0):
+        self.rewrite = rewrite
+        self.search = search
+        self.generate = generate
+        self.doc_map = doc_map
+        self.queries = queries
+        self.think_time = think_time
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.error_samples = []
+        self.completed = 0
+        # 确定性阶段：相同输入在不同会话的输出应一致
+        self.first_results = {}
+        self.inconsistent = Counter()
+
+    def _check_consistent(self, stage, key, value):
+        with self.lock:
+            previous = self.first_results.setdefault((stage, key), value)
+            if previous != value:
+                self.inconsistent[stage] += 1
+
+    def _session(self, session_id, deadline, stop):
+        rng = random.Random(self.seed * 1000 + session_id)
+        while time.time() < deadline and not stop.is_set():
+            if self.think_time > 0:
+                time.sleep(min(rng.expovariate(1.0 / self.think_time), max(deadline - time.time(), 0)))
+                if time.time() >= deadline:
+                    break
+            query = rng.choice(self.queries)
+            stage = 'rewrite'
+            timings = {}
+            try:
+                start = time.perf_counter()
+                processed = self.rewrite(query)
+                timings['rewrite'] = time.perf_counter() - start
+                self._check_consistent('rewrite', query, processed)
+
+                stage = 'search'
+                start = time.perf_counter()
+                ids, scores = self.search(processed)
+                timings['search'] = time.perf_counter() - start
+                self._check_consistent('search', processed, tuple(ids))
+
+                stage = 'generate'
+                docs = [self.doc_map[i] for i in ids if i in self.doc_map]
+                start = time.perf_counter()
+                first_token = None
+                chars = 0
+                for token in self.generate(processed, docs):
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    chars += len(token)
+                timings['generate'] = time.perf_counter() - start
+                timings['first_token'] = first_token if first_token is not None else timings['generate']
+                timings['total'] = sum(timings[s] for s in ('rewrite', 'search', 'generate'))
+            except Exception as e:
+                with self.lock:
+                    self.errors[f"{stage}:{e.__class__.__name__}"] += 1
+                    if len(self.error_samples) < 5:
+                        self.error_samples.append(traceback.format_exc(limit=3))
+                continue
+            with self.lock:
+                for name, value in timings.items():
+                    self.latencies[name].append(value)
+                self.completed += 1
+
+    def run(self, users, duration):
+        stop = threading.Event()
+        deadline = time.time() + duration
+        threads = [threading.Thread(target=self._session, args=(i, deadline, stop), daemon=True)
+                   for i in range(users)]
+        start = time.time()
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                t.join()
+        except KeyboardInterrupt:
+            stop.set()
+            for t in threads:
+                t.join()
+        return time.time() - start
+
+
+def _percentiles(values):
+    if not values:
+        return {'p50': None, 'p99': None, 'max': None}
+    arr = np.asarray(values) * 1000
+    return {'p50': round(float(np.percentile(arr, 50)), 1), 'p99': round(float(np.percentile(arr, 99)), 1),
+            'max': round(float(arr.max()), 1)}
+
+
+def build_report(test, monitor, probe, elapsed, users):
+    attempts = test.completed + sum(test.errors.values())
+    races = []
+    for name, count in probe.max_inflight.items():
+        if count > 1:
+            races.append(f"{name} 被 {count} 个会话同时进入（共享对象无锁，存在潜在竞争）")
+    for when, name, what in monitor.mutations:
+        races.append(f"{when}s: 共享状态 {name} 在服务期间被修改（{what}）")
+    for stage, count in test.inconsistent.items():
+        races.append(f"{stage} 阶段有 {count} 次相同输入得到不同结果")
+    return {
+        'users': users,
+        'seconds': round(elapsed, 1),
+        'completed': test.completed,
+        'throughput_per_sec': round(test.completed / elapsed, 3) if elapsed else 0.0,
+        'error_rate': round(sum(test.errors.values()) / attempts, 4) if attempts else 0.0,
+        'errors': dict(test.errors),
+        'latency_ms': {stage: _percentiles(values) for stage, values in test.latencies.items()},
+        'memory_mb': monitor.memory,
+        'max_concurrency': dict(probe.max_inflight),
+        'race_flags': races,
+        'error_samples': test.error_samples,
+    }
+
+
+def print_report(report):
+    print("\n" + "=" * 60)
+    print(f"并发会话: {report['users']}，时长 {report['seconds']} 秒，完成 {report['completed']} 轮")
+    print(f"吞吐: {report['throughput_per_sec']} 轮/秒，错误率: {report['error_rate']:.2%} {report['errors'] or ''}")
+    print(f"{'阶段':<12}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for stage in ('rewrite', 'search', 'first_token', 'generate', 'total'):
+        if stage in report['latency_ms']:
+            p = report['latency_ms'][stage]
+            print(f"{stage:<12}{p['p50']:>10}{p['p99']:>10}{p['max']:>10}")
+    memory = [mb for _, mb in report['memory_mb']]
+    if memory:
+        print(f"内存(RSS): 起始 {memory[0]} MB，峰值 {max(memory)} MB，结束 {memory[-1]} MB")
+    if report['race_flags']:
+        print("⚠️ 共享状态风险:")
+        for flag in report['race_flags']:
+            print(f"   - {flag}")
+    else:
+        print("✅ 未发现共享状态竞争")
+    for sample in report['error_samples']:
+        print(sample)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG服务多用户并发压测")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=60.0, help="压测时长（秒）")
+    parser.add_argument("--think-time", type=float, default=2.0, help="两轮之间的平均思考时间（秒）")
+    parser.add_argument("--backend", choices=['tiny', 'real'], default='tiny')
+    parser.add_argument("--search", choices=['memory', 'bundle', 'chroma'], default='memory')
+    parser.add_argument("--colloquial-ratio", type=float, default=0.3)
+    parser.add_argument("--no-kg", action="store_true", help="不使用知识图谱扩展，全部走LLM改写")
+    parser.add_argument("--step-delay", type=float, default=0.005, help="tiny 模型每个解码步的模拟耗时")
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--output", default=None, help="JSON报告路径")
+    args = parser.parse_args()
+
+    from rag_core import preprocess_query, generate_answer_stream
+    from kg_query_expansion import load_query_expander
+
+    data = load_data(DATA_FILE)
+    if args.backend == 'tiny':
+        embedder = TinyEmbedder()
+        gen_model, tokenizer = build_tiny_generator(args.step_delay)
+    else:
+        embedder, gen_model, tokenizer = load_real_models()
+    expander = None if args.no_kg else load_query_expander(KG_GRAPH_FILE, KG_ANALYSIS_FILE)
+    search, doc_map = build_search(args.search, data, embedder)
+
+    # 在共享对象上挂探针：统计并发进入数
+    probe = ConcurrencyProbe()
+    gen_model.forward = probe.wrap('generation_model.forward', gen_model.forward)
+    embedder.encode = probe.wrap('embedding_model.encode', embedder.encode)
+    search = probe.wrap('search', search)
+
+    monitor = SharedStateMonitor({
+        'id_to_doc_map': lambda: sorted(id_to_doc_map.items()),
+        'doc_map': lambda: len(doc_map),
+        'generation_model.training': lambda: gen_model.training,
+        'generation_config': lambda: sorted(vars(gen_model.generation_config).items())
+        if hasattr(gen_model, 'generation_config') else None,
+    }, args.sample_interval)
+
+    test = LoadTest(
+        rewrite=lambda q: preprocess_query(q, gen_model, tokenizer, expander),
+        search=search,
+        generate=lambda q, docs: generate_answer_stream(q, docs, gen_model, tokenizer),
+        doc_map=doc_map,
+        queries=build_query_mix(data, colloquial_ratio=args.colloquial_ratio),
+        think_time=args.think_time,
+    )
+    print(f"开始压测：{args.users} 个并发会话，{args.duration} 秒，backend={args.backend}，search={args.search}")
+    monitor.start()
+    elapsed = test.run(args.users, args.duration)
+    monitor.stop()
+
+    report = build_report(test, monitor, probe, elapsed, args.users)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 报告已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
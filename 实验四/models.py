@@ -5,10 +5,16 @@ from sentence_transformers import SentenceTransformer
 from transformers import AutoTokenizer, AutoModelForCausalLM
 import torch
 
+# multi_worker.py 在启动工作进程前预加载的模型 {model_name: model 或 (model, tokenizer)}；
+# 子进程直接复用其只读权重页，不再各自加载一份
+PRELOADED_MODELS = {}
+
 
 @st.cache_resource
 def load_embedding_model(model_name):
     """加载嵌入模型"""
+    if model_name in PRELOADED_MODELS:
+        return PRELOADED_MODELS[model_name]
     st.write(f"正在加载嵌入模型: {model_name}...")
     try:
         model = SentenceTransformer(model_name)
@@ -22,6 +28,8 @@ def load_embedding_model(model_name):
 @st.cache_resource
 def load_generation_model(model_name, hf_token=None):
     """加载生成模型，支持HF Token避免限流"""
+    if model_name in PRELOADED_MODELS:
+        return PRELOADED_MODELS[model_name]
     st.write(f"正在加载生成模型: {model_name}...")
 
     # 调试信息
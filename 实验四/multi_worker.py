@@ -0,0 +1,265 @@
+# multi_worker.py - 多工作进程共享只读模型权重
+# ======================================
+# 每个 Streamlit/API 工作进程各自调用 load_generation_model / load_embedding_model，
+# 各持有一份 float32 的 Qwen2.5-0.5B 和 MiniLM，节点内存成为并发上限。这里提供两种共享方式：
+# 1. fork（默认，仅CPU）：父进程加载一次模型并 gc.freeze()，再 fork 出工作进程；
+#    张量存储是独立的内存块，不会被引用计数写入，物理页按写时复制在进程间共享
+# 2. mmap：首次运行把权重导出到 shared_weights/*.pt，之后每个进程用 torch.load(mmap=True) +
+#    load_state_dict(assign=True) 让参数直接由文件页缓存支撑，进程各自启动也只占一份物理内存
+# 工作进程可以是 Streamlit（复用 models.PRELOADED_MODELS）或轻量JSON API；
+# 父进程定期从 /proc/<pid>/smaps_rollup 统计每个进程的 RSS / PSS / USS（私有内存）
+import argparse
+import gc
+import json
+import os
+import re
+import signal
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+
+from config import (
+    EMBEDDING_MODEL_NAME, GENERATION_MODEL_NAME, INDEX_BUNDLE_ROOT, KG_GRAPH_FILE, KG_ANALYSIS_FILE, TOP_K
+)
+
+SHARED_WEIGHTS_DIR = "./shared_weights"
+BASE_PORT = 8501
+
+
+# ========== 内存统计 ==========
+def process_memory(pid):
+    """返回 {'rss', 'pss', 'uss', 'shared'}（MB）；USS 即该进程独占、增加一个进程时真正多出的内存"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[0].endswith(':'):
+                fields[parts[0][:-1]] = int(parts[1]) / 1024
+    return {
+        'rss': round(fields.get('Rss', 0.0), 1),
+        'pss': round(fields.get('Pss', 0.0), 1),
+        'uss': round(fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0), 1),
+        'shared': round(fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0), 1),
+    }
+
+
+def memory_report(pids):
+    rows = {}
+    for name, pid in pids.items():
+        try:
+            rows[name] = process_memory(pid)
+        except OSError:
+            rows[name] = None
+    print(f"\n{'进程':<12}{'RSS(MB)':>10}{'PSS(MB)':>10}{'USS(MB)':>10}{'共享(MB)':>10}")
+    for name, mem in rows.items():
+        if mem is None:
+            print(f"{name:<12}{'已退出':>10}")
+        else:
+            print(f"{name:<12}{mem['rss']:>10}{mem['pss']:>10}{mem['uss']:>10}{mem['shared']:>10}")
+    live = [m for m in rows.values() if m]
+    if live:
+        print(f"合计 PSS（实际占用的物理内存）: {sum(m['pss'] for m in live):.1f} MB")
+    return rows
+
+
+# ========== 模型加载 ==========
+def _weights_path(model_name, kind):
+    return os.path.join(SHARED_WEIGHTS_DIR, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)}.{kind}.pt")
+
+
+def _freeze(module):
+    module.eval()
+    for param in module.parameters():
+        param.requires_grad_(False)
+    return module
+
+
+def _load_mmap_state(module, path):
+    """参数改为由只读文件映射支撑（torch >= 2.1）；文件不存在时先导出"""
+    import torch
+    if not os.path.exists(path):
+        os.makedirs(SHARED_WEIGHTS_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.save({k: v.detach().cpu().contiguous() for k, v in module.state_dict().items()}, tmp_path)
+        os.replace(tmp_path, path)
+        print(f"💾 已导出共享权重: {path}")
+    state = torch.load(path, mmap=True, weights_only=True, map_location='cpu')
+    module.load_state_dict(state, assign=True)
+    return module
+
+
+def load_shared_models(mode, embedding_name=EMBEDDING_MODEL_NAME, generation_name=GENERATION_MODEL_NAME):
+    """在当前进程加载只读模型：fork 模式直接加载，mmap 模式让参数映射到共享权重文件"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from transformers import AutoConfig, AutoTokenizer, AutoModelForCausalLM
+
+    hf_token = os.getenv("HF_TOKEN")
+    tokenizer = AutoTokenizer.from_pretrained(generation_name, trust_remote_code=True, token=hf_token)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    embedder = SentenceTransformer(embedding_name, device='cpu')
+    gen_path = _weights_path(generation_name, 'generation')
+    if mode == 'mmap' and os.path.exists(gen_path):
+        # 权重已导出：在 meta 设备上建骨架，避免先分配一份私有的 float32 权重
+        from accelerate import init_empty_weights
+        config = AutoConfig.from_pretrained(generation_name, trust_remote_code=True, token=hf_token)
+        with init_empty_weights():
+            gen_model = AutoModelForCausalLM.from_config(config, trust_remote_code=True)
+        _load_mmap_state(gen_model, gen_path)
+        gen_model.tie_weights()
+    else:
+        gen_model = AutoModelForCausalLM.from_pretrained(
+            generation_name, trust_remote_code=True, torch_dtype=torch.float32, token=hf_token)
+        if mode == 'mmap':
+            _load_mmap_state(gen_model, gen_path)
+    if mode == 'mmap':
+        _load_mmap_state(embedder, _weights_path(embedding_name, 'embedding'))
+    gc.collect()
+    return _freeze(embedder), _freeze(gen_model), tokenizer
+
+
+def register_preloaded(embedder, gen_model, tokenizer):
+    """让 models.load_* 直接返回已加载的模型（Streamlit 工作进程使用）"""
+    import models
+    models.PRELOADED_MODELS[EMBEDDING_MODEL_NAME] = embedder
+    models.PRELOADED_MODELS[GENERATION_MODEL_NAME] = (gen_model, tokenizer)
+
+
+# ========== 工作进程 ==========
+def _make_handler(pipeline):
+    class QueryHandler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send(200, {'pid': os.getpid(), 'memory_mb': process_memory(os.getpid())})
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/query':
+                self._send(404, {'error': 'not found'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                query = json.loads(self.rfile.read(length) or b'{}').get('query', '').strip()
+                if not query:
+                    self._send(400, {'error': '缺少 query'})
+                    return
+                self._send(200, pipeline(query))
+            except Exception as e:
+                self._send(500, {'error': f"{e.__class__.__name__}: {e}"})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return QueryHandler
+
+
+def _build_pipeline(embedder, gen_model, tokenizer):
+    from index_bundle import load_current_bundle
+    from kg_query_expansion import load_query_expander
+    from rag_core import preprocess_query, generate_answer_stream
+
+    bundle = load_current_bundle(INDEX_BUNDLE_ROOT)
+    if bundle is None:
+        raise RuntimeError("API 工作进程需要离线索引包，请先运行 python index_bundle.py build")
+    expander = load_query_expander(KG_GRAPH_FILE, KG_ANALYSIS_FILE)
+
+    def pipeline(query):
+        start = time.time()
+        processed = preprocess_query(query, gen_model, tokenizer, expander)
+        ids, scores = bundle.search_query(processed, embedder, TOP_K)
+        docs = [bundle.docs[i] for i in ids if i in bundle.docs]
+        answer = "".join(generate_answer_stream(processed, docs, gen_model, tokenizer))
+        return {'query': query, 'processed': processed, 'doc_ids': ids, 'scores': scores,
+                'answer': answer, 'seconds': round(time.time() - start, 3), 'pid': os.getpid()}
+
+    return pipeline
+
+
+def _worker_main(server, port, mode, preloaded, threads):
+    import torch
+    # fork 继承的线程池状态不可用，子进程重新设置计算线程数
+    torch.set_num_threads(threads)
+    embedder, gen_model, tokenizer = preloaded if preloaded else load_shared_models(mode)
+    if server == 'streamlit':
+        register_preloaded(embedder, gen_model, tokenizer)
+        from streamlit.web import bootstrap
+        # 与 `streamlit run` 相同：先把命令行形式的选项载入配置，bootstrap.run 本身不会应用端口等设置
+        flag_options = {"server_port": port, "server_headless": True}
+        bootstrap.load_config_options(flag_options=flag_options)
+        bootstrap.run("app.py", f"streamlit run app.py --server.port {port}", [], flag_options)
+    else:
+        pipeline = _build_pipeline(embedder, gen_model, tokenizer)
+        print(f"✅ 工作进程 {os.getpid()} 监听端口 {port}")
+        ThreadingHTTPServer(("0.0.0.0", port), _make_handler(pipeline)).serve_forever()
+
+
+def launch(workers, mode='fork', server='api', base_port=BASE_PORT, report_interval=30.0, threads=None):
+    import torch
+    if mode == 'fork' and torch.cuda.is_available():
+        print("⚠️ CUDA 上下文无法跨 fork 共享，改用 mmap 模式")
+        mode = 'mmap'
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+
+    preloaded = None
+    if mode == 'fork':
+        print("父进程加载模型（工作进程按写时复制共享）...")
+        preloaded = load_shared_models('fork')
+        # 冻结现有对象，GC 不再扫描、改写它们所在的页；父进程在 fork 前不做推理，避免 OpenMP 线程池状态被继承
+        gc.freeze()
+        ctx = get_context('fork')
+    else:
+        # mmap 模式先在父进程导出一次共享权重文件，工作进程各自映射同一文件
+        load_shared_models('mmap')
+        gc.collect()
+        ctx = get_context('spawn')
+        preloaded = None
+
+    processes = {}
+    for i in range(workers):
+        port = base_port + i
+        proc = ctx.Process(target=_worker_main, args=(server, port, mode, preloaded, threads),
+                           name=f"worker-{i}", daemon=False)
+        proc.start()
+        processes[f"worker-{i}"] = proc
+        print(f"🚀 启动 {server} 工作进程 {i}（pid {proc.pid}，端口 {port}，模式 {mode}）")
+
+    def _shutdown(signum, frame):
+        for proc in processes.values():
+            proc.terminate()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+    pids = {'parent': os.getpid(), **{name: proc.pid for name, proc in processes.items()}}
+    while any(proc.is_alive() for proc in processes.values()):
+        time.sleep(report_interval)
+        memory_report(pids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多工作进程共享只读模型权重")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--mode", choices=['fork', 'mmap'], default='fork')
+    parser.add_argument("--server", choices=['api', 'streamlit'], default='api')
+    parser.add_argument("--base-port", type=int, default=BASE_PORT)
+    parser.add_argument("--threads", type=int, default=None, help="每个工作进程的torch计算线程数")
+    parser.add_argument("--report-interval", type=float, default=30.0, help="内存统计间隔（秒）")
+    args = parser.parse_args()
+
+    launch(args.workers, args.mode, args.server, args.base_port, args.report_interval, args.threads)
+
+
+if __name__ == "__main__":
+    main()
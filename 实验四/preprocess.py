@@ -1,6 +1,17 @@
 import os
 import json
 import re
+import zlib
+from itertools import islice
+from multiprocessing import Pool
+
+import numpy as np
+
+from config import EXTRACTED_PAGES_FILE
+
+# MinHash 使用的梅森素数与随机种子（固定种子保证多次运行结果一致）
+_MINHASH_PRIME = (1 << 31) - 1
+_MINHASH_SEED = 42
 
 
 def split_text(text, chunk_size=500, chunk_overlap=50):
@@ -31,6 +42,143 @@ def split_text(text, chunk_size=500, chunk_overlap=50):
     return [c.strip() for c in chunks if c.strip()]
 
 
+def _shingles(text, shingle_size=5):
+    """将文本切分为字符级shingle集合（中文无空格，按字符切分更稳定）。"""
+    text = re.sub(r'\s+', ' ', text or '').strip().lower()
+    if len(text) <= shingle_size:
+        return {text} if text else set()
+    return {text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1)}
+
+
+def _minhash_params(num_perm):
+    """生成 num_perm 组 (a, b) 哈希参数，子进程用同一种子可重建。"""
+    rng = np.random.RandomState(_MINHASH_SEED)
+    a = rng.randint(1, _MINHASH_PRIME, size=num_perm).astype(np.uint64)
+    b = rng.randint(0, _MINHASH_PRIME, size=num_perm).astype(np.uint64)
+    return a, b
+
+
+def minhash_signature(text, shingle_size=5, num_perm=128, params=None):
+    """计算文本的MinHash签名，返回 uint32 数组；空文本返回 None。"""
+    shingles = _shingles(text, shingle_size)
+    if not shingles:
+        return None
+
+    a, b = params if params is not None else _minhash_params(num_perm)
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode('utf-8')) for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+    # (a*h + b) mod p，a<2^31、h<2^32，乘积不会溢出 uint64
+    permuted = (np.outer(hashes, a) + b) % np.uint64(_MINHASH_PRIME)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def _optimal_bands(num_perm, threshold):
+    """选择 (bands, rows)，使 LSH 的 S 曲线拐点 (1/b)^(1/r) 最接近阈值。"""
+    best = (num_perm, 1)
+    best_gap = float('inf')
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        gap = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if gap < best_gap:
+            best, best_gap = (bands, rows), gap
+    return best
+
+
+_worker_state = {}
+
+
+def _init_signature_worker(shingle_size, num_perm):
+    """子进程初始化：哈希参数每个进程只生成一次。"""
+    _worker_state['shingle_size'] = shingle_size
+    _worker_state['num_perm'] = num_perm
+    _worker_state['params'] = _minhash_params(num_perm)
+
+
+def _signature_worker(text):
+    return minhash_signature(
+        text,
+        shingle_size=_worker_state['shingle_size'],
+        num_perm=_worker_state['num_perm'],
+        params=_worker_state['params']
+    )
+
+
+def _dedup_text(entry):
+    """用于去重比较的文本：标题 + 正文块。"""
+    return f"{entry.get('title', '') or ''}\n{entry.get('abstract', '') or ''}"
+
+
+def deduplicate_chunks(entries, shingle_size=5, threshold=0.8, num_perm=128, workers=None, batch_size=4096):
+    """
+    基于 MinHash + LSH 的近重复文本块去重
+    - entries 可以是任意可迭代对象（列表或生成器），按批读取并在进程池中并行计算签名
+    - 每个近重复簇只保留最先出现的块作为规范块
+    - 被去除块的 id 记录在规范块的 duplicate_ids 字段中，便于溯源
+    返回 (保留的条目列表, 统计信息字典)
+    """
+    bands, rows = _optimal_bands(num_perm, threshold)
+    buckets = [{} for _ in range(bands)]
+    kept = []
+    kept_signatures = []
+    stats = {'input': 0, 'kept': 0, 'removed': 0, 'input_chars': 0, 'kept_chars': 0}
+
+    def _assign_to_cluster(entry, signature):
+        text_len = len(entry.get('abstract', '') or '')
+        stats['input'] += 1
+        stats['input_chars'] += text_len
+
+        canonical = None
+        band_keys = []
+        if signature is not None:
+            for band in range(bands):
+                key = signature[band * rows:(band + 1) * rows].tobytes()
+                band_keys.append(key)
+                if canonical is None:
+                    candidate = buckets[band].get(key)
+                    # LSH 只给出候选，再用签名估计的 Jaccard 相似度确认
+                    if candidate is not None and \
+                            np.mean(kept_signatures[candidate] == signature) >= threshold:
+                        canonical = candidate
+
+        if canonical is not None:
+            kept[canonical].setdefault('duplicate_ids', []).append(entry['id'])
+            stats['removed'] += 1
+            return
+
+        index = len(kept)
+        kept.append(entry)
+        kept_signatures.append(signature)
+        stats['kept'] += 1
+        stats['kept_chars'] += text_len
+        for band, key in enumerate(band_keys):
+            buckets[band].setdefault(key, index)
+
+    entry_iter = iter(entries)
+    position = 0
+
+    with Pool(processes=workers, initializer=_init_signature_worker,
+              initargs=(shingle_size, num_perm)) as pool:
+        while True:
+            # 按批读取，签名计算的内存占用与输入总量无关
+            batch = list(islice(entry_iter, batch_size))
+            if not batch:
+                break
+            for entry in batch:
+                entry.setdefault('id', f"{entry.get('source', 'doc')}_{position}")
+                position += 1
+            signatures = pool.map(_signature_worker, [_dedup_text(e) for e in batch], chunksize=64)
+
+            for entry, signature in zip(batch, signatures):
+                _assign_to_cluster(entry, signature)
+
+    stats['reduction'] = stats['removed'] / stats['input'] if stats['input'] else 0.0
+    return kept, stats
+
+
 def load_local_jsonl_data(filepath, max_articles=300):
     """直接加载本地JSONL文件"""
     if not os.path.exists(filepath):
@@ -68,13 +216,62 @@ def load_local_jsonl_data(filepath, max_articles=300):
     return articles
 
 
+def load_extracted_pages(filepath, chunk_size=512, chunk_overlap=50):
+    """
+    加载 实验三/pdf_extraction.py 输出的逐页JSONL（同一文件的页面连续且按页码排列），
+    按文件合并页面后分块，生成与TXT文件相同结构的条目
+    """
+    if not os.path.exists(filepath):
+        print(f"⚠️ 未找到PDF抽取结果 {os.path.abspath(filepath)}，跳过（先运行 实验三/pdf_extraction.py，"
+              f"或用环境变量 EXTRACTED_PAGES_FILE 指定路径）")
+        return []
+
+    print(f"📄 正在加载PDF抽取结果: {filepath}")
+    entries = []
+
+    def flush(filename, pages):
+        if not filename:
+            return
+        main_text = '\n\n'.join(p for p in pages if p).strip()
+        title = os.path.splitext(filename)[0]
+        for i, chunk in enumerate(split_text(main_text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)):
+            entries.append({
+                "id": f"{filename}_{i}",
+                "title": title,
+                "abstract": chunk,
+                "source_file": filename,
+                "chunk_index": i
+            })
+
+    current_file, pages = None, []
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record['file'] != current_file:
+                flush(current_file, pages)
+                current_file, pages = record['file'], []
+            pages.append('\n'.join([record['text']] + record.get('tables', [])))
+    flush(current_file, pages)
+
+    print(f"✅ 从PDF抽取结果生成 {len(entries)} 个文本块")
+    return entries
+
+
 def main():
     # --- 配置 ---
     txt_directory = './data/'
     jsonl_filepath = './data/Open-Patients.jsonl'  # 你的文件名
+    extracted_pages_path = EXTRACTED_PAGES_FILE  # 实验三/pdf_extraction.py 的输出（可选）
     output_json_path = './data/processed_data.json'
     CHUNK_SIZE = 512
     CHUNK_OVERLAP = 50
+    DEDUP_ENABLED = True
+    DEDUP_SHINGLE_SIZE = 5  # 字符级shingle长度
+    DEDUP_THRESHOLD = 0.8  # Jaccard相似度阈值
+    DEDUP_NUM_PERM = 128  # MinHash排列数
+    DEDUP_WORKERS = None  # None表示使用全部CPU核
 
     print(f"开始处理目录 '{txt_directory}' 中的文件...")
     os.makedirs(os.path.dirname(output_json_path), exist_ok=True)
@@ -118,6 +315,11 @@ def main():
         except Exception as e:
             print(f"    处理文件 {filename} 时出错: {e}")
 
+    # --- 加载PDF抽取结果 ---
+    pdf_entries = load_extracted_pages(extracted_pages_path, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    all_data.extend(pdf_entries)
+    chunk_count += len(pdf_entries)
+
     # --- 加载JSONL数据 ---
     print("\n加载JSONL数据...")
     pubmed_articles = load_local_jsonl_data(jsonl_filepath)
@@ -125,6 +327,22 @@ def main():
     if pubmed_articles:
         all_data.extend(pubmed_articles)
 
+    # --- 近重复文本块去重 ---
+    if DEDUP_ENABLED and all_data:
+        print(f"\n正在进行MinHash/LSH近重复去重（shingle={DEDUP_SHINGLE_SIZE}, 阈值={DEDUP_THRESHOLD}）...")
+        all_data, dedup_stats = deduplicate_chunks(
+            all_data,
+            shingle_size=DEDUP_SHINGLE_SIZE,
+            threshold=DEDUP_THRESHOLD,
+            num_perm=DEDUP_NUM_PERM,
+            workers=DEDUP_WORKERS
+        )
+        char_reduction = 1 - dedup_stats['kept_chars'] / dedup_stats['input_chars'] \
+            if dedup_stats['input_chars'] else 0.0
+        print(f"✅ 去重完成：{dedup_stats['input']} → {dedup_stats['kept']} 条，"
+              f"移除 {dedup_stats['removed']} 条近重复块")
+        print(f"   索引条目减少 {dedup_stats['reduction']:.1%}，文本量减少 {char_reduction:.1%}")
+
     # --- 保存为 JSON ---
     total_count = len(all_data)
     print(f"\n处理完成。共处理 {file_count} 个文件，生成 {chunk_count} 个文本块，"
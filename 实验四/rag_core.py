@@ -3,7 +3,7 @@ import torch
 import time
 import re
 from config import MAX_NEW_TOKENS_GEN, TEMPERATURE, TOP_P, REPETITION_PENALTY, QUERY_PREPROCESSING_MAX_TOKENS, \
-    QUERY_PREPROCESSING_TEMPERATURE
+    QUERY_PREPROCESSING_TEMPERATURE, KG_EXPANSION_NEIGHBORS
 
 
 def extract_medical_keywords(processed_query):
@@ -40,16 +40,24 @@ def extract_medical_keywords(processed_query):
     return keywords[:6]  # 最多返回6个关键词
 
 
-def preprocess_query(user_input, gen_model, tokenizer):
+def preprocess_query(user_input, gen_model, tokenizer, expander=None):
     """
     增强版查询预处理：带强制信息保留和多层验证
 
     核心改进：
+    0. 优先用知识图谱实体索引扩展查询（微秒级），只有未命中任何实体时才调用LLM改写
     1. Prompt明确禁止生成通用建议
     2. 强制保留原始关键信息
     3. 4层输出验证（关键词保留、长度、语义、黑名单）
     4. 模型失败时立即回退到可靠的规则处理
     """
+    if expander:
+        start = time.perf_counter()
+        expansion = expander.expand(user_input, KG_EXPANSION_NEIGHBORS)
+        if expansion:
+            print(f"✅ 图谱扩展成功（{(time.perf_counter() - start) * 1e6:.0f} μs）：{user_input} → {expansion['query']}")
+            return expansion['query']
+
     if not gen_model or not tokenizer:
         return rule_based_preprocess(user_input)  # 直接回退
 
@@ -278,8 +286,11 @@ def has_medical_terms(text):
     return False
 
 
-def generate_answer_stream(query, context_docs, gen_model, tokenizer):
-
+def generate_answer_stream(query, context_docs, gen_model, tokenizer, cancel_token=None):
+    """
+    逐token流式生成答案；cancel_token（streaming.CancellationToken）在每个解码步之间检查，
+    取消后立即停止，释放模型给其他会话
+    """
     if not context_docs:
         yield "⚠️ 未找到相关文献来回答您的问题。"
         return
@@ -329,6 +340,10 @@ def generate_answer_stream(query, context_docs, gen_model, tokenizer):
         min_length = 50  # 最少生成50个token
 
         for step in range(MAX_NEW_TOKENS_GEN):
+            if cancel_token is not None and cancel_token.cancelled:
+                print(f"⏹ 生成已取消（{cancel_token.reason}），已生成 {step} 个token")
+                break
+
             with torch.no_grad():
                 if past_key_values is None:
                     outputs = gen_model(current_tokens, use_cache=True)
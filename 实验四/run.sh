@@ -1 +1,3 @@
-export HF_ENDPOINT=https://hf-mirror.com
\ No newline at end of file
+export HF_ENDPOINT=https://hf-mirror.com
+# 没有索引包时先离线构建，应用启动后直接加载
+[ -f "${INDEX_BUNDLE_ROOT:-./index_bundles}/CURRENT" ] || python index_bundle.py build
@@ -0,0 +1,104 @@
+# streaming.py - 答案流式渲染与生成取消
+# ======================================
+# app.py 第四步每生成一个token就调用一次 answer_container.markdown(full_answer + cursor)，
+# 整段答案反复重渲染、反复经websocket发送（O(n²)）；用户点"新问题"或离开页面后，生成仍占用共享模型。这里：
+# 1. CoalescingRenderer：按时间或字符预算合并token，再整体刷新一次
+# 2. CancellationToken：generate_answer_stream 在每个解码步之间检查，取消后立即停止并释放KV缓存
+# 3. stream_in_background：生成放到工作线程，脚本线程只取token、刷新界面。
+#    Streamlit 每个会话只有一个脚本线程，重跑/断开时它在下一次 st 调用处抛出 StopException/RerunException；
+#    生成若也在脚本线程里，取消标记永远来不及被看到。放到工作线程后，脚本线程被中断时在 finally 中置位，
+#    工作线程在下一个解码步就会退出
+import queue
+import threading
+import time
+
+from config import STREAM_FLUSH_INTERVAL, STREAM_FLUSH_CHARS
+
+CURSOR = '<span class="streaming-cursor">▌</span>'
+
+
+class CancellationToken:
+    """线程安全的取消标记：由消费token的脚本线程在退出（正常结束、出错或被Streamlit中断）时置位"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+class CoalescingRenderer:
+    """累积token，距上次刷新超过 interval 秒或新增字符数超过 max_chars 时才重渲染容器"""
+
+    def __init__(self, container, interval=STREAM_FLUSH_INTERVAL, max_chars=STREAM_FLUSH_CHARS, cursor=CURSOR):
+        self.container = container
+        self.interval = interval
+        self.max_chars = max_chars
+        self.cursor = cursor
+        self.parts = []
+        self.pending_chars = 0
+        self.last_flush = time.monotonic()
+        self.flushes = 0
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def push(self, token):
+        if not token:
+            return
+        self.parts.append(token)
+        self.pending_chars += len(token)
+        if self.pending_chars >= self.max_chars or time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self, final=False):
+        if final:
+            self.container.markdown(self.text)
+        else:
+            self.container.markdown(self.text + self.cursor, unsafe_allow_html=True)
+        self.pending_chars = 0
+        self.last_flush = time.monotonic()
+        self.flushes += 1
+
+    def close(self):
+        self.flush(final=True)
+        return self.text
+
+
+_DONE = object()
+
+
+def stream_in_background(stream_factory, cancel_token):
+    """
+    在守护线程中运行 stream_factory() 返回的生成器，当前线程逐个取出token
+    生成器抛出的异常在当前线程重新抛出；调用方须在退出时 cancel_token.cancel()，工作线程随后停止
+    """
+    tokens = queue.Queue()
+
+    def worker():
+        try:
+            for token in stream_factory():
+                if cancel_token.cancelled:
+                    break
+                tokens.put(token)
+        except Exception as e:
+            tokens.put(e)
+        finally:
+            tokens.put(_DONE)
+
+    threading.Thread(target=worker, name="answer-generation", daemon=True).start()
+    while True:
+        item = tokens.get()
+        if item is _DONE:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
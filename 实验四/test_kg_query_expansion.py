@@ -0,0 +1,38 @@
+# test_kg_query_expansion.py - 知识图谱查询扩展的回归测试
+# ======================================
+# 运行：cd 实验四 && python -m pytest -q test_kg_query_expansion.py
+import os
+
+import pytest
+
+from kg_query_expansion import load_query_expander
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GRAPH_FILE = os.path.join(HERE, "data", "focused_knowledge_graph.json")
+ANALYSIS_FILE = os.path.join(HERE, "data", "medical_network_analysis.json")
+
+
+@pytest.fixture(scope="module")
+def expander():
+    if not os.path.exists(GRAPH_FILE):
+        pytest.skip(f"缺少知识图谱文件 {GRAPH_FILE}")
+    return load_query_expander(GRAPH_FILE, ANALYSIS_FILE)
+
+
+@pytest.mark.parametrize("user_input, kept", [
+    ("painful knee after surgery", ["knee", "painful"]),
+    ("65岁老人血压高，头晕怎么办", ["65岁老人", "血压高"]),
+])
+def test_matched_query_keeps_unmatched_words(expander, user_input, kept):
+    expansion = expander.expand(user_input)
+    assert expansion is not None
+    for word in kept:
+        assert word in expansion['query']
+    # 扩展词追加在原文之后
+    assert expansion['query'].startswith(user_input)
+    for name in expansion['matched'] + expansion['related']:
+        assert name in expansion['query']
+
+
+def test_unmatched_query_falls_back(expander):
+    assert expander.expand("今天天气怎么样") is None